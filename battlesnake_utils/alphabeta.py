@@ -0,0 +1,258 @@
+from typing import Callable, Optional
+
+import itertools
+import time
+
+from .battlesnake import Game, Pos
+from .evaluation import lost_score, won_score, weighted
+from .pool import GamePool
+
+
+class SearchTimeout(Exception):
+    " raised inside a search when its time is up "
+
+
+class AlphaBeta():
+    """
+    Depth limited search over Game, deepening one turn at a time until the
+    time budget runs out.
+
+    In 'paranoid' mode (meant for duels, works for more snakes too) the
+    opponents' moves are taken together as one joint move that's as bad as
+    possible for us, after we've picked ours, and searched with alpha-beta.
+    In 'maxn' mode every snake maximises its own score, picking its move in
+    turn (us first), without pruning.
+
+    Moves are ordered by the best move of the previous iteration, then
+    killer moves (moves that caused a cutoff at the same depth), then the
+    history heuristic (how often a snake's move caused cutoffs).
+
+    evaluate(game, snake_id) scores leaves from that snake's point of view
+    (see evaluation.py), finished games are scored with lost_score and
+    won_score, sooner being better for a win and later for a loss.
+
+    reply_filter, if given, is called as reply_filter(game, snake_id,
+    directions) for each opponent's legal moves and returns the ones worth
+    searching (see opponents.OpponentModel.prune): fewer replies to look at
+    means deeper searches in the same time.
+
+    Child games come from a GamePool and go back to it once searched, so
+    evaluate and reply_filter mustn't keep the games they're given.
+    """
+
+    def __init__(self, evaluate: Optional[Callable] = None, mode='paranoid', max_depth=8,
+                 reply_filter: Optional[Callable] = None):
+        if mode not in ('paranoid', 'maxn'):
+            raise Exception(f"AlphaBeta: unknown mode: {mode}")
+        self.evaluate = evaluate if evaluate is not None else weighted()
+        self.mode = mode
+        self.max_depth = max_depth
+        self.reply_filter = reply_filter
+        self.games = GamePool()
+
+        self.history = {}
+        self.killers = {}
+        self.opponent_killers = {}
+        self.deadline = None
+        self.root_moves = None
+        self.you_id = None
+        self.snake_ids = []
+        self.best_move = None
+        self.nodes = 0
+        self.stats = {}
+
+    def search(self, game: Game, time_budget: Optional[float] = 0.3, max_depth: Optional[int] = None,
+               root_moves: Optional[list] = None):
+        """
+        best direction for game.you, deepening until time_budget (seconds) or
+        max_depth. root_moves limits the directions we consider for our first move.
+        """
+        self.root_moves = root_moves
+        max_depth = max_depth if max_depth is not None else self.max_depth
+        start = time.perf_counter()
+        self.deadline = start + time_budget if time_budget is not None else None
+        self.you_id = game.you.id
+        self.snake_ids = [ snake.id for snake in game.board.snakes ]
+        self.killers = {}
+        self.opponent_killers = {}
+        self.nodes = 0
+
+        # older history counts for less
+        self.history = { key: value // 2 for key, value in self.history.items() if value > 1 }
+
+        best_move = None
+        best_score = None
+        depth_reached = 0
+        root = game.copy(lazy_df=True)
+        for depth in range(1, max_depth + 1):
+            self.best_move = best_move
+            try:
+                if self.mode == 'paranoid':
+                    score = self.paranoid(root, depth, lost_score * 2, won_score * 2, 0)
+                else:
+                    score = self.maxn(root, depth, 0)[self.you_id]
+            except SearchTimeout:
+                break
+            best_move = self.best_move
+            best_score = score
+            depth_reached = depth
+            if score >= won_score - depth or score <= lost_score + depth:
+                # the outcome is known, looking deeper won't change it
+                break
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            'depth': depth_reached,
+            'score': best_score,
+            'nodes': self.nodes,
+            'elapsed': elapsed,
+            'nodes_per_second': self.nodes / elapsed if elapsed > 0 else 0.0,
+        }
+        return best_move
+
+    def check_time(self):
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def outcome(self, game: Game, snake_id, ply: int):
+        " score if the game's decided for snake_id, otherwise None "
+        snakes = game.board.snakes
+        if not any(snake.id == snake_id for snake in snakes):
+            return lost_score + ply
+        if len(self.snake_ids) > 1 and len(snakes) == 1:
+            return won_score - ply
+        return None
+
+    def legal_moves(self, game: Game):
+        """
+        {snake id: legal directions} for the snakes still in game (a doomed
+        snake gets 'up'), opponents' narrowed down by reply_filter
+        """
+        masks, _ = game.board.move_masks(with_danger=False)
+        legal = { snake.id: Pos.directions_in_mask(mask) or ['up'] for snake, mask in zip(game.board.snakes, masks) }
+        if self.reply_filter is not None:
+            for snake_id in legal:
+                if snake_id != self.you_id and len(legal[snake_id]) > 1:
+                    legal[snake_id] = self.reply_filter(game, snake_id, legal[snake_id])
+        return legal
+
+    def allowed(self, directions, ply: int):
+        " our directions, limited to root_moves at the root "
+        if ply > 0 or self.root_moves is None:
+            return directions
+        return [ d for d in directions if d in self.root_moves ] or list(self.root_moves)
+
+    def ordered(self, snake_id, directions, ply: int):
+        " directions, best first: last iteration's best at the root, killers, then history "
+        killers = self.killers.get(ply, []) if snake_id == self.you_id else []
+
+        def rank(direction):
+            first = ply == 0 and snake_id == self.you_id and direction == self.best_move
+            return (not first, direction not in killers, -self.history.get((snake_id, direction), 0))
+
+        return sorted(directions, key=rank)
+
+    def cutoff(self, snake_id, direction, depth: int, ply: int):
+        " remember a move that caused a cutoff "
+        self.history[(snake_id, direction)] = self.history.get((snake_id, direction), 0) + depth * depth
+        if snake_id == self.you_id:
+            killers = self.killers.setdefault(ply, [])
+            if direction not in killers:
+                killers.insert(0, direction)
+                del killers[2:]
+
+    def paranoid(self, game: Game, depth: int, alpha: float, beta: float, ply: int):
+        self.check_time()
+        score = self.outcome(game, self.you_id, ply)
+        if score is not None:
+            return score
+        if depth == 0:
+            return self.evaluate(game, self.you_id)
+
+        legal = self.legal_moves(game)
+        my_moves = self.ordered(self.you_id, self.allowed(legal[self.you_id], ply), ply)
+        opponent_ids = [ snake_id for snake_id in legal if snake_id != self.you_id ]
+        replies = list(itertools.product(*[ self.ordered(snake_id, legal[snake_id], ply) for snake_id in opponent_ids ]))
+
+        best = None
+        for my_move in my_moves:
+            # killer replies first, as they are now (a cutoff below may have changed them)
+            killers = self.opponent_killers.get(ply, [])
+            replies.sort(key=lambda reply: reply not in killers)
+            worst = None
+            bound = beta
+            for reply in replies:
+                child = self.games.acquire_from(game)
+                moves = dict(zip(opponent_ids, reply))
+                moves[self.you_id] = my_move
+                child.advance(moves)
+                try:
+                    value = self.paranoid(child, depth - 1, alpha, bound, ply + 1)
+                finally:
+                    self.games.release(child)
+                if worst is None or value < worst:
+                    worst = value
+                    bound = min(bound, worst)
+                if worst <= alpha:
+                    # we already have something better than this move
+                    for snake_id, direction in zip(opponent_ids, reply):
+                        self.cutoff(snake_id, direction, depth, ply)
+                    if reply not in killers:
+                        self.opponent_killers[ply] = [reply] + killers[:1]
+                    break
+
+            if best is None or worst > best:
+                best = worst
+                if ply == 0:
+                    self.best_move = my_move
+            alpha = max(alpha, best)
+            if alpha >= beta:
+                self.cutoff(self.you_id, my_move, depth, ply)
+                break
+
+        return best
+
+    def scores(self, game: Game, ply: int):
+        " {snake id: score} at a leaf "
+        scores = {}
+        for snake_id in self.snake_ids:
+            score = self.outcome(game, snake_id, ply)
+            scores[snake_id] = score if score is not None else self.evaluate(game, snake_id)
+        return scores
+
+    def maxn(self, game: Game, depth: int, ply: int):
+        self.check_time()
+        snakes = game.board.snakes
+        if depth == 0 or len(snakes) == 0 or (len(self.snake_ids) > 1 and len(snakes) == 1):
+            return self.scores(game, ply)
+
+        legal = self.legal_moves(game)
+        if self.you_id in legal:
+            legal[self.you_id] = self.allowed(legal[self.you_id], ply)
+        order = sorted(legal, key=lambda snake_id: snake_id != self.you_id)
+        return self.maxn_choose(game, depth, ply, legal, order, {})
+
+    def maxn_choose(self, game: Game, depth: int, ply: int, legal: dict, order: list, moves: dict):
+        " the snake order[len(moves)] picks its move, knowing the moves picked before it "
+        snake_id = order[len(moves)]
+        best = None
+        for direction in self.ordered(snake_id, legal[snake_id], ply):
+            moves[snake_id] = direction
+            if len(moves) < len(order):
+                scores = self.maxn_choose(game, depth, ply, legal, order, moves)
+            else:
+                child = self.games.acquire_from(game)
+                child.advance(moves)
+                try:
+                    scores = self.maxn(child, depth - 1, ply + 1)
+                finally:
+                    self.games.release(child)
+            del moves[snake_id]
+
+            # no cutoffs in max^n, so nothing for the killer and history tables
+            if best is None or scores[snake_id] > best[snake_id]:
+                best = scores
+                if ply == 0 and snake_id == self.you_id:
+                    self.best_move = direction
+        return best
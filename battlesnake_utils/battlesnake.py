@@ -3,7 +3,11 @@ from typing import Optional, Union
 
 import sys
 import copy
+import heapq
+import functools
+import numpy as np
 import pandas as pd
+from collections import OrderedDict, deque
 from time import sleep
 
 class Pos():
@@ -11,9 +15,22 @@ class Pos():
     An x,y position, with many helper methods
     """
 
+    __slots__ = ('x', 'y')
+
+    # positions hash as y * hash_stride + x, unique for any board we'd ever see
+    hash_stride = 1 << 16
+
     all_directions = ['left', 'up', 'right', 'down']
     ascii_for_direction = {'left': '←', 'up': '↑', 'right': '→', 'down': '↓'}
 
+    # bit for each direction in a move mask (see Board.move_masks)
+    direction_bits = {'left': 1, 'up': 2, 'right': 4, 'down': 8}
+
+    @classmethod
+    def directions_in_mask(cls, mask: int):
+        " the directions whose bits are set in a move mask "
+        return [ d for d in cls.all_directions if mask & cls.direction_bits[d] ]
+
     @classmethod
     def turn_direction_left(cls, direction):
         " turn left (relative to given direction) "
@@ -57,7 +74,7 @@ class Pos():
         return f"({self.x},{self.y})"
 
     def __hash__(self):
-        return hash(self.__str__())
+        return self.y * Pos.hash_stride + self.x
 
     def as_dict(self):
         return { 'x': self.x, 'y': self.y }
@@ -113,28 +130,171 @@ class Pos():
         return dirs
 
 
+class FrozenPos(Pos):
+    " a Pos that can't be modified, so it can be shared (see PosTable) "
+
+    __slots__ = ()
+
+    def __init__(self, x: int, y: int):
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
+
+    def __setattr__(self, name, value):
+        raise Exception(f"can't modify shared position {self}")
+
+    def __delattr__(self, name):
+        raise Exception(f"can't modify shared position {self}")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenPos, (self.x, self.y))
+
+
+class PosTable():
+    """
+    Interned positions for one board geometry.
+
+    Every on-board position (plus a one cell border, so stepping off the board
+    is covered too) exists exactly once as a FrozenPos, so hot loops can share
+    them instead of allocating a new Pos per step. The tables of the
+    max_tables most recently used geometries are kept; a board keeps its
+    own table however long it lives.
+    """
+
+    max_tables = 16
+    _tables = OrderedDict()
+
+    direction_offsets = {'left': (-1, 0), 'up': (0, 1), 'right': (1, 0), 'down': (0, -1)}
+
+    @classmethod
+    def for_geometry(cls, width: int, height: int):
+        " the shared table for a width x height board "
+        key = (width, height)
+        table = cls._tables.get(key)
+        if table is None:
+            table = cls(width, height)
+            cls._tables[key] = table
+            while len(cls._tables) > cls.max_tables:
+                cls._tables.popitem(last=False)
+        else:
+            cls._tables.move_to_end(key)
+        return table
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.stride = width + 2
+        self.positions = [ FrozenPos(x, y) for y in range(-1, height + 1) for x in range(-1, width + 1) ]
+
+    def get(self, x: int, y: int):
+        " the shared position for x,y (a new FrozenPos if outside the table) "
+        if -1 <= x <= self.width and -1 <= y <= self.height:
+            return self.positions[(y + 1) * self.stride + x + 1]
+        return FrozenPos(x, y)
+
+    def moved(self, pos: Pos, direction):
+        " shared equivalent of pos.moved_to(direction) "
+        try:
+            dx, dy = self.direction_offsets[direction]
+        except KeyError:
+            raise Exception(f"invalid direction: {direction}")
+        return self.get(pos.x + dx, pos.y + dy)
+
+    @property
+    def cell_neighbours(self):
+        " for each flat cell index (y * width + x), the flat indices of its on-board neighbours "
+        if not hasattr(self, '_cell_neighbours'):
+            width = self.width
+            height = self.height
+            neighbours = []
+            for y in range(height):
+                for x in range(width):
+                    cell = y * width + x
+                    cells = []
+                    if x > 0:
+                        cells.append(cell - 1)
+                    if y < height - 1:
+                        cells.append(cell + width)
+                    if x < width - 1:
+                        cells.append(cell + 1)
+                    if y > 0:
+                        cells.append(cell - width)
+                    neighbours.append(cells)
+            self._cell_neighbours = neighbours
+        return self._cell_neighbours
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # tables are shared per geometry, copying a board shouldn't copy its table
+        return self
+
+    def __reduce__(self):
+        return (PosTable.for_geometry, (self.width, self.height))
+
+
 class Snake():
+    """
+    A snake. The body is a deque (head first), so moving is O(1) at both
+    ends, and head, tail and length are always read from the body.
+    """
     head_char = 'H'
     tail_char = 'T'
     def __init__(self, snake_dict: Optional[dict] = None):
         if snake_dict is None:
             self.id = "0";
             self.name = ""
-            self.length = 0
             self.health = 0
-            self.body = [];
-            self.head = None
-            self.tail = None
+            self.body = deque()
         else:
             self.id = snake_dict['id']
             self.name = snake_dict['name']
-            self.length = snake_dict['length']
             self.health = snake_dict['health']
-            self.body = []
-            for seg in snake_dict['body']:
-                self.body.append(Pos(seg))
-            self.head = Pos(snake_dict['head'])
-            self.tail = self.body[-1]
+            self.body = deque(Pos(seg) for seg in snake_dict['body'])
+
+    @property
+    def head(self):
+        return self.body[0] if self.body else None
+
+    @head.setter
+    def head(self, pos: Pos):
+        if self.body:
+            self.body[0] = pos
+        else:
+            self.body.append(pos)
+
+    @property
+    def tail(self):
+        return self.body[-1] if self.body else None
+
+    @property
+    def length(self):
+        return len(self.body)
+
+    def move(self, direction):
+        " move one step in given direction: push a new head, drop the tail "
+        self.body.appendleft(self.head.moved_to(direction))
+        return self.body.pop()
+
+    def grow(self):
+        " grow by one after eating: the tail segment is stacked "
+        tail = self.tail
+        self.body.append(Pos(tail.x, tail.y))
+
+    def copy(self):
+        " an independent copy of this snake "
+        snake = Snake()
+        snake.id = self.id
+        snake.name = self.name
+        snake.health = self.health
+        snake.body = deque(Pos(pos.x, pos.y) for pos in self.body)
+        return snake
 
     def as_dict(self):
         d = {
@@ -179,17 +339,19 @@ class Snake():
 
     def pos_ahead_to_right(self):
         " forward one, right one "
-        ahead = self.head.moved_to(self.facing_direction())
-        return ahead.moved_to(self.head.turn_direction_right(self.facing_direction()))
+        facing = self.facing_direction()
+        ahead = self.head.moved_to(facing)
+        return ahead.moved_to(self.head.turn_direction_right(facing))
 
     def pos_ahead_to_left(self):
-        " forward one, right one "
-        ahead = self.head.moved_to(self.facing_direction())
-        return ahead.moved_to(self.head.turn_direction_left(self.facing_direction()))
+        " forward one, left one "
+        facing = self.facing_direction()
+        ahead = self.head.moved_to(facing)
+        return ahead.moved_to(self.head.turn_direction_left(facing))
 
 
 class Board():
-    def __init__(self, board_dict: Optional[dict] = None):
+    def __init__(self, board_dict: Optional[dict] = None, lazy_df=False):
         if board_dict is None:
             self.width = 0
             self.height = 0
@@ -209,12 +371,40 @@ class Board():
                 for i in range(len(board_dict['snakes'])):
                     self.snakes.append(Snake(board_dict['snakes'][i]))
 
+        # shared positions for this board's geometry
+        self.positions = PosTable.for_geometry(self.width, self.height)
+
+        # simulation boards (see copy()) only rebuild their df when it's asked for
+        self.lazy_df = lazy_df
+        self.df_stale = False
+
+        # bumped on every change, so derived facts know when to recompute (see Analysis)
+        self.version = 0
+
         # keep a dataframe representation of this board
-        self.update_df()
+        if lazy_df:
+            self._df = None
+            self.changed()
+        else:
+            self.update_df()
+
+    @property
+    def df(self):
+        " dataframe representation of this board, rebuilt first if it's gone stale "
+        if self.df_stale:
+            self.update_df()
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+        self.df_stale = False
+        self.version += 1
 
     def update_df(self):
         " transform board attributes into a dataframe representation "
-        df = pd.DataFrame(' ', columns=range(self.width), index=range(self.height))
+        # a single object block, so df.to_numpy() is a view rather than a copy (see cells_at())
+        df = pd.DataFrame(' ', columns=range(self.width), index=range(self.height), dtype=object)
 
         if len(self.snakes) > 0:
             # snake positions
@@ -257,12 +447,214 @@ class Board():
                 df.at[y,x] = ';'
 
         self.df = df
+        self.update_occupancy()
+
+    def update_occupancy(self):
+        " recount snake segments per cell, and note what lies under the snakes "
+        # number of snake segments on each cell (stacked segments count more than once)
+        occupancy = np.zeros((self.height, self.width), dtype=np.int16)
+        for snake in self.snakes:
+            for pos in snake.body:
+                occupancy[pos.y, pos.x] += 1
+        self.occupancy = occupancy
+        self.version += 1
+
+        # so single cells can be redrawn in move_snake()
+        self.food_cells = set(self.food)
+        self.hazard_cells = set(self.hazards)
+        self.crumb_cells = set(self.crumbs)
+        # rebuilt when next used
+        self._spatial = None
+
+    def changed(self):
+        " snakes were added or removed: recount them, and redraw the df (now or when it's next used) "
+        if self.lazy_df:
+            self.update_occupancy()
+            self.df_stale = True
+        else:
+            self.update_df()
+
+    def copy(self, lazy_df: Optional[bool] = None):
+        """
+        An independent copy of this board, without rebuilding the df. With
+        lazy_df the copy doesn't keep its df up to date as snakes move, which
+        makes simulating many turns much cheaper; the df is rebuilt when read.
+        """
+        board = Board.__new__(Board)
+        board.width = self.width
+        board.height = self.height
+        board.positions = self.positions
+        board.snakes = [ snake.copy() for snake in self.snakes ]
+        board.food = [ Pos(pos.x, pos.y) for pos in self.food ]
+        board.hazards = [ Pos(pos.x, pos.y) for pos in self.hazards ]
+        board.crumbs = [ Pos(pos.x, pos.y) for pos in self.crumbs ]
+        board.lazy_df = self.lazy_df if lazy_df is None else lazy_df
+        board.version = 0
+        if board.lazy_df:
+            board._df = None
+            board.df_stale = True
+        else:
+            board.df = self.df.copy()
+        board.occupancy = self.occupancy.copy()
+        board.food_cells = set(board.food)
+        board.hazard_cells = set(board.hazards)
+        board.crumb_cells = set(board.crumbs)
+        board._spatial = None
+        return board
+
+    def on_board(self, pos: Pos):
+        " is given position on the board ? "
+        return 0 <= pos.x < self.width and 0 <= pos.y < self.height
+
+    def move_snake(self, snake: Snake, direction, grow=False):
+        """
+        Move one of our snakes a step in O(1): push the head, drop the tail
+        (or stack it when grow is set) and update occupancy and only the
+        affected df cells, no update_df() needed
+        """
+        old_head = snake.head
+        old_tail = snake.move(direction)
+        if grow:
+            snake.grow()
+        self.version += 1
+        if self._spatial is not None:
+            self._spatial.move_head(snake, old_head, snake.head)
+
+        self.occupy(old_tail, -1)
+        self.occupy(snake.head, 1)
+        if grow:
+            self.occupy(snake.tail, 1)
+
+        if self.lazy_df:
+            self.df_stale = True
+            return
+
+        snake_char = str(self.snakes.index(snake))
+        for pos in (old_tail, old_head, snake.tail, snake.head):
+            self.redraw_cell(pos, snake, snake_char)
+
+    @property
+    def spatial(self):
+        " a SpatialIndex of this board's food and heads, built when first used and kept up to date "
+        if self._spatial is None:
+            self._spatial = SpatialIndex(self)
+        return self._spatial
+
+    def nearest_food(self, pos: Pos, k=1):
+        " the k pieces of food nearest to pos in moves (Manhattan distance), as (distance, food), nearest first "
+        return self.spatial.food.nearest(pos.x, pos.y, k)
+
+    def food_within(self, pos: Pos, radius: int):
+        " the food at most radius moves (Manhattan distance) from pos, as (distance, food), nearest first "
+        return self.spatial.food.within(pos.x, pos.y, radius)
+
+    def nearest_heads(self, pos: Pos, k=1, exclude: Optional[Snake] = None):
+        " the k snakes whose heads are nearest to pos (Manhattan distance), as (distance, snake), leaving out exclude "
+        return self.spatial.heads.nearest(pos.x, pos.y, k, exclude)
+
+    def heads_within(self, pos: Pos, radius: int, exclude: Optional[Snake] = None):
+        " the snakes whose heads are at most radius from pos (Manhattan distance), as (distance, snake) "
+        return self.spatial.heads.within(pos.x, pos.y, radius, exclude)
+
+    def add_food(self, pos: Pos):
+        " put food at pos, updating what depends on it without a full changed() "
+        self.food.append(pos)
+        self.food_cells.add(pos)
+        self.version += 1
+        if self._spatial is not None:
+            self._spatial.food.add(pos.x, pos.y, pos)
+        self.redraw_food_cell(pos)
+
+    def remove_food(self, pos: Pos):
+        " take the food at pos away (see add_food()) "
+        self.food = [ food for food in self.food if food != pos ]
+        self.food_cells.discard(pos)
+        self.version += 1
+        if self._spatial is not None:
+            while self._spatial.food.remove(pos.x, pos.y):
+                pass
+        self.redraw_food_cell(pos)
+
+    def redraw_food_cell(self, pos: Pos):
+        if self.lazy_df:
+            self.df_stale = True
+        else:
+            self.redraw_cell(pos, None, None)
+
+    def occupy(self, pos: Pos, count: int):
+        " add count segments to the occupancy of pos (ignored off the board) "
+        if self.on_board(pos):
+            self.occupancy[pos.y, pos.x] += count
+
+    def redraw_cell(self, pos: Pos, snake: Snake, snake_char):
+        " recompute the df value of one cell, with the same precedence as update_df() "
+        if not self.on_board(pos) or self.df_stale:
+            return
+
+        if pos in self.crumb_cells:
+            value = ';'
+        elif pos in self.hazard_cells:
+            value = '.'
+        elif pos in self.food_cells:
+            value = 'f'
+        elif self.occupancy[pos.y, pos.x] == 0:
+            value = ' '
+        elif snake is not None and pos == snake.tail:
+            value = Snake.tail_char
+        elif snake is not None and pos == snake.head:
+            value = Snake.head_char
+        elif snake is not None and len(snake.body) > 1 and pos == snake.body[1]:
+            value = snake_char
+        else:
+            # some other snake is here, find out which (rare, so just look)
+            value = ' '
+            for i in range(len(self.snakes)):
+                other = self.snakes[i]
+                if pos in other.body:
+                    value = str(i)
+                if pos == other.head:
+                    value = Snake.head_char
+                if pos == other.tail:
+                    value = Snake.tail_char
+        self.df.at[pos.y, pos.x] = value
 
     def __str__(self):
         " print out the board with increasing y going up "
         df_reversed = self.df[::-1]
         return( df_reversed.to_string())
 
+    # cell codes (see cell_codes()): snake i is body_code(i), its head body_code(i) + 1, its tail body_code(i) + 2
+    empty_code = 0
+    food_code = 253
+    hazard_code = 254
+    crumb_code = 255
+
+    @staticmethod
+    def body_code(i: int):
+        return 1 + 3 * (i % 84)
+
+    def cell_codes(self):
+        """
+        height x width uint8 array of what's on each cell, with the same
+        precedence as update_df() but from the snakes, food, hazards and
+        crumbs themselves (no df needed)
+        """
+        width = self.width
+        codes = np.zeros(width * self.height, dtype=np.uint8)
+
+        def cells(positions):
+            return [ pos.y * width + pos.x for pos in positions if self.on_board(pos) ]
+
+        for i, snake in enumerate(self.snakes):
+            code = Board.body_code(i)
+            codes[cells(snake.body)] = code
+            codes[cells([snake.head])] = code + 1
+            codes[cells([snake.tail])] = code + 2
+        codes[cells(self.food)] = Board.food_code
+        codes[cells(self.hazards)] = Board.hazard_code
+        codes[cells(self.crumbs)] = Board.crumb_code
+        return codes.reshape(self.height, width)
+
     def as_dict(self):
         d = dict()
         d['width'] = self.width
@@ -273,6 +665,52 @@ class Board():
 
         return(d)
 
+    def cells_at(self, indices, codes=False, off_board=None):
+        """
+        df values at flat cell indices (y * width + x, a list or array), as an
+        array; off_board where an index isn't on the board. With codes, the
+        cell_codes() values instead (off_board defaults to 0 then)
+        """
+        flat = np.asarray(indices, dtype=np.intp)
+        n_cells = self.width * self.height
+        on = (flat >= 0) & (flat < n_cells)
+        if codes:
+            grid = self.cell_codes().ravel()
+            fill = 0 if off_board is None else off_board
+        else:
+            grid = self.df.to_numpy().ravel()
+            fill = off_board
+        if n_cells == 0:
+            return np.full(flat.shape, fill, dtype=grid.dtype)
+        cells = grid[np.where(on, flat, 0)]
+        if not on.all():
+            cells[~on] = fill
+        return cells
+
+    def are_free(self, xs, ys=None, tails_are_obstructions=False):
+        """
+        is_free() for many cells in one go: xs and ys are x and y coordinates
+        (lists or arrays), or leave out ys for flat cell indices in xs;
+        returns a bool array, False for cells off the board
+        """
+        if ys is None:
+            flat = np.asarray(xs, dtype=np.intp)
+            on = (flat >= 0) & (flat < self.width * self.height)
+        else:
+            xs = np.asarray(xs, dtype=np.intp)
+            ys = np.asarray(ys, dtype=np.intp)
+            on = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+            flat = ys * self.width + xs
+        if self.width * self.height == 0:
+            return np.zeros(flat.shape, dtype=bool)
+
+        # note: food is not obstructing
+        cells = self.df.to_numpy().ravel()[np.where(on, flat, 0)]
+        free = (cells == ' ') | (cells == 'f')
+        if not tails_are_obstructions:
+            free |= cells == Snake.tail_char
+        return free & on
+
     def is_free(self, pos: Union[dict, Pos], tails_are_obstructions=False):
         " is given position on the board free (ie not obstructed) ? "
 
@@ -286,21 +724,243 @@ class Board():
         else:
             raise Exception(f"is_free: can't handle type: {type(pos)}")
 
-        board_width = self.width
-        board_height = self.height
+        return bool(self.are_free(x, y, tails_are_obstructions))
+
+    def move_masks(self, hazards_are_obstructions=True, with_danger=True):
+        """
+        Legal moves and head-to-head danger for every snake, in one pass.
+
+        Returns (masks, danger): masks[i] is a move mask for snakes[i] (see
+        Pos.direction_bits), danger[i] is a height x width bool array of the
+        cells an enemy head at least as long as snakes[i] can move to next
+        turn. Tails count as free when they will move away, which they don't
+        when their snake has just eaten (stacked tail) or can eat this turn.
+        Without with_danger, danger is None (and the call is cheaper).
+        """
+        n = len(self.snakes)
+        if n == 0:
+            return np.zeros(0, dtype=np.uint8), np.zeros((0, self.height, self.width), dtype=bool)
+
+        # direction offsets in all_directions order
+        dx = np.array([-1, 0, 1, 0])
+        dy = np.array([0, 1, 0, -1])
+        bits = np.array([ Pos.direction_bits[d] for d in Pos.all_directions ], dtype=np.uint8)
+
+        heads = np.array([ (snake.head.x, snake.head.y) for snake in self.snakes ])
+        tails = np.array([ (snake.tail.x, snake.tail.y) for snake in self.snakes ])
+        stacked = np.array([ len(snake.body) > 1 and snake.body[-1] == snake.body[-2] for snake in self.snakes ])
+        lengths = np.array([ snake.length for snake in self.snakes ])
+
+        # neighbours of each head, in a grid padded by one cell so off board is just another cell
+        nx = heads[:, 0, None] + dx + 1
+        ny = heads[:, 1, None] + dy + 1
+
+        food = np.zeros((self.height + 2, self.width + 2), dtype=bool)
+        for pos in self.food:
+            food[pos.y + 1, pos.x + 1] = True
+        can_eat = food[ny, nx].any(axis=1)
+
+        counts = np.zeros((self.height + 2, self.width + 2), dtype=np.int16)
+        counts[1:-1, 1:-1] = self.occupancy
+        moving = ~(stacked | can_eat)
+        np.subtract.at(counts, (tails[moving, 1] + 1, tails[moving, 0] + 1), 1)
+
+        blocked = counts > 0
+        blocked[0, :] = blocked[-1, :] = blocked[:, 0] = blocked[:, -1] = True
+        if hazards_are_obstructions:
+            for pos in self.hazards:
+                blocked[pos.y + 1, pos.x + 1] = True
+
+        legal = ~blocked[ny, nx]
+        masks = (legal * bits).sum(axis=1).astype(np.uint8)
+        if not with_danger:
+            return masks, None
+
+        # cells each head can legally reach, and who is threatened by whom
+        reach = np.zeros((n, self.height + 2, self.width + 2), dtype=bool)
+        rows = np.repeat(np.arange(n), 4).reshape(n, 4)
+        reach[rows[legal], ny[legal], nx[legal]] = True
+        threat = (lengths[None, :] >= lengths[:, None]) & ~np.eye(n, dtype=bool)
+        danger = np.tensordot(threat, reach, axes=1) > 0
+
+        return masks, danger[:, 1:-1, 1:-1]
+
+    # vacate turn for cells that never free up
+    never = 1 << 30
+
+    def vacate_turns(self, hazards_are_obstructions=True):
+        """
+        For each cell, the turn at which it's free of snakes (0 if free now).
+        A segment n places from the end of its snake is gone after n+1 moves,
+        assuming no snake eats in the meantime.
+        """
+        vacate = np.zeros((self.height, self.width), dtype=np.int32)
+        for snake in self.snakes:
+            length = len(snake.body)
+            xs = np.fromiter((pos.x for pos in snake.body), dtype=np.int32, count=length)
+            ys = np.fromiter((pos.y for pos in snake.body), dtype=np.int32, count=length)
+            on_board = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+            turns = length - np.arange(length, dtype=np.int32)
+            np.maximum.at(vacate, (ys[on_board], xs[on_board]), turns[on_board])
+
+        if hazards_are_obstructions:
+            for pos in self.hazards:
+                vacate[pos.y, pos.x] = Board.never
+
+        return vacate
+
+    def timed_reachability(self, start: Pos, start_turn=0, hazards_are_obstructions=True, vacate=None):
+        """
+        Earliest turn each cell can be reached from start, where a cell can be
+        entered at turn t only if it has been vacated by then (see
+        vacate_turns), so bodies open up as their snakes move, our own included.
+
+        Snakes can't wait, but a detour takes an even number of extra moves: a
+        cell that is still occupied when a neighbour is reached can be entered
+        later, at the first turn it's vacated by with the parity of that
+        neighbour's arrival + 1, as long as the neighbour is part of a free 2x2
+        square to circle in meanwhile (in a one cell wide corridor there's no
+        going round, only back into our own neck). Cells are taken in order of
+        arrival from a bucket per turn, so it stays linear in the board size.
+
+        Returns a height x width array of the turn each cell is first reached,
+        -1 where it can't be. A vacate_turns() array can be passed in if the
+        caller already has one.
+        """
+        width = self.width
+        height = self.height
+        if vacate is None:
+            vacate = self.vacate_turns(hazards_are_obstructions)
+        vacate = vacate.ravel().tolist()
+        arrival = [-1] * (width * height)
+        neighbours = self.positions.cell_neighbours
+
+        def can_circle(cell, turn):
+            " is cell in a 2x2 square whose cells are all free by turn "
+            x, y = cell % width, cell // width
+            for dx in (-1, 1):
+                for dy in (-1, 1):
+                    if 0 <= x + dx < width and 0 <= y + dy < height and \
+                            vacate[cell + dx] <= turn and vacate[cell + dy * width] <= turn and \
+                            vacate[cell + dy * width + dx] <= turn:
+                        return True
+            return False
+
+        if self.on_board(start):
+            # buckets[t - start_turn]: cells that can be entered at turn t
+            buckets = [[start.y * width + start.x]]
+            t = 0
+            while t < len(buckets):
+                turn = start_turn + t
+                for cell in buckets[t]:
+                    if arrival[cell] >= 0:
+                        continue
+                    arrival[cell] = turn
+                    circle = None
+                    for next_cell in neighbours[cell]:
+                        if arrival[next_cell] >= 0:
+                            continue
+                        free_at = vacate[next_cell]
+                        if free_at <= turn + 1:
+                            enter = turn + 1
+                        elif free_at < Board.never:
+                            if circle is None:
+                                circle = can_circle(cell, turn + 1)
+                            if not circle:
+                                continue
+                            enter = free_at + ((free_at - turn - 1) & 1)
+                        else:
+                            continue
+                        while len(buckets) <= enter - start_turn:
+                            buckets.append([])
+                        buckets[enter - start_turn].append(next_cell)
+                t += 1
+
+        return np.array(arrival, dtype=np.int32).reshape(height, width)
+
+    def reachable_area(self, start: Pos, start_turn=0, hazards_are_obstructions=True):
+        " number of cells that can be reached from start (not counting start), see timed_reachability "
+        arrival = self.timed_reachability(start, start_turn, hazards_are_obstructions)
+        return int((arrival > start_turn).sum())
+
+    def find_path(self, start: Pos, goal: Pos, avoid_hazards=True, hazard_cost=14, timeline=None):
+        """
+        Cheapest path from start to goal, using A* with a Manhattan heuristic
+        over flat cell indices. Every step costs 1, plus hazard_cost when
+        stepping on a hazard if avoid_hazards is set (see Game.hazard_damage).
+        Snake bodies can be crossed once they've moved out of the way (see
+        vacate_turns). With a HazardTimeline, a step is priced by whether its
+        cell will be a hazard by the time we get there.
+
+        Returns the positions after start up to and including goal, or None
+        if goal can't be reached.
+        """
+        if not self.on_board(start) or not self.on_board(goal):
+            return None
+        if start == goal:
+            return []
 
-        # not free if off the board
-        is_free = None
-        if x < 0 or x >= board_width or y < 0 or y >= board_height:
-            is_free =  False
-            this_spot = "<off board>"
+        width = self.width
+        goal_x = goal.x
+        goal_y = goal.y
+        first = start.y * width + start.x
+        last = goal_y * width + goal_x
+
+        vacate = self.vacate_turns(hazards_are_obstructions=False).ravel().tolist()
+        extra_cost = [0] * (width * self.height)
+        onset = None
+        if avoid_hazards and timeline is not None:
+            onset = timeline.onset.ravel().tolist()
+            now = timeline.turn
+        elif avoid_hazards:
+            for pos in self.hazards:
+                extra_cost[pos.y * width + pos.x] = hazard_cost
+        neighbours = self.positions.cell_neighbours
+
+        best = {first: 0}
+        steps = {first: 0}
+        came_from = {}
+        heap = [(abs(start.x - goal_x) + abs(start.y - goal_y), 0, first)]
+        while heap:
+            _, cost, cell = heapq.heappop(heap)
+            if cell == last:
+                break
+            if cost > best[cell]:
+                continue
+            turn = steps[cell] + 1
+            for next_cell in neighbours[cell]:
+                if vacate[next_cell] > turn:
+                    continue
+                if onset is None:
+                    next_cost = cost + 1 + extra_cost[next_cell]
+                else:
+                    # damage is taken moving onto a cell that's a hazard on the turn we leave from
+                    next_cost = cost + 1 + (hazard_cost if onset[next_cell] < now + turn else 0)
+                if next_cost < best.get(next_cell, next_cost + 1):
+                    best[next_cell] = next_cost
+                    steps[next_cell] = turn
+                    came_from[next_cell] = cell
+                    y, x = divmod(next_cell, width)
+                    heapq.heappush(heap, (next_cost + abs(x - goal_x) + abs(y - goal_y), next_cost, next_cell))
         else:
-            this_spot = self.df.at[y,x]
-            # note: food is not obstructing
-            is_free = this_spot == ' ' or this_spot == 'f' or (not tails_are_obstructions and this_spot == 'T')
-
-        #print(f"pos ({x},{y}) is_free={is_free} cause value is '{this_spot}'")
-        return is_free
+            return None
+
+        path = []
+        cell = last
+        while cell != first:
+            y, x = divmod(cell, width)
+            path.append(self.positions.get(x, y))
+            cell = came_from[cell]
+        path.reverse()
+        return path
+
+    def path_cost(self, path, avoid_hazards=True, hazard_cost=14, timeline=None):
+        " cost of a path from find_path(), with the same costs "
+        if not avoid_hazards:
+            return len(path)
+        if timeline is not None:
+            return len(path) + sum(timeline.damage_at(pos, timeline.turn + i, hazard_cost) for i, pos in enumerate(path))
+        return len(path) + hazard_cost * sum(1 for pos in path if pos in self.hazard_cells)
 
     def facing_t_choice(self, snake):
         " determine if given snake is facing an obstruction and have choice to turn left or right "
@@ -310,17 +970,16 @@ class Board():
         turned_right = Pos.turn_direction_right(facing_direction)
         print(f"snake is facing direction: {facing_direction}")
 
-        ahead_pos = snake.head.moved_to(facing_direction)
-        left_pos = snake.head.moved_to(turned_left)
-        right_pos = snake.head.moved_to(turned_right)
-        ahead_and_left_pos = ahead_pos.moved_to(turned_left)
-        ahead_and_right_pos = ahead_pos.moved_to(turned_right)
+        ahead_pos = self.positions.moved(snake.head, facing_direction)
+        left_pos = self.positions.moved(snake.head, turned_left)
+        right_pos = self.positions.moved(snake.head, turned_right)
+        ahead_and_left_pos = self.positions.moved(ahead_pos, turned_left)
+        ahead_and_right_pos = self.positions.moved(ahead_pos, turned_right)
 
-        ahead_pos_is_free = self.is_free(ahead_pos)
-        left_pos_is_free = self.is_free(left_pos)
-        right_pos_is_free = self.is_free(right_pos)
-        ahead_and_left_pos_is_free = self.is_free(ahead_and_left_pos)
-        ahead_and_right_pos_is_free = self.is_free(ahead_and_right_pos)
+        positions = [ahead_pos, left_pos, right_pos, ahead_and_left_pos, ahead_and_right_pos]
+        (ahead_pos_is_free, left_pos_is_free, right_pos_is_free,
+         ahead_and_left_pos_is_free, ahead_and_right_pos_is_free) = self.are_free(
+            [ pos.x for pos in positions ], [ pos.y for pos in positions ])
 
         if left_pos_is_free and right_pos_is_free and not ahead_pos_is_free:
             return True
@@ -333,10 +992,10 @@ class Board():
     def free_positions_at(self, pos: Pos, direction):
         " starting from pos and going in given direction, return all the free points "
         free_positions = []
-        pos = pos.moved_to(direction)
+        pos = self.positions.moved(pos, direction)
         while self.is_free(pos, tails_are_obstructions=True):
             free_positions.append(pos)
-            pos = pos.moved_to(direction)
+            pos = self.positions.moved(pos, direction)
 
         return free_positions
 
@@ -344,24 +1003,298 @@ class Board():
     def unobstructed_between(self, pos1, pos2):
         " whether the path between pos1 and pos2 is unobstructed (not including pos1 and pos2 themselves)"
 
-        # TODO: please optimize this
-
         # determine if the rectangle formed by these two points is all "free" 
         x1 = min(pos1.x, pos2.x)
         x2 = max(pos1.x, pos2.x)
         y1 = min(pos1.y, pos2.y)
         y2 = max(pos1.y, pos2.y)
 
-        for x in range(x1, x2+1):
-            for y in range(y1, y2+1):
-                if (x == pos1.x and y == pos1.y) or (x == pos2.x and y == pos2.y):
-                    # don't test the actual points given
-                    continue
-                p = Pos(x,y)
-                if not self.is_free(p):
-                    return False
-                    
-        return True
+        ys, xs = np.mgrid[y1:y2+1, x1:x2+1]
+        free = self.are_free(xs, ys)
+        # don't test the actual points given
+        for pos in (pos1, pos2):
+            free[pos.y - y1, pos.x - x1] = True
+        return bool(free.all())
+
+
+class BucketGrid():
+    """
+    Items at board cells, kept in square buckets of bucket_size cells a
+    side, for nearest() and within() queries by Manhattan distance. A query
+    only looks at the buckets around its cell, so its cost depends on how
+    many items are near, not on how many there are.
+    """
+
+    def __init__(self, width: int, height: int, bucket_size=4):
+        self.width = width
+        self.height = height
+        self.bucket_size = bucket_size
+        self.columns = max(1, -(-width // bucket_size))
+        self.rows = max(1, -(-height // bucket_size))
+        # per bucket, a list of (x, y, item)
+        self.buckets = [ [] for _ in range(self.columns * self.rows) ]
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def bucket(self, x: int, y: int):
+        return self.buckets[(y // self.bucket_size) * self.columns + x // self.bucket_size]
+
+    def add(self, x: int, y: int, item):
+        " add item at x,y (ignored off the board) "
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.bucket(x, y).append((x, y, item))
+            self.count += 1
+
+    def remove(self, x: int, y: int, item=None):
+        " remove item (or, with None, any one item) at x,y; False if there was none "
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        bucket = self.bucket(x, y)
+        for i, entry in enumerate(bucket):
+            if entry[0] == x and entry[1] == y and (item is None or entry[2] is item):
+                del bucket[i]
+                self.count -= 1
+                return True
+        return False
+
+    def ring(self, bx: int, by: int, r: int):
+        " the buckets r buckets away from bucket bx,by (Chebyshev distance) "
+        if r == 0:
+            return [self.buckets[by * self.columns + bx]]
+        buckets = []
+        for cy in range(max(0, by - r), min(self.rows, by + r + 1)):
+            row = cy * self.columns
+            if cy in (by - r, by + r):
+                buckets.extend(self.buckets[row + max(0, bx - r):row + min(self.columns, bx + r + 1)])
+            else:
+                for cx in (bx - r, bx + r):
+                    if 0 <= cx < self.columns:
+                        buckets.append(self.buckets[row + cx])
+        return buckets
+
+    def nearest(self, x: int, y: int, k=1, exclude=None):
+        """
+        the k items nearest to x,y (not exclude) as (distance, item), nearest
+        first, ties in y then x order
+        """
+        size = self.bucket_size
+        bx = min(max(x, 0), self.width - 1) // size
+        by = min(max(y, 0), self.height - 1) // size
+        # cells beyond ring r of x,y's bucket are at least this far (off the board, further still)
+        outside = max(0, x - (self.width - 1), -x) + max(0, y - (self.height - 1), -y)
+        last_ring = max(bx, by, self.columns - 1 - bx, self.rows - 1 - by)
+        # (distance, y, x, index in items), so items themselves are never compared
+        found = []
+        items = []
+        for r in range(last_ring + 1):
+            for bucket in self.ring(bx, by, r):
+                for ex, ey, item in bucket:
+                    if item is not exclude:
+                        found.append((abs(ex - x) + abs(ey - y), ey, ex, len(items)))
+                        items.append(item)
+            # everything in the next ring is further than r * size + outside
+            if len(found) >= k and heapq.nsmallest(k, found)[-1][0] <= r * size + outside:
+                break
+        return [ (distance, items[i]) for distance, _, _, i in heapq.nsmallest(k, found) ]
+
+    def within(self, x: int, y: int, radius: int, exclude=None):
+        " the items at most radius from x,y (not exclude) as (distance, item), nearest first "
+        size = self.bucket_size
+        x1 = max(0, x - radius) // size
+        x2 = min(self.width - 1, x + radius) // size
+        y1 = max(0, y - radius) // size
+        y2 = min(self.height - 1, y + radius) // size
+        found = []
+        items = []
+        for by in range(y1, y2 + 1):
+            row = by * self.columns
+            for bucket in self.buckets[row + x1:row + x2 + 1]:
+                for ex, ey, item in bucket:
+                    distance = abs(ex - x) + abs(ey - y)
+                    if distance <= radius and item is not exclude:
+                        found.append((distance, ey, ex, len(items)))
+                        items.append(item)
+        found.sort()
+        return [ (distance, items[i]) for distance, _, _, i in found ]
+
+
+class SpatialIndex():
+    """
+    A board's food and snake heads in BucketGrids (see Board.spatial),
+    kept up to date as snakes move and food is eaten, added or removed.
+    """
+
+    def __init__(self, board: 'Board', bucket_size=4):
+        self.food = BucketGrid(board.width, board.height, bucket_size)
+        self.heads = BucketGrid(board.width, board.height, bucket_size)
+        for pos in board.food:
+            self.food.add(pos.x, pos.y, pos)
+        for snake in board.snakes:
+            if snake.body:
+                self.heads.add(snake.head.x, snake.head.y, snake)
+
+    def move_head(self, snake: 'Snake', old: 'Pos', new: 'Pos'):
+        self.heads.remove(old.x, old.y, snake)
+        self.heads.add(new.x, new.y, snake)
+
+
+class PathCache():
+    """
+    Remembers the path found last turn, so the next turn can reuse what's
+    left of it. Only the cells on the path are looked at again (their
+    cell_codes() values, worked out for those cells alone, no df needed);
+    if none of them changed to something in the way there's no need to
+    search again. Keep one per game.
+    """
+    def __init__(self):
+        self.path = None
+        self.goal = None
+        self.options = None
+        self.codes = None
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def path_codes(board: Board, path):
+        " Board.cell_codes() values of the cells of path, in order "
+        width = board.width
+        cells = [ pos.y * width + pos.x if board.on_board(pos) else -1 for pos in path ]
+        codes = dict.fromkeys(cells, Board.empty_code)
+        occupancy = board.occupancy.ravel()
+        if any(cell >= 0 and occupancy[cell] for cell in codes):
+            # same precedence as cell_codes(): body, then head, then tail
+            for i, snake in enumerate(board.snakes):
+                code = Board.body_code(i)
+                for pos in snake.body:
+                    cell = pos.y * width + pos.x
+                    if cell in codes:
+                        codes[cell] = code
+                for pos, offset in ((snake.head, 1), (snake.tail, 2)):
+                    cell = pos.y * width + pos.x
+                    if cell in codes:
+                        codes[cell] = code + offset
+        for pos, cell in zip(path, cells):
+            if pos in board.crumb_cells:
+                codes[cell] = Board.crumb_code
+            elif pos in board.hazard_cells:
+                codes[cell] = Board.hazard_code
+            elif pos in board.food_cells:
+                codes[cell] = Board.food_code
+        return [ codes[cell] for cell in cells ]
+
+    def remember(self, board: Board, goal: Pos, path, avoid_hazards=True, hazard_cost=14):
+        " store a path found on board, to be checked by reuse() next turn "
+        self.path = path
+        self.goal = goal
+        self.options = (avoid_hazards, hazard_cost)
+        self.codes = self.path_codes(board, path) if path is not None else None
+        self.size = (board.width, board.height)
+
+    def reuse(self, board: Board, start: Pos, avoid_hazards=True, hazard_cost=14):
+        """
+        The rest of the remembered path, if we're at its first step and no cell
+        that changed since is on it, otherwise None
+        """
+        if self.path is None or self.options != (avoid_hazards, hazard_cost):
+            return None
+        if len(self.path) == 0 or self.path[0] != start:
+            return None
+
+        if (board.width, board.height) != self.size:
+            return None
+
+        path = self.path[1:]
+        codes = self.path_codes(board, path)
+        for old, new in zip(self.codes[1:], codes):
+            # empty, food and tails (which move on, body_code() + 2) don't get in the way
+            tail = Board.empty_code < new < Board.food_code and new % 3 == 0
+            if new != old and new not in (Board.empty_code, Board.food_code) and not tail:
+                return None
+
+        self.path = path
+        self.codes = codes
+        return path
+
+    def find_path(self, board: Board, start: Pos, goal: Pos, avoid_hazards=True, hazard_cost=14):
+        " Board.find_path(), reusing last turn's path when it's still good "
+        path = None
+        if goal == self.goal:
+            path = self.reuse(board, start, avoid_hazards, hazard_cost)
+        if path is not None:
+            self.hits += 1
+            return path
+
+        self.misses += 1
+        path = board.find_path(start, goal, avoid_hazards, hazard_cost)
+        self.remember(board, goal, path, avoid_hazards, hazard_cost)
+        return path
+
+
+class HazardTimeline():
+    """
+    When each cell becomes a hazard, from now on.
+
+    onset is a height x width int32 array of the first turn at which each
+    cell is a hazard (a game at that turn or later shows it as one), turn
+    for cells that already are, Board.never for cells that never will be. A
+    snake moving on from turn t onto a cell takes damage if its onset <= t.
+
+    Royale boards shrink by a row or column from one side (picked at random)
+    every shrink_every turns. The timeline assumes the worst: a cell becomes
+    a hazard on the earliest turn it could, as if every shrink came from its
+    nearest side. The sides already shrunk are read from the current hazards.
+    Without shrinking (shrink_every 0), today's hazards are all there is.
+    """
+    def __init__(self, board: Board, turn: int, shrink_every=0, damage=14):
+        self.width = board.width
+        self.height = board.height
+        self.turn = turn
+        self.shrink_every = shrink_every
+        self.damage = damage
+
+        hazard = np.zeros((board.height, board.width), dtype=bool)
+        for pos in board.hazards:
+            if board.on_board(pos):
+                hazard[pos.y, pos.x] = True
+
+        onset = np.full((board.height, board.width), Board.never, dtype=np.int64)
+        if shrink_every > 0 and board.width > 0 and board.height > 0:
+            # rows and columns already gone on each side
+            def gone(full):
+                return int(np.argmin(full)) if not full.all() else len(full)
+            columns = hazard.all(axis=0)
+            rows = hazard.all(axis=1)
+            left, right = gone(columns), gone(columns[::-1])
+            bottom, top = gone(rows), gone(rows[::-1])
+
+            ys, xs = np.indices((board.height, board.width))
+            shrinks = 1 + np.minimum.reduce([xs - left, board.width - 1 - right - xs,
+                                             ys - bottom, board.height - 1 - top - ys])
+            # the j-th shrink from now is on turn (turn // shrink_every + j) * shrink_every
+            onset = (turn // shrink_every + np.maximum(shrinks, 1)) * shrink_every
+        onset[hazard] = turn
+        self.onset = np.minimum(onset, Board.never).astype(np.int32)
+
+    def hazards_at(self, turn: int):
+        " height x width bool array of the cells that are hazards at given turn "
+        return self.onset <= turn
+
+    def damage_at(self, pos: Pos, turn: int, damage: Optional[int] = None):
+        " damage for moving onto pos from a game at given turn "
+        if not (0 <= pos.x < self.width and 0 <= pos.y < self.height) or self.onset[pos.y, pos.x] > turn:
+            return 0
+        return self.damage if damage is None else damage
+
+    def cumulative_damage(self, turns: int):
+        """
+        height x width array of the damage a snake would take staying on each
+        cell for the next given number of turns (moving from turn, turn+1, ...)
+        """
+        hazard_turns = np.clip(self.turn + turns - np.maximum(self.onset, self.turn), 0, turns)
+        return hazard_turns * self.damage
 
 
 class EmptyBoard (Board):
@@ -389,14 +1322,14 @@ class Walk():
         self.start_direction = None
 
     def __str__(self):
-        # overlay our travelled points on top of the board
-        b2 = copy.deepcopy(self.board)
+        # overlay our travelled points on a copy of the board's df (not of the whole board)
+        df = self.board.df.copy()
         for pt in self.travelled_points:
-            b2.df.at[pt.y, pt.x] = ';'
+            df.at[pt.y, pt.x] = ';'
 
-        b2.df.at[self.pos.y, self.pos.x] = Pos.ascii_for_direction[self.direction]
+        df.at[self.pos.y, self.pos.x] = Pos.ascii_for_direction[self.direction]
 
-        return b2.__str__()
+        return df[::-1].to_string()
 
     def perimeter_area(self):
         return len(self.travelled_points)
@@ -409,11 +1342,11 @@ class Walk():
 
     def free_on_right(self):
         our_right_dir = Pos.turn_direction_right(self.direction)
-        return self.board.is_free( self.pos.moved_to(our_right_dir), tails_are_obstructions=True)
+        return self.board.is_free( self.board.positions.moved(self.pos, our_right_dir), tails_are_obstructions=True)
 
     def free_on_left(self):
         our_left_dir = Pos.turn_direction_left(self.direction)
-        return self.board.is_free( self.pos.moved_to(our_left_dir), tails_are_obstructions=True)
+        return self.board.is_free( self.board.positions.moved(self.pos, our_left_dir), tails_are_obstructions=True)
 
     def mark_all_points_to_the_right_as_travelled(self):
         our_right_dir = Pos.turn_direction_right(self.direction)
@@ -424,39 +1357,39 @@ class Walk():
 
     def move_forward(self):
         old_pos = self.pos
-        self.pos = self.pos.moved_to(self.direction)
+        self.pos = self.board.positions.moved(self.pos, self.direction)
         self.travelled_points.add(self.pos)
         self.mark_all_points_to_the_right_as_travelled()
         #print(f"moved forward: {old_pos} -> {self.pos}")
 
     def turn_right_until_not_obstructed(self):
         n_turns = 0
-        while not self.board.is_free( self.pos.moved_to(self.direction), tails_are_obstructions=True) and n_turns < 5:
+        while not self.board.is_free( self.board.positions.moved(self.pos, self.direction), tails_are_obstructions=True) and n_turns < 5:
             self.turn_right()
             n_turns += 1
             #print(f"turned to face: {self.direction}")
         return self.direction
 
     def walk_until_obstructed(self):
-        next_pos = self.pos.moved_to(self.direction)
+        next_pos = self.board.positions.moved(self.pos, self.direction)
         while self.board.is_free(next_pos, tails_are_obstructions=True):
             self.move_forward()
-            next_pos = self.pos.moved_to(self.direction)
+            next_pos = self.board.positions.moved(self.pos, self.direction)
             #print(f"moved {self.direction}")
 
     def free_space_to_our_left(self):
         our_left_dir = Pos.turn_direction_left(self.direction)
-        pos_to_our_left = self.pos.moved_to(our_left_dir)
+        pos_to_our_left = self.board.positions.moved(self.pos, our_left_dir)
         return self.board.is_free(pos_to_our_left, tails_are_obstructions=True)
 
     def walk_until_obstructed_or_free_on_left(self):
 
-        next_pos = self.pos.moved_to(self.direction)
-        left_pos = self.pos.moved_to(Pos.turn_direction_left(self.direction))
+        next_pos = self.board.positions.moved(self.pos, self.direction)
+        left_pos = self.board.positions.moved(self.pos, Pos.turn_direction_left(self.direction))
         while self.board.is_free(next_pos, tails_are_obstructions=True) and not self.board.is_free(left_pos, tails_are_obstructions=True):
             self.move_forward()
-            next_pos = self.pos.moved_to(self.direction)
-            left_pos = self.pos.moved_to(Pos.turn_direction_left(self.direction))
+            next_pos = self.board.positions.moved(self.pos, self.direction)
+            left_pos = self.board.positions.moved(self.pos, Pos.turn_direction_left(self.direction))
             #print(f"moved {self.direction}")
 
             if self.start_pos is not None and self.start_direction is not None and self.pos == self.start_pos and self.direction == self.start_direction:
@@ -478,7 +1411,7 @@ class Walk():
             print("moving off starting obstruction")
             self.move_forward()
 
-        start_pos = copy.deepcopy(self.pos)
+        start_pos = self.pos
         self.start_pos = start_pos
 
         # start keeping track of travelled points here
@@ -535,8 +1468,215 @@ class Walk():
 
 
 
+class Analysis():
+    """
+    Facts derived from a game for one turn, each computed the first time
+    it's asked for and then kept. Get it from Game.analysis, which makes a
+    new one whenever the board, the turn or our snake has changed.
+    """
+    def __init__(self, game):
+        self.game = game
+        self.board = game.board
+        self.stamp = game.analysis_stamp()
+
+    @functools.cached_property
+    def occupancy(self):
+        " number of snake segments on each cell (see Board.occupancy) "
+        return self.board.occupancy.copy()
+
+    @functools.cached_property
+    def board_free(self):
+        " height x width bool array of the cells Board.is_free() calls free (all tails included) "
+        board = self.board
+        return board.are_free(np.arange(board.width * board.height)).reshape(board.height, board.width)
+
+    def is_board_free(self, x: int, y: int):
+        " Board.is_free() for x,y, from the board_free array "
+        return 0 <= x < self.board.width and 0 <= y < self.board.height and bool(self.board_free[y, x])
+
+    @functools.cached_property
+    def free(self):
+        """
+        height x width bool array of the cells we can move to next turn: those
+        Board.is_free() calls free, but not stacked tails (just eaten, or at the
+        start of a game), which don't move next turn (as in Board.move_masks())
+        """
+        board = self.board
+        free = self.board_free.copy()
+        for snake in board.snakes:
+            body = snake.body
+            if len(body) > 1 and body[-1] == body[-2] and board.on_board(body[-1]):
+                free[body[-1].y, body[-1].x] = False
+        return free
+
+    def is_free(self, x: int, y: int):
+        " Board.is_free() for x,y (but stacked tails aren't free), from the free array "
+        return 0 <= x < self.board.width and 0 <= y < self.board.height and bool(self.free[y, x])
+
+    @functools.cached_property
+    def regions(self):
+        """
+        (labels, sizes): labels is a height x width int32 array numbering the
+        connected regions of free cells, -1 on cells that aren't free, and
+        sizes[label] the number of cells in each region
+        """
+        width = self.board.width
+        free = self.free.ravel().tolist()
+        labels = [-1] * len(free)
+        sizes = []
+        neighbours = self.board.positions.cell_neighbours
+        for first in range(len(free)):
+            if not free[first] or labels[first] >= 0:
+                continue
+            label = len(sizes)
+            labels[first] = label
+            stack = [first]
+            size = 0
+            while stack:
+                cell = stack.pop()
+                size += 1
+                for next_cell in neighbours[cell]:
+                    if free[next_cell] and labels[next_cell] < 0:
+                        labels[next_cell] = label
+                        stack.append(next_cell)
+            sizes.append(size)
+        return np.array(labels, dtype=np.int32).reshape(self.board.height, width), sizes
+
+    @functools.cached_property
+    def pockets(self):
+        """
+        {direction: {region, size, tail, food, trapped}} for each of our moves,
+        from the regions labelling: the region we'd move into (-1 if the cell
+        isn't free) and its size, whether our tail is in it or next to it,
+        whether it has food, and whether it's smaller than our length
+        """
+        board = self.board
+        you = self.game.you
+        labels, sizes = self.regions
+        food_regions = { int(labels[pos.y, pos.x]) for pos in board.food if board.on_board(pos) }
+
+        # our tail, and the cells next to it for when it's stacked (and so not free)
+        tail_regions = set()
+        tail = you.tail
+        if tail is not None and board.on_board(tail):
+            tail_cell = tail.y * board.width + tail.x
+            for cell in [tail_cell, *board.positions.cell_neighbours[tail_cell]]:
+                tail_regions.add(int(labels.flat[cell]))
+        tail_regions.discard(-1)
+
+        pockets = {}
+        for direction in Pos.all_directions:
+            pos = you.head.moved_to(direction) if you.head is not None else None
+            region = int(labels[pos.y, pos.x]) if pos is not None and board.on_board(pos) else -1
+            size = sizes[region] if region >= 0 else 0
+            pockets[direction] = {
+                'region': region,
+                'size': size,
+                'tail': region in tail_regions,
+                'food': region in food_regions,
+                'trapped': size < you.length,
+            }
+        return pockets
+
+    @functools.cached_property
+    def distances(self):
+        " height x width int32 array of the number of moves from our head to each free cell, -1 if unreachable "
+        board = self.board
+        width = board.width
+        distance = [-1] * (width * board.height)
+        head = self.game.you.head
+        if head is not None and board.on_board(head):
+            free = self.free.ravel().tolist()
+            neighbours = board.positions.cell_neighbours
+            first = head.y * width + head.x
+            distance[first] = 0
+            queue = deque([first])
+            while queue:
+                cell = queue.popleft()
+                for next_cell in neighbours[cell]:
+                    if free[next_cell] and distance[next_cell] < 0:
+                        distance[next_cell] = distance[cell] + 1
+                        queue.append(next_cell)
+        return np.array(distance, dtype=np.int32).reshape(board.height, width)
+
+    @functools.cached_property
+    def food_distances(self):
+        " straight line distance from our head to each piece of food, in board.food order "
+        head = self.game.you.head
+        return [ head.distance_to(food_piece) for food_piece in self.board.food ]
+
+    @functools.cached_property
+    def food_steps(self):
+        " number of moves from our head to each piece of food, in board.food order, -1 if unreachable "
+        distances = self.distances
+        return [ int(distances[pos.y, pos.x]) if self.board.on_board(pos) else -1 for pos in self.board.food ]
+
+    @functools.cached_property
+    def move_masks(self):
+        " Board.move_masks() for all snakes "
+        return self.board.move_masks()
+
+    @functools.cached_property
+    def you_index(self):
+        " index of our snake in board.snakes, -1 if we're out "
+        for i, snake in enumerate(self.board.snakes):
+            if snake is self.game.you:
+                return i
+        return -1
+
+    @functools.cached_property
+    def danger(self):
+        " height x width bool array of the cells an enemy head at least as long as us can move to next "
+        masks, danger = self.move_masks
+        if self.you_index < 0:
+            return np.zeros((self.board.height, self.board.width), dtype=bool)
+        return danger[self.you_index]
+
+    @functools.cached_property
+    def safe_moves(self):
+        " our move mask (see Pos.direction_bits) "
+        masks, danger = self.move_masks
+        return int(masks[self.you_index]) if self.you_index >= 0 else 0
+
+    @property
+    def safe_directions(self):
+        return Pos.directions_in_mask(self.safe_moves)
+
+    @functools.cached_property
+    def hazard_timeline(self):
+        " when each cell becomes a hazard (see Game.hazards_ahead) "
+        return self.game.hazards_ahead()
+
+
 class Game():
-    def __init__(self, game_dict: Optional[dict] = None):
+    # ruleset used when a game state doesn't come with one
+    default_ruleset = {
+        'name'    : 'solo',
+        'version' : 'cli',
+        'settings' : {
+            'foodSpawnChance'     : 15,
+            'minimumFood'         : 1,
+            'hazardDamagePerTurn' : 14,
+            'hazardMap'           : '',
+            'hazardMapAuthor'     : 'Rick N',
+            'royale'              : { 'shrinkEveryNTurns' : 25 },
+            'squad' : {
+                'allowBodyCollisions' : False,
+                'sharedElimination'   : False,
+                'sharedHealth'        : False,
+                'sharedLength'        : False
+            } }
+    }
+
+    def __init__(self, game_dict: Optional[dict] = None, lazy_df=False):
+        # when set, advance() takes hazard damage from this HazardTimeline
+        self.timeline = None
+
+        if game_dict is None or 'game' not in game_dict:
+            self.ruleset = copy.deepcopy(Game.default_ruleset)
+        else:
+            self.ruleset = copy.deepcopy(game_dict['game']['ruleset'])
+
         if game_dict is None:
             self.turn = 0
             self.board = EmptyBoard(20)
@@ -554,11 +1694,48 @@ class Game():
             )
             self.board.snakes.append(self.you)
             self.board.update_df()
+            self._analysis = None
         else:
             self.turn = game_dict['turn']
-            self.board = Board(game_dict['board'])
+            self.board = Board(game_dict['board'], lazy_df)
             self.you = Snake(game_dict['you'])
 
+            # share our snake with the board, so moving it keeps both in step
+            for snake in self.board.snakes:
+                if snake.id == self.you.id:
+                    self.you = snake
+                    break
+            self._analysis = None
+
+    def analysis_stamp(self):
+        " what an Analysis was made from, when this changes it's out of date "
+        return (self.board, self.board.version, self.turn, self.you)
+
+    @property
+    def analysis(self):
+        " derived facts for this turn, computed lazily and once (see Analysis) "
+        analysis = getattr(self, '_analysis', None)
+        if analysis is None or analysis.stamp != self.analysis_stamp():
+            analysis = Analysis(self)
+            self._analysis = analysis
+        return analysis
+
+    @property
+    def hazard_damage(self):
+        " health lost per turn on a hazard, from the ruleset "
+        return self.ruleset.get('settings', {}).get('hazardDamagePerTurn', 0)
+
+    @property
+    def shrink_every(self):
+        " turns between royale shrinks, 0 when the board doesn't shrink "
+        if self.ruleset.get('name') != 'royale':
+            return 0
+        return self.ruleset.get('settings', {}).get('royale', {}).get('shrinkEveryNTurns', 0) or 0
+
+    def hazards_ahead(self):
+        " a HazardTimeline from this turn on, with the ruleset's shrinking and damage "
+        return HazardTimeline(self.board, self.turn, self.shrink_every, self.hazard_damage)
+
     def __str__(self):
         return(f"\nSnake: {self.you.name, self.you.id}\nTurn: {self.turn}\n" + str(self.board) + "\n")
 
@@ -567,23 +1744,7 @@ class Game():
         d = {
             'game' : {
                 'id' : '8ca0476c-5c80-4f92-9117-ff914e51f10a',
-                'ruleset' : {
-                    'name'    : 'solo',
-                    'version' : 'cli',
-                    'settings' : {
-                        'foodSpawnChance'     : 15,
-                        'minimumFood'         : 1,
-                        'hazardDamagePerTurn' : 14,
-                        'hazardMap'           : '',
-                        'hazardMapAuthor'     : 'Rick N',
-                        'royale'              : { 'shrinkEveryNTurns' : 25 },
-                        'squad' : {
-                            'allowBodyCollisions' : False,
-                            'sharedElimination'   : False,
-                            'sharedHealth'        : False,
-                            'sharedLength'        : False
-                        } }
-                },
+                'ruleset' : copy.deepcopy(self.ruleset),
                 'map'     : 'empty map',
                 'timeout' : 500,
                 'source'  : ''
@@ -596,6 +1757,49 @@ class Game():
 
         return(d)
 
+    # channels of to_planes()
+    plane_names = ('you', 'enemies', 'heads', 'tails', 'food', 'hazards', 'age', 'health')
+
+    def to_planes(self, out=None, snake_id=None):
+        """
+        The board as a (channels, height, width) uint8 array, channels as in
+        plane_names: 1 on our body, on other snakes' bodies, on heads, on
+        tails, on food and on hazards, then the number of turns until each
+        body cell is vacated (1 for tails) and the health of the snake on
+        each body cell. Row y is board row y. out is an array of that shape
+        to fill instead of allocating one; snake_id takes the point of view
+        of that snake instead of ours.
+        """
+        board = self.board
+        width = board.width
+        n_cells = width * board.height
+        if out is None:
+            out = np.zeros((len(Game.plane_names), board.height, width), dtype=np.uint8)
+        else:
+            out.fill(0)
+        planes = out.reshape(len(Game.plane_names), n_cells)
+        if snake_id is None:
+            snake_id = self.you.id
+
+        def cells(positions):
+            flat = np.array([ pos.y * width + pos.x for pos in positions ], dtype=np.intp)
+            return flat[(flat >= 0) & (flat < n_cells)]
+
+        for snake in board.snakes:
+            body = np.array([ pos.y * width + pos.x for pos in snake.body ], dtype=np.intp)
+            ages = np.arange(len(body), 0, -1).clip(0, 255)
+            on = (body >= 0) & (body < n_cells)
+            body = body[on]
+            planes[0 if snake.id == snake_id else 1, body] = 1
+            planes[2, cells([snake.head])] = 1
+            planes[3, cells([snake.tail])] = 1
+            # stacked segments leave last: keep the largest age
+            np.maximum.at(planes[6], body, ages[on].astype(np.uint8))
+            planes[7, body] = max(0, min(snake.health, 255))
+        planes[4, cells(board.food)] = 1
+        planes[5, cells(board.hazards)] = 1
+        return out
+
     def clone(self, you_id=None):
         " Return copy of this game, optionally changing 'you' "
         game_state = self.as_dict()
@@ -615,6 +1819,114 @@ class Game():
 
         return clone
 
+    def copy(self, lazy_df: Optional[bool] = None):
+        " fast, independent copy of this game (for simulations, see Board.copy() and clone() to change 'you') "
+        game = Game.__new__(Game)
+        game.ruleset = copy_ruleset(self.ruleset)
+        game.timeline = self.timeline
+        game.turn = self.turn
+        game.board = self.board.copy(lazy_df)
+        game.you = self.you.copy()
+        for snake in game.board.snakes:
+            if snake.id == game.you.id:
+                game.you = snake
+                break
+        game._analysis = None
+        return game
+
+    def snapshot(self):
+        " a frozen, hashable copy of this game (see GameSnapshot) "
+        return GameSnapshot(self)
+
+    def snake_by_id(self, snake_id):
+        " the snake on the board with given id, None if it's not (or no longer) there "
+        for snake in self.board.snakes:
+            if snake.id == snake_id:
+                return snake
+        return None
+
+    def advance(self, moves: dict):
+        """
+        Play one turn with the standard rules, in place.
+
+        moves maps snake ids to directions, snakes without a move go the way
+        they're facing. Snakes move, lose 1 health (plus hazard damage), eat
+        food on their new head (health back to 100, tail stacked), and are
+        eliminated for leaving the board, starving, hitting a body or losing
+        a head-to-head. No new food is spawned. With a timeline set, hazards
+        come from it (so royale shrinking is played without touching the
+        board's hazards), otherwise from the board.
+
+        Returns the ids of the eliminated snakes, who are removed from the board.
+        """
+        board = self.board
+        snakes = list(board.snakes)
+        hazard_damage = self.hazard_damage
+        onset = self.timeline.onset if self.timeline is not None else None
+
+        for snake in snakes:
+            direction = moves.get(snake.id)
+            if direction is None:
+                if len(snake.body) > 1 and snake.body[0] != snake.body[1]:
+                    direction = snake.body[1].direction_to(snake.body[0])[0]
+                else:
+                    direction = 'up'
+            new_head = snake.head.moved_to(direction)
+            eats = new_head in board.food_cells
+            board.move_snake(snake, direction, grow=eats)
+
+            snake.health -= 1
+            if onset is not None:
+                on_hazard = board.on_board(new_head) and onset[new_head.y, new_head.x] <= self.turn
+            else:
+                on_hazard = new_head in board.hazard_cells
+            if on_hazard and not eats:
+                snake.health -= hazard_damage
+
+        # feed
+        eaten = {}
+        for snake in snakes:
+            if snake.head in board.food_cells:
+                snake.health = 100
+                eaten[snake.head] = snake
+        if eaten:
+            board.food = [ pos for pos in board.food if pos not in eaten ]
+            board.food_cells.difference_update(eaten)
+            board.version += 1
+            if board._spatial is not None:
+                for pos in eaten:
+                    while board._spatial.food.remove(pos.x, pos.y):
+                        pass
+            for pos, snake in eaten.items():
+                board.redraw_cell(pos, snake, str(board.snakes.index(snake)))
+
+        # eliminate
+        heads = {}
+        for snake in snakes:
+            heads.setdefault(snake.head, []).append(snake)
+
+        eliminated = []
+        for snake in snakes:
+            head = snake.head
+            if snake.health <= 0 or not board.on_board(head):
+                eliminated.append(snake)
+                continue
+            others = heads[head]
+            if board.occupancy[head.y, head.x] > len(others):
+                # ran into a body (ours or someone else's)
+                eliminated.append(snake)
+                continue
+            if len(others) > 1 and any(other is not snake and other.length >= snake.length for other in others):
+                # lost (or tied) a head-to-head
+                eliminated.append(snake)
+
+        if eliminated:
+            board.snakes = [ snake for snake in board.snakes if not any(snake is dead for dead in eliminated) ]
+            board.changed()
+
+        self.turn += 1
+        return [ snake.id for snake in eliminated ]
+
     def direction_and_distance_to_closest_food(self):
         " return direction(s) to closest food "
         food = self.board.food
@@ -623,14 +1935,13 @@ class Game():
 
         my_head = self.you.head
 
-        dists = []
-        for i in range(len(food)):
-            dist = my_head.distance_to(food[i])
-            dists.append(dist)
-        sorted_dists = sorted(dists)
-        closest = sorted_dists[0]
-        wanted_index = dists.index(closest)
-        wanted_food = food[wanted_index]
+        if len(food) <= Game.food_scan_limit:
+            dists = self.analysis.food_distances
+            closest = min(dists)
+            wanted_index = dists.index(closest)
+            wanted_food = food[wanted_index]
+        else:
+            wanted_food, closest = self.closest_food_in_line()
 
         food_dirs = []
         if my_head.x < wanted_food.x:
@@ -645,6 +1956,76 @@ class Game():
 
         return food_dirs, closest
 
+    # with more food than this, closest food is found with the board's spatial index
+    food_scan_limit = 16
+
+    def closest_food_in_line(self):
+        """
+        (food, straight line distance) of the food closest to our head in a
+        straight line (the first in board.food of equally close ones), from
+        the spatial index: only food that's near in moves is looked at
+        """
+        board = self.board
+        head = self.you.head
+        nearest = board.nearest_food(head)
+        if not nearest:
+            return None, None
+        # the closest in a straight line is at most sqrt(2) times further in moves
+        candidates = [ pos for _, pos in board.food_within(head, int(nearest[0][0] * 2 ** 0.5)) ]
+        distances = [ head.distance_to(pos) for pos in candidates ]
+        closest = min(distances)
+        ties = [ pos for pos, distance in zip(candidates, distances) if distance == closest ]
+        if len(ties) > 1:
+            order = { id(pos): i for i, pos in enumerate(board.food) }
+            ties.sort(key=lambda pos: order[id(pos)])
+        return ties[0], closest
+
+    def direction_and_path_to_closest_food(self, path_cache: Optional[PathCache] = None, avoid_hazards=True):
+        """
+        return direction and path to the food that's cheapest to get to, going
+        around obstructions and pricing hazards with the ruleset's hazard damage
+        """
+        board = self.board
+        my_head = self.you.head
+        hazard_cost = self.hazard_damage
+
+        # keep going for last turn's food while its path is still good, and no
+        # food that's turned up since could be cheaper to get to
+        if path_cache is not None and path_cache.goal in board.food_cells:
+            path = path_cache.reuse(board, my_head, avoid_hazards, hazard_cost)
+            if path:
+                cost = board.path_cost(path, avoid_hazards, hazard_cost)
+                if any(pos != path_cache.goal for _, pos in board.food_within(my_head, cost - 1)):
+                    path = None
+            if path:
+                path_cache.hits += 1
+                return my_head.direction_to(path[0])[0], path
+
+        best_path = None
+        best_cost = None
+        best_food = None
+        food = sorted(board.food, key=lambda pos: abs(pos.x - my_head.x) + abs(pos.y - my_head.y))
+        for food_piece in food:
+            if best_cost is not None and abs(food_piece.x - my_head.x) + abs(food_piece.y - my_head.y) >= best_cost:
+                # can't do better than what we have
+                break
+            path = board.find_path(my_head, food_piece, avoid_hazards, hazard_cost)
+            if not path:
+                continue
+            cost = board.path_cost(path, avoid_hazards, hazard_cost)
+            if best_cost is None or cost < best_cost:
+                best_path = path
+                best_cost = cost
+                best_food = food_piece
+
+        if path_cache is not None:
+            path_cache.misses += 1
+            path_cache.remember(board, best_food, best_path, avoid_hazards, hazard_cost)
+
+        if best_path is None:
+            return None, None
+        return my_head.direction_to(best_path[0])[0], best_path
+
     def direction_and_distance_to_closest_unobstructed_food(self):
         " return direction(s) and distance to closest, unobstructed food "
         food = self.board.food
@@ -653,30 +2034,17 @@ class Game():
 
         my_head = self.you.head
 
-        # filter out obstructed ones
-        food = [ x for x in food if self.board.unobstructed_between(my_head, x) ]
-        if len(food) == 0:
+        # the closest that isn't obstructed: check from the closest on, and stop at the first
+        all_dists = self.analysis.food_distances
+        wanted_food = None
+        for i in sorted(range(len(food)), key=lambda i: all_dists[i]):
+            if self.board.unobstructed_between(my_head, food[i]):
+                wanted_food = food[i]
+                closest = all_dists[i]
+                break
+        if wanted_food is None:
             return None, None
 
-        dists = []
-        for i in range(len(food)):
-            dist = my_head.distance_to(food[i])
-            dists.append(dist)
-        sorted_dists = sorted(dists)
-
-        closest = sorted_dists[0]
-        wanted_index = dists.index(closest)
-        wanted_food = food[wanted_index]
-
-        dists = []
-        for i in range(len(food)):
-            dist = my_head.distance_to(food[i])
-            dists.append(dist)
-        sorted_dists = sorted(dists)
-        closest = sorted_dists[0]
-        wanted_index = dists.index(closest)
-        wanted_food = food[wanted_index]
-
         food_dirs = []
         if my_head.x < wanted_food.x:
             food_dirs.append('right')
@@ -691,14 +2059,39 @@ class Game():
         return food_dirs, closest
 
 
+    def reachable_area(self, direction):
+        """
+        Number of cells we could still use after moving in given direction,
+        counting body segments (our own tail too) that move out of the way in time
+        (see Board.timed_reachability)
+        """
+        new_head = self.you.head.moved_to(direction)
+        if not self.board.on_board(new_head):
+            return 0
+
+        vacate = self.board.vacate_turns()
+        if vacate[new_head.y, new_head.x] > 1:
+            return 0
+        arrival = self.board.timed_reachability(new_head, start_turn=1, vacate=vacate)
+        return int((arrival > 0).sum())
+
+    def pocket_sizes(self):
+        """
+        For all four moves at once, {direction: {region, size, tail, food, trapped}}:
+        the region of free cells we'd move into and how big it is, whether it
+        leads to our tail, has food, or is smaller than us (see Analysis.pockets).
+        One labelling of the board per turn, rather than towards_dead_end() per direction
+        """
+        return { direction: dict(pocket) for direction, pocket in self.analysis.pockets.items() }
+
     def towards_dead_end(self, direction):
         " are you facing a dead end ?"
 
         board_width = self.board.width
         board_height = self.board.height
 
-        # board without food
-        board_df = self.board.df.replace(['f'], ' ')
+        # free cells (food isn't an obstruction), worked out once per turn
+        analysis = self.analysis
 
         # position of our head + move in direction
         new_head = self.you.head.moved_to(direction)
@@ -716,7 +2109,7 @@ class Game():
         dead_end = False
 
         # if we get to an open spot, then not a dead end
-        while move_x >= 0 and move_x < board_width and move_y >= 0 and move_y < board_height and (self.board.is_free({'x':move_x, 'y':move_y}) or (move_x == self.you.head.x and move_y == self.you.head.y)):
+        while move_x >= 0 and move_x < board_width and move_y >= 0 and move_y < board_height and (analysis.is_board_free(move_x, move_y) or (move_x == self.you.head.x and move_y == self.you.head.y)):
 
             no_moves = False
 
@@ -752,9 +2145,9 @@ class Game():
             print(f"side positions = {side_positions}")
 
             pos_is_free = []
-            pos_is_free.append( self.board.is_free(ahead_position))
-            pos_is_free.append( self.board.is_free(side_positions[0]))
-            pos_is_free.append( self.board.is_free(side_positions[1]))
+            pos_is_free.append( analysis.is_board_free(ahead_position['x'], ahead_position['y']))
+            pos_is_free.append( analysis.is_board_free(side_positions[0]['x'], side_positions[0]['y']))
+            pos_is_free.append( analysis.is_board_free(side_positions[1]['x'], side_positions[1]['y']))
             print(f"are those positions free: {pos_is_free}")
             num_free = sum(pos_is_free)
 
@@ -784,3 +2177,148 @@ class Game():
         return dead_end
 
 
+
+
+def copy_ruleset(value):
+    " a copy of a ruleset's dicts and lists, for Game.copy() (much cheaper than copy.deepcopy) "
+    if isinstance(value, dict):
+        return { key: copy_ruleset(item) for key, item in value.items() }
+    if isinstance(value, list):
+        return [ copy_ruleset(item) for item in value ]
+    return value
+
+
+def freeze(value):
+    " value (dicts, lists and scalars) as nested tuples, so it's immutable and hashable (see thaw()) "
+    if isinstance(value, dict):
+        return ('dict', tuple((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return ('list', tuple(freeze(item) for item in value))
+    return value
+
+
+def thaw(value):
+    " the dicts and lists freeze() was given "
+    if isinstance(value, tuple):
+        kind, items = value
+        if kind == 'dict':
+            return { key: thaw(item) for key, item in items }
+        return [ thaw(item) for item in items ]
+    return value
+
+
+class GameSnapshot():
+    """
+    A frozen copy of a Game that can be shared between threads, caches and
+    transposition tables without defensive copies: it can't be modified,
+    and it hashes and compares by value.
+
+    Everything is tuples: snakes is a tuple of (id, name, health, body)
+    with body a tuple of (x, y) head first, food, hazards and crumbs are
+    tuples of (x, y), and you is our snake (also when it's no longer on
+    the board). The ruleset is kept frozen (see freeze()), and a game's
+    HazardTimeline, which is only for simulations, isn't kept.
+
+    Game.snapshot() makes one, to_game() makes an independent Game back.
+    """
+
+    __slots__ = ('turn', 'width', 'height', 'snakes', 'food', 'hazards', 'crumbs', 'you', 'ruleset', '_hash')
+
+    def __init__(self, game: 'Game'):
+        board = game.board
+        def snake_state(snake):
+            return (snake.id, snake.name, snake.health, tuple((pos.x, pos.y) for pos in snake.body))
+        snakes = tuple(snake_state(snake) for snake in board.snakes)
+        you = next((state for snake, state in zip(board.snakes, snakes) if snake is game.you), None)
+        fields = {
+            'turn': game.turn,
+            'width': board.width,
+            'height': board.height,
+            'snakes': snakes,
+            'food': tuple((pos.x, pos.y) for pos in board.food),
+            'hazards': tuple((pos.x, pos.y) for pos in board.hazards),
+            'crumbs': tuple((pos.x, pos.y) for pos in board.crumbs),
+            'you': you if you is not None else snake_state(game.you),
+            'ruleset': freeze(game.ruleset),
+        }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_hash', hash(self.state()))
+
+    def state(self):
+        " everything that makes this snapshot, as one tuple "
+        return (self.turn, self.width, self.height, self.snakes, self.food, self.hazards, self.crumbs,
+                self.you, self.ruleset)
+
+    def __setattr__(self, name, value):
+        raise Exception("can't modify a GameSnapshot")
+
+    def __delattr__(self, name):
+        raise Exception("can't modify a GameSnapshot")
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, GameSnapshot):
+            return NotImplemented
+        return self is other or (self._hash == other._hash and self.state() == other.state())
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (GameSnapshot._from_state, self.state())
+
+    @classmethod
+    def _from_state(cls, *state):
+        snapshot = cls.__new__(cls)
+        names = ('turn', 'width', 'height', 'snakes', 'food', 'hazards', 'crumbs', 'you', 'ruleset')
+        for name, value in zip(names, state):
+            object.__setattr__(snapshot, name, value)
+        object.__setattr__(snapshot, '_hash', hash(state))
+        return snapshot
+
+    def __repr__(self):
+        return f"GameSnapshot(turn={self.turn}, {self.width}x{self.height}, snakes={[ s[0] for s in self.snakes ]})"
+
+    def snake(self, snake_id):
+        " the (id, name, health, body) of the snake on the board with given id, None if it's not there "
+        return next((snake for snake in self.snakes if snake[0] == snake_id), None)
+
+    def to_game(self, lazy_df=True):
+        """
+        an independent Game of this snapshot. With lazy_df (see Board.copy())
+        the df is only built when it's read, which is most of the cost
+        """
+        def make_snake(state):
+            snake = Snake()
+            snake.id, snake.name, snake.health, body = state
+            snake.body = deque(Pos(x, y) for x, y in body)
+            return snake
+
+        board = Board.__new__(Board)
+        board.width = self.width
+        board.height = self.height
+        board.positions = PosTable.for_geometry(self.width, self.height)
+        board.snakes = [ make_snake(state) for state in self.snakes ]
+        board.food = [ Pos(x, y) for x, y in self.food ]
+        board.hazards = [ Pos(x, y) for x, y in self.hazards ]
+        board.crumbs = [ Pos(x, y) for x, y in self.crumbs ]
+        board.lazy_df = lazy_df
+        board.df_stale = False
+        board.version = 0
+        board._df = None
+        board.changed()
+
+        game = Game.__new__(Game)
+        game.ruleset = thaw(self.ruleset)
+        game.timeline = None
+        game.turn = self.turn
+        game.board = board
+        game.you = next((snake for snake in board.snakes if snake.id == self.you[0]), None) or make_snake(self.you)
+        game._analysis = None
+        return game
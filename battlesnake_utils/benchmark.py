@@ -0,0 +1,279 @@
+"""
+Benchmarks of the hot paths, and a regression gate against a saved baseline.
+
+Each benchmark times one operation on the same mid-game position (see
+position()). A run calls it enough times to take at least min_time, and
+is repeated `repeats` times; its result is the median time per call over
+the runs, with a bootstrap confidence interval of that median. Each run
+is preceded by a run of reference(), plain Python work that doesn't use
+this package, and the median of the ratios is kept too: a machine's
+speed drifts by tens of percent from one process to the next, those
+ratios hardly move.
+
+compare() uses the ratios. It flags a benchmark as regressed when it's
+more than threshold slower than in the baseline and the two confidence
+intervals don't overlap, so a noisy run alone doesn't fail it. Baselines
+only mean something on the machine (and Python) they were saved on.
+
+    python -m battlesnake_utils.benchmark --save baseline.json
+    python -m battlesnake_utils.benchmark --compare baseline.json
+
+The same comparison runs in the tests when the environment variable
+BATTLESNAKE_BENCHMARK_BASELINE names a baseline (and is skipped otherwise),
+with BATTLESNAKE_BENCHMARK_THRESHOLD to change the threshold.
+"""
+from typing import Callable, Optional
+
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+
+from .battlesnake import Board, Game, Pos, Walk
+
+baseline_variable = 'BATTLESNAKE_BENCHMARK_BASELINE'
+threshold_variable = 'BATTLESNAKE_BENCHMARK_THRESHOLD'
+default_threshold = 0.25
+
+
+def position():
+    " the game state all benchmarks use: 11x11, four snakes, food, and royale hazards along two edges "
+    def snake(i, health, body):
+        return { 'id': f"snake-{i}", 'name': f"snake-{i}", 'latency': '0', 'health': health,
+                 'body': [ {'x': x, 'y': y} for x, y in body ], 'head': {'x': body[0][0], 'y': body[0][1]},
+                 'length': len(body), 'shout': '', 'squad': '', 'customizations': {} }
+
+    snakes = [
+        # us, curled around two free cells
+        snake(0, 72, [(5, 5), (5, 6), (5, 7), (4, 7), (3, 7), (3, 6), (3, 5), (3, 4), (4, 4), (5, 4)]),
+        snake(1, 55, [(8, 8), (8, 7), (8, 6), (8, 5), (8, 4), (7, 4), (7, 3), (7, 2)]),
+        snake(2, 90, [(1, 9), (2, 9), (3, 9), (4, 9), (5, 9), (6, 9)]),
+        snake(3, 40, [(9, 1), (8, 1), (7, 1), (6, 1), (5, 1), (4, 1), (3, 1), (2, 1), (1, 1), (1, 2), (1, 3), (1, 4)]),
+    ]
+    board = {
+        'width': 11,
+        'height': 11,
+        'snakes': snakes,
+        'food': [ {'x': x, 'y': y} for x, y in ((0, 0), (6, 6), (10, 10), (2, 5), (9, 5)) ],
+        'hazards': [ {'x': 10, 'y': y} for y in range(11) ] + [ {'x': x, 'y': 10} for x in range(10) ],
+    }
+    ruleset = dict(Game.default_ruleset, name='royale')
+    return { 'game': { 'id': 'benchmark', 'ruleset': ruleset, 'map': 'royale', 'timeout': 500, 'source': '' },
+             'turn': 120, 'board': board, 'you': snakes[0] }
+
+
+def benchmarks():
+    " {name: operation to time}, all on position() "
+    state = position()
+    game = Game(state)
+    board = game.board
+    head = game.you.head
+    neighbours = [ head.moved_to(direction) for direction in Pos.all_directions ]
+
+    def board_construction():
+        Board(state['board'])
+
+    def is_free():
+        for pos in neighbours:
+            board.is_free(pos)
+
+    def walk_perimeter():
+        Walk(board, neighbours[2], 'right').walk_perimeter()
+
+    def clone():
+        game.clone()
+
+    # the food helpers read the turn's Analysis, which is computed once a turn
+    def closest_food():
+        game._analysis = None
+        game.direction_and_distance_to_closest_food()
+
+    def path_to_food():
+        game._analysis = None
+        game.direction_and_path_to_closest_food()
+
+    def unobstructed_food():
+        game._analysis = None
+        game.direction_and_distance_to_closest_unobstructed_food()
+
+    return {
+        'board_construction': board_construction,
+        'is_free': is_free,
+        'walk_perimeter': walk_perimeter,
+        'clone': clone,
+        'closest_food': closest_food,
+        'path_to_food': path_to_food,
+        'unobstructed_food': unobstructed_food,
+    }
+
+
+def reference():
+    " a fixed amount of plain Python work, to compare the benchmarks with "
+    table = {}
+    total = 0
+    for i in range(2000):
+        table[i & 255] = table.get(i & 255, 0) + i
+        total += len(str(i))
+    return total
+
+
+def calls_for(function: Callable, min_time: float):
+    " how many calls of function take at least min_time "
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls
+        # aim a little over min_time, at most 10 times more calls at once
+        calls = max(calls + 1, min(calls * 10, int(calls * min_time * 1.2 / max(elapsed, 1e-9))))
+
+
+def median_interval(samples, confidence=0.95, resamples=2000, seed=0):
+    " (median, low, high): the median of samples and a bootstrap confidence interval for it "
+    samples = np.asarray(samples, dtype=np.float64)
+    rnd = np.random.default_rng(seed)
+    medians = np.median(rnd.choice(samples, size=(resamples, len(samples))), axis=1)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(medians, [tail, 100 - tail])
+    return float(np.median(samples)), float(low), float(high)
+
+
+def measure(function: Callable, repeats=15, min_time=0.02):
+    " the timing of function: repeats runs of at least min_time each, summarised (see median_interval()) "
+    calls = calls_for(function, min_time)
+    reference_calls = calls_for(reference, min_time)
+
+    def timed(function, calls):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        return (time.perf_counter() - start) / calls
+
+    runs = []
+    relative = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            reference_time = timed(reference, reference_calls)
+            run_time = timed(function, calls)
+            runs.append(run_time)
+            relative.append(run_time / reference_time)
+    finally:
+        if enabled:
+            gc.enable()
+    median, low, high = median_interval(runs)
+    relative_median, relative_low, relative_high = median_interval(relative)
+    return {
+        'ops_per_sec': 1 / median,
+        'median_us': median * 1e6,
+        'ci_us': [low * 1e6, high * 1e6],
+        'relative': relative_median,
+        'relative_ci': [relative_low, relative_high],
+        'runs_us': [ run * 1e6 for run in runs ],
+        'calls': calls,
+    }
+
+
+def run(names=None, repeats=15, min_time=0.02):
+    " measure() the benchmarks (all, or those named), as a results dict that save() writes "
+    operations = benchmarks()
+    if names is not None:
+        unknown = [ name for name in names if name not in operations ]
+        if unknown:
+            raise Exception(f"benchmark: unknown benchmarks: {unknown}")
+        operations = { name: operations[name] for name in names }
+    return {
+        'version': 1,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeats': repeats,
+        'benchmarks': { name: measure(function, repeats, min_time) for name, function in operations.items() },
+    }
+
+
+def save(results: dict, path: str):
+    " write results to path as JSON "
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # write then rename, so a reader never sees half a file
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(temp, path)
+
+
+def load(path: str):
+    with open(path) as f:
+        results = json.load(f)
+    if results.get('version') != 1:
+        raise Exception(f"benchmark: {path} isn't a version 1 benchmark result")
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold=default_threshold):
+    """
+    per benchmark in both, {name, baseline_us, current_us, change, regressed}:
+    change is how much slower it is relative to reference() (0.1 is 10%
+    slower), and regressed is set when that's over threshold and the
+    confidence intervals don't overlap
+    """
+    comparison = []
+    for name, now in current['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is None:
+            continue
+        change = now['relative'] / before['relative'] - 1
+        comparison.append({
+            'name': name,
+            'baseline_us': before['median_us'],
+            'current_us': now['median_us'],
+            'change': change,
+            'regressed': change > threshold and now['relative_ci'][0] > before['relative_ci'][1],
+        })
+    return comparison
+
+
+def report(comparison, out=sys.stdout):
+    " print a table of compare() results "
+    print(f"{'benchmark':<20} {'baseline us':>12} {'current us':>12} {'change':>8}", file=out)
+    for row in comparison:
+        flag = '  REGRESSED' if row['regressed'] else ''
+        print(f"{row['name']:<20} {row['baseline_us']:12.2f} {row['current_us']:12.2f} {row['change']:+8.1%}{flag}",
+              file=out)
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="benchmark the hot paths, save or compare against a baseline")
+    parser.add_argument('--save', metavar='PATH', help="save the results as a baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare with a saved baseline, exit 1 on a regression")
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="run only these benchmarks")
+    parser.add_argument('--repeats', type=int, default=15)
+    parser.add_argument('--min-time', type=float, default=0.02, help="seconds per run of a benchmark")
+    parser.add_argument('--threshold', type=float, default=default_threshold, help="slowdown allowed, 0.25 is 25%%")
+    args = parser.parse_args(argv)
+
+    results = run(args.only, args.repeats, args.min_time)
+    if args.save:
+        save(results, args.save)
+    if args.compare:
+        comparison = compare(load(args.compare), results, args.threshold)
+        report(comparison)
+        return 1 if any(row['regressed'] for row in comparison) else 0
+    for name, result in results['benchmarks'].items():
+        low, high = result['ci_us']
+        print(f"{name:<20} {result['median_us']:10.2f} us  [{low:.2f}, {high:.2f}]  {result['ops_per_sec']:12.0f} ops/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
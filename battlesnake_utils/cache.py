@@ -0,0 +1,198 @@
+"""
+A bounded cache for evaluations of game states.
+
+Entries are keyed on a canonical hash of the state: what's on the board
+(Board.cell_codes(), so the same board reached by other moves gives the
+same key), each snake's body cells in order (head to tail, which
+vacate_turns() and the like depend on), the snakes' health (in buckets),
+for a Game its ruleset, and its turn only when hazards to come depend on
+it (a HazardTimeline, or a royale board that shrinks), so other games hit
+across turns, and the arguments of the call. Least recently used entries
+are evicted when there are more than max_entries, or their estimated size
+is over max_bytes.
+
+Evaluation functions opt in with the cached decorator:
+
+    @cached
+    def my_eval(game, snake_id):
+        ...
+
+and the library helpers (Walk.walk_perimeter, Game.towards_dead_end and
+Board.unobstructed_between) with cache_helpers().
+
+Only snakes, food, hazards and crumbs are hashed, a df changed directly
+(board.df.at[y, x] = ...) isn't seen.
+"""
+from typing import Callable, Optional
+
+import sys
+import hashlib
+import functools
+import numpy as np
+from collections import OrderedDict
+
+from .battlesnake import Board, Game, Pos, Walk
+
+# returned by get() when there's no entry
+missing = object()
+
+
+class EvalCache():
+    """
+    LRU cache of evaluations, bounded by number of entries and (estimated)
+    bytes. Snakes whose health is in the same health_bucket hash the same.
+    Counts hits, misses and evictions.
+    """
+
+    # bytes per entry on top of its key and value (dict slot, list node, ints)
+    entry_overhead = 120
+
+    def __init__(self, max_entries=100000, max_bytes=64 << 20, health_bucket=10):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.health_bucket = health_bucket
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    @property
+    def stats(self):
+        return { 'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits,
+                 'misses': self.misses, 'evictions': self.evictions }
+
+    def clear(self):
+        " drop all entries (the counters are kept) "
+        self.entries.clear()
+        self.bytes = 0
+
+    def key(self, state, *args, **kwargs):
+        """
+        canonical key for a call on state (a Game, Board or Walk) with given
+        arguments. A game adds which snake is us, a walk its position and direction.
+        """
+        extra = []
+        if isinstance(state, Walk):
+            board = state.board
+            extra = ['walk', state.pos, state.direction]
+        elif isinstance(state, Game):
+            board = state.board
+            # today's hazards are in cell_codes(), the turn only matters for those to come
+            turn = state.turn if state.timeline is not None or state.shrink_every > 0 else None
+            extra = ['game', state.you.id, state.you.head, turn, state.ruleset]
+        elif isinstance(state, Board):
+            board = state
+        else:
+            raise Exception(f"EvalCache.key: can't hash state of type: {type(state)}")
+
+        buckets = np.array([ snake.health // self.health_bucket for snake in board.snakes ], dtype=np.int32)
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.array([board.width, board.height], dtype=np.int32).tobytes())
+        digest.update(board.cell_codes().tobytes())
+        digest.update(buckets.tobytes())
+        for snake in board.snakes:
+            # -1 ends each body, so bodies split differently don't hash the same
+            cells = [ pos.y * board.width + pos.x for pos in snake.body ] + [-1]
+            digest.update(np.array(cells, dtype=np.int32).tobytes())
+        digest.update(repr(canonical(extra + list(args) + sorted(kwargs.items()))).encode())
+        return digest.digest()
+
+    def get(self, key, default=None):
+        " the value for key (now the most recently used), or default "
+        value = self.entries.get(key, missing)
+        if value is missing:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value[0]
+
+    def put(self, key, value):
+        " store value for key, evicting least recently used entries to stay within bounds "
+        size = len(key) + sys.getsizeof(value) + self.entry_overhead
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self.entries[key] = (value, size)
+        self.bytes += size
+
+        while len(self.entries) > self.max_entries or (self.bytes > self.max_bytes and len(self.entries) > 1):
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def cached(self, function: Callable):
+        " decorator: cache function(state, ...) in this cache "
+        name = function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(state, *args, **kwargs):
+            key = self.key(state, name, *args, **kwargs)
+            value = self.get(key, missing)
+            if value is missing:
+                value = function(state, *args, **kwargs)
+                self.put(key, value)
+            return value
+
+        wrapper.uncached = function
+        wrapper.cache = self
+        return wrapper
+
+
+def canonical(value):
+    " arguments made hashable and repr()-stable: positions become (x, y) "
+    if isinstance(value, Pos):
+        return (value.x, value.y)
+    if isinstance(value, dict):
+        if set(value) == {'x', 'y'}:
+            return (value['x'], value['y'])
+        return tuple(sorted((k, canonical(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(canonical(v) for v in value)
+    return value
+
+
+default_cache = EvalCache()
+
+
+def cached(function: Optional[Callable] = None, cache: Optional[EvalCache] = None):
+    """
+    decorator for functions whose first argument is a Game, Board or Walk,
+    as @cached (uses default_cache) or @cached(cache=my_cache)
+    """
+    if function is None:
+        return lambda f: cached(f, cache)
+    return (cache if cache is not None else default_cache).cached(function)
+
+
+# the library helpers cache_helpers() wraps, as (class, method name)
+helpers = [ (Walk, 'walk_perimeter'), (Game, 'towards_dead_end'), (Board, 'unobstructed_between') ]
+
+
+def cache_helpers(cache: Optional[EvalCache] = None):
+    """
+    make the library helpers use cache (default_cache if not given). A cached
+    walk_perimeter() returns the area without walking, the Walk isn't moved.
+    """
+    if cache is None:
+        cache = default_cache
+    uncache_helpers()
+    for cls, name in helpers:
+        setattr(cls, name, cache.cached(getattr(cls, name)))
+    return cache
+
+
+def uncache_helpers():
+    " back to the uncached library helpers "
+    for cls, name in helpers:
+        method = getattr(cls, name)
+        if hasattr(method, 'uncached'):
+            setattr(cls, name, method.uncached)
@@ -0,0 +1,158 @@
+"""
+Training data from archived games: feature planes (see Game.to_planes())
+with the move that was played, written as sharded .npy files.
+
+A replay archive is a file of game states, one JSON object per line (as
+sent to a snake each turn, or Game.as_dict()), gzipped if the name ends
+in .gz. Turns of a game follow each other; the move played on a turn is
+read from where our head is on the next one. export() converts archives
+in a pool of worker processes and streams the samples into shards of
+shard_size, one set of shards per board size:
+
+    planes-11x11-00000.npy   uint8 (n, channels, 11, 11)
+    moves-11x11-00000.npy    uint8 (n,) index in Pos.all_directions
+
+The eight symmetries of the board (see dihedral()) are views of the
+planes, with the moves remapped to match (see dihedral_moves()), so
+augmenting a batch copies nothing.
+"""
+from typing import Optional
+
+import os
+import gzip
+import functools
+import json
+import multiprocessing
+import numpy as np
+
+from .battlesnake import Game, Pos
+
+# the 8 symmetries: k % 4 quarter turns, after a left/right flip for k >= 4
+n_symmetries = 8
+
+
+def dihedral(planes, k: int):
+    """
+    symmetry k of planes (..., height, width), a view: a left/right flip
+    when k >= 4, then k % 4 quarter turns (up becomes right, with rows as y)
+    """
+    if k >= 4:
+        planes = planes[..., ::-1]
+    return np.rot90(planes, k % 4, axes=(-2, -1))
+
+
+# index of each direction (Pos.all_directions order) under symmetry k
+move_maps = np.array([ [ ((2 - i) % 4 if k >= 4 else i) + k % 4 for i in range(4) ] for k in range(n_symmetries) ],
+                     dtype=np.uint8) % 4
+
+
+def dihedral_moves(moves, k: int):
+    " move indices (Pos.all_directions) as they are under symmetry k "
+    return move_maps[k][moves]
+
+
+def augmented(planes, moves):
+    " (planes, moves) for each of the 8 symmetries of a batch, as views "
+    for k in range(n_symmetries):
+        yield dihedral(planes, k), dihedral_moves(moves, k)
+
+
+def read_archive(path: str):
+    " the game state dicts in a replay archive, in order "
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def game_key(state: dict):
+    return (state.get('game', {}).get('id'), state['you']['id'])
+
+
+def samples(path: str, every_snake=False):
+    """
+    (planes, moves) arrays for the turns of the games in a replay archive
+    that have a next turn to read the move from; with every_snake, from each
+    snake's point of view (otherwise ours)
+    """
+    planes = []
+    moves = []
+    previous = None
+    for state in read_archive(path):
+        if previous is not None and game_key(previous) == game_key(state) and state['turn'] == previous['turn'] + 1:
+            game = Game(previous, lazy_df=True)
+            heads = { snake['id']: Pos(snake['body'][0]) for snake in state['board']['snakes'] }
+            snakes = game.board.snakes if every_snake else [game.you]
+            for snake in snakes:
+                head = heads.get(snake.id)
+                if head is None or snake.head.distance_to(head) != 1:
+                    # eliminated: the move isn't known
+                    continue
+                game.you = snake
+                planes.append(game.to_planes())
+                moves.append(Pos.all_directions.index(snake.head.direction_to(head)[0]))
+        previous = state
+    if not planes:
+        return None
+    return np.stack(planes), np.array(moves, dtype=np.uint8)
+
+
+class ShardWriter():
+    " collects samples per board size and writes them out shard_size at a time "
+
+    def __init__(self, out_dir: str, shard_size: int):
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.pending = {}
+        self.shards = {}
+        self.paths = []
+        os.makedirs(out_dir, exist_ok=True)
+
+    def add(self, planes, moves):
+        size = f"{planes.shape[-1]}x{planes.shape[-2]}"
+        self.pending.setdefault(size, []).append((planes, moves))
+        while sum(len(p) for p, m in self.pending[size]) >= self.shard_size:
+            self.flush(size, self.shard_size)
+
+    def flush(self, size: str, count: Optional[int] = None):
+        " write count (default all) pending samples of size as a shard "
+        pending = self.pending.get(size)
+        if not pending:
+            return
+        planes = np.concatenate([ p for p, m in pending ])
+        moves = np.concatenate([ m for p, m in pending ])
+        if count is None:
+            count = len(planes)
+        rest = (planes[count:].copy(), moves[count:].copy())
+        self.pending[size] = [rest] if len(rest[0]) else []
+
+        shard = self.shards.get(size, 0)
+        self.shards[size] = shard + 1
+        for name, data in (('planes', planes[:count]), ('moves', moves[:count])):
+            path = os.path.join(self.out_dir, f"{name}-{size}-{shard:05d}.npy")
+            # write then rename, so a reader never sees half a file
+            temp = f"{path}.{os.getpid()}.tmp"
+            with open(temp, 'wb') as f:
+                np.save(f, data)
+            os.replace(temp, path)
+            self.paths.append(path)
+
+    def close(self):
+        for size in list(self.pending):
+            self.flush(size)
+
+
+def export(archives, out_dir: str, shard_size=65536, processes: Optional[int] = None, every_snake=False):
+    """
+    convert replay archives (paths) to shards in out_dir (see the module
+    docstring), in a pool of processes; returns the paths written
+    """
+    writer = ShardWriter(out_dir, shard_size)
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(functools.partial(samples, every_snake=every_snake), archives):
+            if result is not None:
+                writer.add(*result)
+    writer.close()
+    return writer.paths
@@ -0,0 +1,101 @@
+"""
+Evaluation functions for search.
+
+Each takes a game and a snake id and returns a score from that snake's
+point of view, higher is better. Use weighted() to combine them. Searches
+score finished games themselves, with lost_score and won_score.
+"""
+from collections import deque
+
+from .battlesnake import Game
+
+# scores for snakes that are out of the game, or the last one standing
+lost_score = -1000.0
+won_score = 1000.0
+
+
+def area(game: Game, snake_id):
+    " share of the board this snake can still reach (see Board.timed_reachability) "
+    snake = game.snake_by_id(snake_id)
+    if snake is None:
+        return 0.0
+    board = game.board
+    return board.reachable_area(snake.head) / (board.width * board.height)
+
+
+def length(game: Game, snake_id):
+    " how much longer this snake is than its longest opponent, in segments "
+    snake = game.snake_by_id(snake_id)
+    if snake is None:
+        return 0.0
+    others = [ other.length for other in game.board.snakes if other is not snake ]
+    return float(snake.length - max(others)) if others else float(snake.length)
+
+
+def health(game: Game, snake_id):
+    " health, from 0 to 1 "
+    snake = game.snake_by_id(snake_id)
+    return snake.health / 100 if snake is not None else 0.0
+
+
+def territory(game: Game, snake_id):
+    """
+    share of the free cells this snake's head gets to first (ties go to
+    nobody), a multi-source breadth first search from all heads
+    """
+    snake = game.snake_by_id(snake_id)
+    if snake is None:
+        return 0.0
+
+    board = game.board
+    width = board.width
+    blocked = (board.occupancy > 0).ravel().tolist()
+    for pos in board.hazards:
+        blocked[pos.y * width + pos.x] = True
+    neighbours = board.positions.cell_neighbours
+
+    owner = [-1] * (width * board.height)
+    distance = [-1] * (width * board.height)
+    queue = deque()
+    for i, other in enumerate(board.snakes):
+        if not board.on_board(other.head):
+            continue
+        cell = other.head.y * width + other.head.x
+        if distance[cell] == 0:
+            owner[cell] = -2
+        else:
+            owner[cell] = i
+            distance[cell] = 0
+            queue.append(cell)
+
+    while queue:
+        cell = queue.popleft()
+        if owner[cell] == -2:
+            continue
+        for next_cell in neighbours[cell]:
+            if blocked[next_cell]:
+                continue
+            if distance[next_cell] < 0:
+                distance[next_cell] = distance[cell] + 1
+                owner[next_cell] = owner[cell]
+                queue.append(next_cell)
+            elif distance[next_cell] == distance[cell] + 1 and owner[next_cell] != owner[cell]:
+                owner[next_cell] = -2
+
+    i = board.snakes.index(snake)
+    mine = sum(1 for cell in range(len(owner)) if owner[cell] == i and not blocked[cell])
+    free = blocked.count(False)
+    return mine / free if free else 0.0
+
+
+def weighted(area_weight=1.0, length_weight=0.1, health_weight=0.1, territory_weight=1.0):
+    " an evaluation function adding up the ones above with given weights "
+    parts = [ (weight, function) for weight, function in ((area_weight, area), (length_weight, length),
+              (health_weight, health), (territory_weight, territory)) if weight ]
+
+    def evaluate(game: Game, snake_id):
+        if game.snake_by_id(snake_id) is None:
+            return lost_score
+        return sum(weight * function(game, snake_id) for weight, function in parts)
+
+    return evaluate
@@ -0,0 +1,372 @@
+"""
+Space filling for solo games: follow a Hamiltonian cycle of the board, so
+the snake can grow until it fills it, taking shortcuts to food while we're
+short enough for them to be safe.
+
+A cycle depends only on the board size and the hazards (cells we never
+enter), so cycles are cached, in memory and on disk, by (width, height,
+hazard layout), and a board like the 19x21 arcade maze is only worked out
+once. Boards that have no Hamiltonian cycle (both sides odd, dead end
+corridors between hazards) get the longest cycle the construction finds.
+"""
+
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict, deque
+
+from .battlesnake import Board, Game, PosTable
+
+# where cycles are kept on disk, unless a planner is given its own cache_dir
+default_cache_dir = os.environ.get('BATTLESNAKE_CYCLE_CACHE',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'battlesnake_utils', 'cycles'))
+
+
+def boustrophedon(width: int, height: int):
+    """
+    Hamiltonian cycle of a full width x height board with an even side, as
+    flat cell indices (y * width + x): along the bottom row, back and forth
+    up the board leaving the first column free, then down the first column
+    """
+    if height % 2 != 0:
+        # go back and forth along columns instead: build it transposed
+        return [ (cell % height) * width + cell // height for cell in boustrophedon(height, width) ]
+
+    cycle = list(range(width))
+    for y in range(1, height):
+        xs = range(width - 1, 0, -1) if y % 2 == 1 else range(1, width)
+        cycle += [ y * width + x for x in xs ]
+    cycle += [ y * width for y in range(height - 1, 0, -1) ]
+    return cycle
+
+
+def detours(start: int, usable, neighbours):
+    """
+    breadth first search from start through usable cells, yielding
+    (path, cell) for every unusable cell next to the cells reached: path is
+    the shortest path of usable cells from start to next to cell
+    """
+    came_from = {}
+    queue = deque()
+    for cell in neighbours[start]:
+        if usable[cell]:
+            came_from[cell] = -1
+            queue.append(cell)
+    while queue:
+        cell = queue.popleft()
+        for next_cell in neighbours[cell]:
+            if usable[next_cell]:
+                if next_cell not in came_from:
+                    came_from[next_cell] = cell
+                    queue.append(next_cell)
+            elif next_cell != start:
+                path = []
+                at = cell
+                while at >= 0:
+                    path.append(at)
+                    at = came_from[at]
+                path.reverse()
+                yield path, next_cell
+
+
+def build_cycle(width: int, height: int, blocked=()):
+    """
+    A cycle through the cells of a width x height board that aren't blocked,
+    as a list of flat cell indices, as long as can be found (empty if there's
+    no cycle at all).
+
+    A full board with an even side gets a boustrophedon. Otherwise a first
+    cycle is found, then extended while possible: an edge u -> v is replaced
+    with u -> c -> d -> v when c and d are two free cells next to it, or
+    failing that the part of the cycle between two cells with a longer path
+    through cells it doesn't use.
+    """
+    n_cells = width * height
+    blocked = set(blocked)
+    if not blocked and width > 1 and height > 1 and (width % 2 == 0 or height % 2 == 0):
+        return boustrophedon(width, height)
+
+    neighbours = PosTable.for_geometry(width, height).cell_neighbours
+    free = [ cell not in blocked for cell in range(n_cells) ]
+    nxt = [-1] * n_cells
+
+    # first cycle: an edge a -> b, closed by a path back from b to a
+    usable = list(free)
+    for a in range(n_cells):
+        if not free[a]:
+            continue
+        usable[a] = False
+        path = None
+        for b in neighbours[a]:
+            if free[b]:
+                usable[b] = False
+                path = next((path for path, end in detours(b, usable, neighbours) if end == a), None)
+                usable[b] = True
+                if path is not None:
+                    break
+        if path is not None:
+            break
+        usable[a] = True
+    else:
+        return []
+
+    nxt[a] = b
+    usable[b] = False
+    previous = b
+    for cell in path:
+        nxt[previous] = cell
+        usable[cell] = False
+        previous = cell
+    nxt[previous] = a
+
+    def replace(u, v, cells):
+        " the cycle goes u -> cells -> v, the cells it went through from u to v are free again "
+        cell = nxt[u]
+        while cell != v:
+            following = nxt[cell]
+            nxt[cell] = -1
+            usable[cell] = True
+            cell = following
+        for cell in cells:
+            nxt[u] = cell
+            usable[cell] = False
+            u = cell
+        nxt[u] = v
+
+    def places():
+        " place of each cell along the cycle, from a "
+        place = {a: 0}
+        cell = nxt[a]
+        while cell != a:
+            place[cell] = len(place)
+            cell = nxt[cell]
+        return place
+
+    extended = True
+    while extended:
+        extended = False
+
+        # cheap extensions first
+        for u in [ cell for cell in range(n_cells) if nxt[cell] >= 0 ]:
+            v = nxt[u]
+            for c in neighbours[u]:
+                if not usable[c]:
+                    continue
+                d = c + (v - u)
+                if 0 <= d < n_cells and usable[d] and d in neighbours[c] and d in neighbours[v]:
+                    replace(u, v, [c, d])
+                    extended = True
+                    break
+        if extended:
+            continue
+
+        # then replace the part of the cycle between two cells with a longer path
+        place = places()
+        n = len(place)
+        for u in list(place):
+            for path, v in detours(u, usable, neighbours):
+                if v not in place:
+                    continue
+                ahead = (place[v] - place[u]) % n
+                behind = n - ahead
+                if len(path) > ahead - 1:
+                    replace(u, v, path)
+                elif len(path) > behind - 1:
+                    replace(v, u, path[::-1])
+                else:
+                    continue
+                extended = True
+                break
+            if extended:
+                break
+
+    cycle = [a]
+    cell = nxt[a]
+    while cell != a:
+        cycle.append(cell)
+        cell = nxt[cell]
+    return cycle
+
+
+class HamiltonianPlanner():
+    """
+    Picks moves for our snake along a cached cycle of the board (see
+    build_cycle), for solo games.
+
+    With shortcuts, a move may skip ahead along the cycle towards the next
+    food, as long as it doesn't pass any part of our body (counted in cycle
+    order, leaving shortcut_margin cells for growing), and while we take up
+    less than max_fill of the cycle. Off the cycle (or with no cycle at all)
+    we head back to it. Food just off the cycle is eaten on the way past,
+    when we can step back onto the cycle ahead of us the same way; food
+    further away only when we'd starve otherwise, if there's room there.
+
+    cache_dir is where cycles are kept on disk (default_cache_dir if None,
+    not kept on disk if False). The cycles of the max_memory most recently
+    used layouts are kept in memory for all planners.
+    """
+
+    max_memory = 8
+    memory = OrderedDict()
+
+    def __init__(self, cache_dir=None, shortcuts=True, shortcut_margin=3, max_fill=0.5):
+        self.cache_dir = default_cache_dir if cache_dir is None else cache_dir
+        self.shortcuts = shortcuts
+        self.shortcut_margin = shortcut_margin
+        self.max_fill = max_fill
+
+    @staticmethod
+    def cycle_key(board: Board):
+        " (width, height, hazard layout digest) "
+        cells = sorted({ pos.y * board.width + pos.x for pos in board.hazards if board.on_board(pos) })
+        digest = hashlib.sha1(np.array(cells, dtype=np.int32).tobytes()).hexdigest()[:16]
+        return (board.width, board.height, digest)
+
+    def cycle_path(self, key):
+        width, height, digest = key
+        return os.path.join(self.cache_dir, f"cycle-{width}x{height}-{digest}.npy")
+
+    def cycle(self, board: Board):
+        """
+        (cycle, index) for board: cycle is an int32 array of flat cell indices
+        in cycle order, index a flat int32 array of each cell's place in the
+        cycle (-1 for cells it doesn't go through)
+        """
+        key = self.cycle_key(board)
+        memory = HamiltonianPlanner.memory
+        found = memory.get(key)
+        if found is not None:
+            memory.move_to_end(key)
+            return found
+
+        cycle = None
+        if self.cache_dir:
+            path = self.cycle_path(key)
+            if os.path.exists(path):
+                cycle = np.load(path)
+        if cycle is None:
+            hazards = [ pos.y * board.width + pos.x for pos in board.hazards if board.on_board(pos) ]
+            cycle = np.array(build_cycle(board.width, board.height, hazards), dtype=np.int32)
+            if self.cache_dir:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                path = self.cycle_path(key)
+                # write then rename, so a reader never sees half a file
+                temp = f"{path}.{os.getpid()}.tmp"
+                with open(temp, 'wb') as f:
+                    np.save(f, cycle)
+                os.replace(temp, path)
+
+        index = np.full(board.width * board.height, -1, dtype=np.int32)
+        index[cycle] = np.arange(len(cycle), dtype=np.int32)
+        memory[key] = (cycle, index)
+        while len(memory) > HamiltonianPlanner.max_memory:
+            memory.popitem(last=False)
+        return cycle, index
+
+    def move(self, game: Game):
+        " the direction to move our snake in, None if we have no safe move "
+        board = game.board
+        width = board.width
+        you = game.you
+        directions = game.analysis.safe_directions
+        if not directions:
+            return None
+
+        cycle, index = self.cycle(board)
+        n = len(cycle)
+        head = you.head
+        here = index[head.y * width + head.x] if n > 0 else -1
+        # no food on the cycle and we're about to starve: leave it to fetch some, if there's room
+        if board.food and you.health <= 2 * (board.width + board.height) and all(
+                index[pos.y * width + pos.x] < 0 for pos in board.food if board.on_board(pos)):
+            direction, path = game.direction_and_path_to_closest_food()
+            if (direction in directions and you.health <= len(path) + board.width + board.height
+                    and game.reachable_area(direction) >= 2 * you.length):
+                return direction
+
+        if here < 0:
+            return self.back_to_cycle(game, index, directions)
+
+        def ahead(cell):
+            return (index[cell] - here) % n
+
+        def cell_to(direction):
+            pos = board.positions.moved(head, direction)
+            return pos.y * width + pos.x if board.on_board(pos) else -1
+
+        # moves may skip ahead along the cycle, but not past any part of our body
+        body = [ pos.y * width + pos.x for pos in list(you.body)[1:] if board.on_board(pos) ]
+        limit = min((ahead(cell) for cell in body if index[cell] >= 0 and ahead(cell) > 0), default=n)
+        limit -= self.shortcut_margin
+
+        # food off the cycle next to us: eat it if we can get back on the cycle ahead of us
+        neighbours = board.positions.cell_neighbours
+        for direction in directions:
+            cell = cell_to(direction)
+            if index[cell] < 0 and board.positions.get(cell % width, cell // width) in board.food_cells:
+                if any(index[back] >= 0 and 0 < ahead(back) < limit for back in neighbours[cell]):
+                    return direction
+
+        onwards = [ d for d in directions if index[cell_to(d)] >= 0 and ahead(cell_to(d)) == 1 ]
+        shortcuts = self.shortcuts and you.length < self.max_fill * n and all(index[cell] >= 0 for cell in body)
+        food = [ ahead(pos.y * width + pos.x) for pos in board.food
+                 if board.on_board(pos) and index[pos.y * width + pos.x] >= 0 ]
+        if not shortcuts or not food:
+            return onwards[0] if onwards else self.back_to_cycle(game, index, directions)
+
+        # the furthest we can skip without passing the nearest food
+        goal = min(food)
+        best = None
+        best_step = 0
+        for direction in directions:
+            cell = cell_to(direction)
+            if index[cell] < 0:
+                continue
+            step = ahead(cell)
+            if step == 0 or step > goal or (step > 1 and step >= limit):
+                continue
+            if step > best_step:
+                best = direction
+                best_step = step
+        if best is not None:
+            return best
+        return onwards[0] if onwards else self.back_to_cycle(game, index, directions)
+
+    def back_to_cycle(self, game: Game, index, directions):
+        """
+        a step back onto the cycle: next to it, onto the cell that leaves our
+        body furthest behind us along it, otherwise towards the nearest free
+        cell on it; any safe direction if there's none
+        """
+        board = game.board
+        width = board.width
+        head = game.you.head
+        n = int((index >= 0).sum())
+        body = [ int(index[pos.y * width + pos.x]) for pos in game.you.body
+                 if board.on_board(pos) and index[pos.y * width + pos.x] >= 0 ]
+
+        best = None
+        best_room = -1
+        for direction in directions:
+            pos = board.positions.moved(head, direction)
+            place = index[pos.y * width + pos.x]
+            if place < 0:
+                continue
+            room = min(((place_of_body - place) % n for place_of_body in body if place_of_body != place), default=n)
+            if room > best_room:
+                best = direction
+                best_room = room
+        if best is not None:
+            return best
+
+        distances = game.analysis.distances.ravel()
+        on_cycle = np.flatnonzero((index >= 0) & (distances > 0))
+        if len(on_cycle) > 0:
+            target = on_cycle[np.argmin(distances[on_cycle])]
+            goal = board.positions.get(int(target) % width, int(target) // width)
+            path = board.find_path(head, goal)
+            if path:
+                direction = head.direction_to(path[0])[0]
+                if direction in directions:
+                    return direction
+        return directions[0]
@@ -0,0 +1,257 @@
+"""
+Local load testing: a stand-in for the Battlesnake engine that plays games
+against our snake server over HTTP, to measure /move latency under load.
+
+Each of `concurrency` workers plays games one after another, sending the
+usual /start, /move and /end requests with payloads from Game.as_dict(),
+and plays the moves it gets back with Game.advance() (food is spawned the
+way the engine does). Every snake in a game is ours, so a turn is one /move
+request per snake. A move that comes back later than the game's timeout (or
+not at all) counts as a timeout and the snake carries on the way it was
+going, as with the real engine. Timeouts are in the latencies too, at the
+time waited, so the percentiles cover every move that wasn't an error.
+
+run() does this for each concurrency level in turn and returns, per level,
+the number of requests, timeouts and errors, requests per second, latency
+percentiles and a latency histogram (milliseconds).
+
+    python -m battlesnake_utils.loadtest http://localhost:8000 --concurrency 1 4 16
+"""
+from typing import Optional
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from .battlesnake import EmptyBoard, Game, Pos, Snake
+
+# upper edges of the latency histogram buckets, in milliseconds (the last bucket is everything above)
+histogram_edges = [1, 2, 5, 10, 20, 50, 100, 200, 300, 400, 500, 750, 1000]
+
+
+def new_game(width=11, height=11, n_snakes=4, seed=None, name='loadtest'):
+    " a game at turn 0, snakes of length 3 spread around the board, with food next to each "
+    rnd = random.Random(seed)
+    game = Game()
+    game.ruleset['name'] = 'standard'
+    game.board = EmptyBoard(width, height)
+
+    corners = [ (1, 1), (width - 2, height - 2), (1, height - 2), (width - 2, 1),
+                (width // 2, 1), (width // 2, height - 2), (1, height // 2), (width - 2, height // 2) ]
+    starts = corners[:n_snakes] if n_snakes <= len(corners) else \
+        rnd.sample([ (x, y) for x in range(1, width - 1) for y in range(1, height - 1) ], n_snakes)
+    for i, (x, y) in enumerate(starts):
+        game.board.snakes.append(Snake({'id': f"snake-{i}", 'name': f"{name}-{i}", 'health': 100,
+                                        'body': [{'x': x, 'y': y}] * 3}))
+        for dx, dy in ((1, 1), (-1, 1), (1, -1), (-1, -1)):
+            if 0 <= x + dx < width and 0 <= y + dy < height:
+                game.board.food.append(Pos(x + dx, y + dy))
+                break
+    game.board.food.append(Pos(width // 2, height // 2))
+    game.you = game.board.snakes[0]
+    game.board.update_df()
+    return game
+
+
+def spawn_food(game: Game, rnd: random.Random):
+    " add food like the engine: up to minimumFood, then one more with foodSpawnChance percent chance "
+    settings = game.ruleset.get('settings', {})
+    minimum = settings.get('minimumFood', 1)
+    chance = settings.get('foodSpawnChance', 15)
+    board = game.board
+    taken = set(board.food) | { pos for snake in board.snakes for pos in snake.body }
+    free = [ board.positions.get(x, y) for x in range(board.width) for y in range(board.height)
+             if board.positions.get(x, y) not in taken ]
+    spawn = max(0, minimum - len(board.food))
+    if rnd.randrange(100) < chance:
+        spawn += 1
+    for _ in range(min(spawn, len(free))):
+        board.food.append(free.pop(rnd.randrange(len(free))))
+    if spawn:
+        board.changed()
+
+
+def payload(game: Game, snake: Snake, game_id: str, timeout: int):
+    " the request body the engine sends to snake "
+    game.you = snake
+    d = game.as_dict()
+    d['game']['id'] = game_id
+    d['game']['timeout'] = timeout
+    return json.dumps(d).encode()
+
+
+class LoadTest():
+    """
+    Plays games against the snake server at url (see the module docstring).
+    Each worker plays games of n_snakes snakes on a width x height board,
+    up to max_turns turns each, until it has sent turns /move requests.
+    """
+
+    def __init__(self, url: str, width=11, height=11, n_snakes=4, timeout=500, max_turns=300, seed=None):
+        self.url = url.rstrip('/')
+        self.width = width
+        self.height = height
+        self.n_snakes = n_snakes
+        self.timeout = timeout
+        self.max_turns = max_turns
+        self.seed = seed
+        self.lock = threading.Lock()
+
+    def post(self, path: str, body: bytes, timeout: float):
+        " POST body to path, returns (seconds taken, decoded JSON response or None) "
+        request = urllib.request.Request(self.url + path, data=body, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = response.read()
+        elapsed = time.perf_counter() - start
+        return elapsed, json.loads(data) if data else None
+
+    def play(self, worker: int, turns: int, results: dict):
+        " one worker: play games until turns /move requests have been sent "
+        rnd = random.Random(None if self.seed is None else self.seed * 1000 + worker)
+        sent = 0
+        n_game = 0
+        while sent < turns:
+            game_id = f"loadtest-{worker}-{n_game}"
+            game = new_game(self.width, self.height, self.n_snakes, rnd.randrange(1 << 30))
+            n_game += 1
+            players = list(game.board.snakes)
+            for snake in players:
+                self.notify('/start', payload(game, snake, game_id, self.timeout), results)
+
+            while sent < turns and game.turn < self.max_turns and game.board.snakes:
+                moves = {}
+                for snake in list(game.board.snakes):
+                    moves[snake.id] = self.move(game, snake, game_id, results)
+                    sent += 1
+                game.advance(moves)
+                spawn_food(game, rnd)
+                if len(game.board.snakes) <= 1 and self.n_snakes > 1:
+                    break
+
+            for snake in players:
+                self.notify('/end', payload(game, snake, game_id, self.timeout), results)
+        with self.lock:
+            results['games'] += n_game
+
+    def move(self, game: Game, snake: Snake, game_id: str, results: dict):
+        " ask the server for snake's move; on a timeout or error it carries on the way it's facing "
+        limit = self.timeout / 1000
+        direction = None
+        latency = None
+        outcome = None
+        start = time.perf_counter()
+        try:
+            latency, response = self.post('/move', payload(game, snake, game_id, self.timeout), limit)
+            direction = response.get('move') if isinstance(response, dict) else None
+            if latency > limit:
+                outcome = 'timeouts'
+                direction = None
+            elif direction not in Pos.all_directions:
+                outcome = 'errors'
+                direction = None
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            timed_out = isinstance(e, TimeoutError) or 'timed out' in str(e)
+            outcome = 'timeouts' if timed_out else 'errors'
+            if timed_out:
+                # counted at the time given up after, or the percentiles would leave out the slowest moves
+                latency = time.perf_counter() - start
+
+        with self.lock:
+            results['requests'] += 1
+            if latency is not None:
+                results['latencies'].append(latency * 1000)
+            if outcome is not None:
+                results[outcome] += 1
+
+        if direction is None:
+            neck = snake.body[1]
+            direction = neck.direction_to(snake.head)[0] if neck != snake.head else 'up'
+        return direction
+
+    def notify(self, path: str, body: bytes, results: dict):
+        " /start or /end, whose answers don't matter (but failures are counted as errors) "
+        try:
+            self.post(path, body, max(self.timeout / 1000, 1.0))
+        except (urllib.error.URLError, OSError, ValueError):
+            with self.lock:
+                results['errors'] += 1
+
+    def level(self, concurrency: int, turns: int):
+        " play with concurrency workers, each sending turns /move requests; returns the level's results "
+        results = {'latencies': [], 'requests': 0, 'timeouts': 0, 'errors': 0, 'games': 0}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            for future in [ pool.submit(self.play, worker, turns, results) for worker in range(concurrency) ]:
+                future.result()
+        return summary(concurrency, results, time.perf_counter() - start)
+
+    def run(self, concurrency_levels=(1, 2, 4, 8), turns=100):
+        " level() for each concurrency level, a list of their results "
+        return [ self.level(concurrency, turns) for concurrency in concurrency_levels ]
+
+
+def summary(concurrency: int, results: dict, elapsed: float):
+    " the results of one level: counts, throughput, percentiles and histogram of latencies in ms "
+    latencies = np.array(results['latencies'])
+    counts = np.histogram(latencies, bins=[0] + histogram_edges + [np.inf])[0] if len(latencies) else \
+        np.zeros(len(histogram_edges) + 1, dtype=int)
+    percentiles = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) else [None] * 3
+    return {
+        'concurrency': concurrency,
+        'games': results['games'],
+        'requests': results['requests'],
+        'responses': len(latencies),
+        'timeouts': results['timeouts'],
+        'errors': results['errors'],
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50': percentiles[0],
+        'p90': percentiles[1],
+        'p99': percentiles[2],
+        'max': float(latencies.max()) if len(latencies) else None,
+        'histogram': { (f"<={edge}" if edge != np.inf else f">{histogram_edges[-1]}"): int(count)
+                       for edge, count in zip(histogram_edges + [np.inf], counts) },
+    }
+
+
+def report(levels, out=sys.stdout):
+    " print a table of run() results "
+    print(f"{'conc':>5} {'games':>6} {'moves':>7} {'timeouts':>8} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}", file=out)
+    for r in levels:
+        def ms(value):
+            return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+        print(f"{r['concurrency']:>5} {r['games']:>6} {r['requests']:>7} {r['timeouts']:>8} {r['errors']:>6} "
+              f"{r['throughput']:8.1f} {ms(r['p50'])} {ms(r['p90'])} {ms(r['p99'])} {ms(r['max'])}", file=out)
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="load test a battlesnake server with local games")
+    parser.add_argument('url', help="the snake server, e.g. http://localhost:8000")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8], help="concurrent games, per level")
+    parser.add_argument('--turns', type=int, default=100, help="/move requests per worker and level")
+    parser.add_argument('--snakes', type=int, default=4)
+    parser.add_argument('--size', type=int, default=11)
+    parser.add_argument('--timeout', type=int, default=500, help="move timeout, milliseconds")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    test = LoadTest(args.url, args.size, args.size, args.snakes, args.timeout)
+    levels = test.run(args.concurrency, args.turns)
+    if args.json:
+        print(json.dumps(levels, indent=2))
+    else:
+        report(levels)
+    return levels
+
+
+if __name__ == '__main__':
+    main()
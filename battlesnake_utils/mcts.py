@@ -0,0 +1,462 @@
+from typing import Callable, Optional
+
+import math
+import itertools
+import contextlib
+import random
+import time
+import numpy as np
+
+from .battlesnake import Game, Pos
+from .pool import GamePool, gc_paused
+
+
+class NodePool():
+    """
+    Search tree nodes kept in preallocated arrays, a node is just an index.
+
+    Each node has, for every snake in the search, visit counts and summed
+    rewards per move (decoupled UCT) and prior move probabilities (uniform
+    unless an evaluation gives some), and its children are a linked list of
+    (joint move, child) through first_child/next_sibling. Released nodes go
+    back on a free list, so memory stays the same however long the game.
+    """
+
+    def __init__(self, capacity: int, n_snakes: int):
+        self.capacity = capacity
+        self.n_snakes = n_snakes
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.first_child = np.full(capacity, -1, dtype=np.int32)
+        self.next_sibling = np.full(capacity, -1, dtype=np.int32)
+        self.joint_move = np.zeros(capacity, dtype=np.int32)
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.move_visits = np.zeros((capacity, n_snakes, 4), dtype=np.int32)
+        self.move_values = np.zeros((capacity, n_snakes, 4), dtype=np.float64)
+        self.priors = np.full((capacity, n_snakes, 4), 0.25, dtype=np.float32)
+        self.in_use = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        " number of nodes in use "
+        return self.capacity - len(self.free)
+
+    def allocate(self, parent: int = -1, joint_move: int = 0):
+        " a fresh node (linked under parent if given), -1 if the pool is full "
+        if not self.free:
+            return -1
+        node = self.free.pop()
+        self.in_use[node] = True
+        self.parent[node] = parent
+        self.first_child[node] = -1
+        self.joint_move[node] = joint_move
+        self.visits[node] = 0
+        self.move_visits[node] = 0
+        self.move_values[node] = 0.0
+        self.priors[node] = 0.25
+        if parent >= 0:
+            self.next_sibling[node] = self.first_child[parent]
+            self.first_child[parent] = node
+        else:
+            self.next_sibling[node] = -1
+        return node
+
+    def child(self, node: int, joint_move: int):
+        " the child of node reached by joint_move, -1 if there's none "
+        child = self.first_child[node]
+        while child >= 0:
+            if self.joint_move[child] == joint_move:
+                return child
+            child = self.next_sibling[child]
+        return -1
+
+    def keep_only(self, root: int):
+        " release every node outside the subtree of root, which becomes a root "
+        keep = np.zeros(self.capacity, dtype=bool)
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            keep[node] = True
+            child = self.first_child[node]
+            while child >= 0:
+                stack.append(child)
+                child = self.next_sibling[child]
+
+        released = np.flatnonzero(self.in_use & ~keep)
+        self.in_use[released] = False
+        self.free.extend(released.tolist())
+        self.parent[root] = -1
+        self.next_sibling[root] = -1
+
+    def clear(self):
+        " release all nodes "
+        self.in_use[:] = False
+        self.free = list(range(self.capacity - 1, -1, -1))
+
+
+def default_rewards(game: Game, snake_ids, solo: bool):
+    """
+    reward for each snake at the end of a playout: 0 if it's out, 1 if it's
+    the last one standing (or survived, when playing solo), 0.5 otherwise
+    """
+    alive = { snake.id for snake in game.board.snakes }
+    rewards = []
+    for snake_id in snake_ids:
+        if snake_id not in alive:
+            rewards.append(0.0)
+        elif solo or len(alive) == 1:
+            rewards.append(1.0)
+        else:
+            rewards.append(0.5)
+    return rewards
+
+
+class MCTS():
+    """
+    Monte Carlo Tree Search over Game, for simultaneous moves.
+
+    Uses decoupled UCT: at every node each snake picks its own move from its
+    own statistics, and the resulting joint move leads to the child. Playouts
+    pick random safe moves: cells that are free the way Board.is_free sees
+    them, with tails that move away counting as free (Board.move_masks). The
+    simulated games don't keep a df (see Board.copy). The tree is kept between
+    turns by re-rooting on the joint move that was actually played, and lives
+    in a fixed size NodePool.
+
+    Give search() a time budget (seconds) and/or an iteration budget. After a
+    search, stats has the number of iterations, time taken and iterations
+    per second.
+
+    evaluate, if given, replaces playouts: called as evaluate(game, snake_ids)
+    it returns a reward in [0,1] for each snake id.
+
+    evaluate_batch, if given, replaces playouts with leaves evaluated
+    batch_size at a time: it's called as evaluate_batch(games, snake_ids)
+    and returns (rewards, priors), arrays (len(games), len(snake_ids)) and
+    (len(games), len(snake_ids), 4) of move probabilities (priors can be
+    None), see network.Network. While a batch is collected, moves count as
+    visited with no reward (a virtual loss) so the leaves differ. Priors
+    order the untried moves of a node and add prior_weight * prior *
+    sqrt(node visits) / (1 + move visits) to the UCT score.
+
+    The game of each iteration comes from a GamePool and goes back to it
+    once the iteration's done (evaluations mustn't keep it). With pause_gc
+    the garbage collector is off while searching (see pool.gc_paused).
+    """
+
+    # when more snakes than this died on the move played, start a new tree
+    # rather than trying every combination of their moves to tell which it was
+    max_dead_to_tell = 2
+
+    def __init__(self, max_nodes=50000, exploration=1.4, playout_depth=30,
+                 evaluate: Optional[Callable] = None, seed: Optional[int] = None,
+                 evaluate_batch: Optional[Callable] = None, batch_size=64, prior_weight=1.0, pause_gc=False):
+        self.max_nodes = max_nodes
+        self.exploration = exploration
+        self.playout_depth = playout_depth
+        self.evaluate = evaluate
+        self.evaluate_batch = evaluate_batch
+        self.batch_size = batch_size
+        self.prior_weight = prior_weight
+        self.pause_gc = pause_gc
+        self.random = random.Random(seed)
+        self.games = GamePool()
+
+        self.pool = None
+        self.root = -1
+        self.root_game = None
+        self.snake_ids = []
+        self.solo = False
+        self.you_id = None
+        self.root_moves = None
+        self.stats = {}
+
+    def reset(self, game: Game):
+        " start a new tree for game "
+        self.snake_ids = [ snake.id for snake in game.board.snakes ]
+        self.solo = len(self.snake_ids) == 1
+        if self.pool is None or self.pool.n_snakes != len(self.snake_ids):
+            self.pool = NodePool(self.max_nodes, len(self.snake_ids))
+        else:
+            self.pool.clear()
+        self.root = self.pool.allocate()
+        self.root_game = game.copy(lazy_df=True)
+
+    def observed_joint_move(self, game: Game):
+        """
+        joint move (as a code) that took us from the root to game, None if it
+        can't be told. A snake that died on the way has no new head to tell
+        its move from: its moves are those that, played out from the root,
+        leave the others as they are in game. They all lead to the same
+        position, so the one with the most searched child is taken
+        """
+        if self.root_game is None or game.turn != self.root_game.turn + 1:
+            return None
+        if not { snake.id for snake in game.board.snakes } <= set(self.snake_ids):
+            return None
+
+        moves = {}
+        for snake in game.board.snakes:
+            old = self.root_game.snake_by_id(snake.id)
+            if old is None:
+                return None
+            directions = old.head.direction_to(snake.head)
+            if len(directions) != 1 or old.head.distance_to(snake.head) != 1:
+                return None
+            moves[snake.id] = directions[0]
+
+        dead = [ snake.id for snake in self.root_game.board.snakes if snake.id not in moves ]
+        if not dead:
+            return self.joint_code(moves)
+        if len(dead) > self.max_dead_to_tell:
+            return None
+        def survivors(game):
+            return { snake.id: (snake.health, list(snake.body)) for snake in game.board.snakes }
+
+        codes = []
+        played = survivors(game)
+        for directions in itertools.product(Pos.all_directions, repeat=len(dead)):
+            tried = dict(moves, **dict(zip(dead, directions)))
+            after = self.root_game.copy(lazy_df=True)
+            after.advance(tried)
+            if survivors(after) == played:
+                codes.append(self.joint_code(tried))
+        if not codes:
+            return None
+
+        def visits(code):
+            child = self.pool.child(self.root, code) if self.pool is not None else -1
+            return self.pool.visits[child] if child >= 0 else -1
+        return max(codes, key=visits)
+
+    def reroot(self, game: Game):
+        " move the root to the node for game, keeping its subtree, or start over "
+        joint_move = self.observed_joint_move(game)
+        child = -1
+        if joint_move is not None:
+            child = self.pool.child(self.root, joint_move)
+
+        if child < 0:
+            self.reset(game)
+            return False
+
+        self.pool.keep_only(child)
+        self.root = child
+        self.root_game = game.copy(lazy_df=True)
+        return True
+
+    def joint_code(self, moves: dict):
+        " encode {snake id: direction} as one integer, a base 4 digit per snake "
+        code = 0
+        for i in reversed(range(len(self.snake_ids))):
+            direction = moves.get(self.snake_ids[i])
+            code = code * 4 + (Pos.all_directions.index(direction) if direction is not None else 0)
+        return code
+
+    def select_moves(self, node: int, game: Game):
+        " decoupled UCT: each snake still in the game picks its move, returns {index: move number} "
+        pool = self.pool
+        masks, _ = game.board.move_masks(with_danger=False)
+        total = max(pool.visits[node], 1)
+        log_total = math.log(total)
+        use_priors = self.evaluate_batch is not None
+
+        chosen = {}
+        for snake_index, snake in enumerate(game.board.snakes):
+            i = self.snake_ids.index(snake.id)
+            mask = int(masks[snake_index])
+            moves = [ m for m in range(4) if mask & (1 << m) ] or [0, 1, 2, 3]
+            if node == self.root and snake.id == self.you_id and self.root_moves is not None:
+                moves = [ m for m in moves if m in self.root_moves ] or self.root_moves
+
+            visits = pool.move_visits[node, i]
+            untried = [ m for m in moves if visits[m] == 0 ]
+            if untried:
+                if use_priors:
+                    priors = pool.priors[node, i]
+                    best_prior = max(priors[m] for m in untried)
+                    untried = [ m for m in untried if priors[m] == best_prior ]
+                chosen[i] = self.random.choice(untried)
+                continue
+
+            values = pool.move_values[node, i]
+            priors = pool.priors[node, i]
+            best_score = None
+            for m in moves:
+                score = values[m] / visits[m] + self.exploration * math.sqrt(log_total / visits[m])
+                if use_priors:
+                    score += self.prior_weight * priors[m] * math.sqrt(total) / (1 + visits[m])
+                if best_score is None or score > best_score:
+                    best_score = score
+                    chosen[i] = m
+        return chosen
+
+    def is_terminal(self, game: Game):
+        n_alive = len(game.board.snakes)
+        return n_alive == 0 or (not self.solo and n_alive == 1)
+
+    def playout(self, game: Game):
+        " play random safe moves until the game's over or playout_depth, return the rewards "
+        for _ in range(self.playout_depth):
+            if self.is_terminal(game):
+                break
+            masks, _ = game.board.move_masks(with_danger=False)
+            moves = {}
+            for snake, mask in zip(game.board.snakes, masks):
+                directions = Pos.directions_in_mask(mask) or Pos.all_directions
+                moves[snake.id] = self.random.choice(directions)
+            game.advance(moves)
+        return default_rewards(game, self.snake_ids, self.solo)
+
+    def descend(self):
+        """
+        select moves down the tree from the root and expand a leaf: (game, leaf
+        node, path). The leaf is None when the pool is full and it couldn't be
+        made, its game is then played out from the last node of path
+        """
+        pool = self.pool
+        game = self.games.acquire_from(self.root_game)
+        node = self.root
+        path = []
+
+        while not self.is_terminal(game):
+            chosen = self.select_moves(node, game)
+            path.append((node, chosen))
+            moves = { self.snake_ids[i]: Pos.all_directions[m] for i, m in chosen.items() }
+            game.advance(moves)
+
+            code = self.joint_code(moves)
+            child = pool.child(node, code)
+            if child < 0:
+                node = pool.allocate(node, code)
+                if node < 0:
+                    node = None
+                break
+            node = child
+        return game, node, path
+
+    def iterate(self):
+        " one iteration: select, expand, play out (or evaluate), back up "
+        pool = self.pool
+        game, node, path = self.descend()
+
+        if self.evaluate is not None and not self.is_terminal(game):
+            rewards = self.evaluate(game, self.snake_ids)
+        else:
+            rewards = self.playout(game)
+
+        if node is not None:
+            pool.visits[node] += 1
+        for node, chosen in path:
+            pool.visits[node] += 1
+            for i, m in chosen.items():
+                pool.move_visits[node, i, m] += 1
+                pool.move_values[node, i, m] += rewards[i]
+        self.games.release(game)
+
+    def iterate_batch(self, size: int):
+        """
+        size iterations with the leaves evaluated together (evaluate_batch):
+        each one's moves count as visits (with no reward yet) as soon as
+        it's selected, then rewards are backed up once the batch is evaluated
+        """
+        pool = self.pool
+        leaves = []
+        for _ in range(size):
+            game, node, path = self.descend()
+            if node is not None:
+                pool.visits[node] += 1
+            for parent, chosen in path:
+                pool.visits[parent] += 1
+                for i, m in chosen.items():
+                    pool.move_visits[parent, i, m] += 1
+            leaves.append((game, node, path))
+
+        # finished games are scored as usual, the rest evaluated in one call
+        rewards = [ default_rewards(game, self.snake_ids, self.solo) if self.is_terminal(game) else None
+                    for game, node, path in leaves ]
+        pending = [ j for j in range(size) if rewards[j] is None ]
+        if pending:
+            values, priors = self.evaluate_batch([ leaves[j][0] for j in pending ], self.snake_ids)
+            for k, j in enumerate(pending):
+                rewards[j] = values[k]
+                if priors is not None and leaves[j][1] is not None:
+                    pool.priors[leaves[j][1]] = priors[k]
+
+        for (game, node, path), reward in zip(leaves, rewards):
+            for parent, chosen in path:
+                for i, m in chosen.items():
+                    pool.move_values[parent, i, m] += reward[i]
+            self.games.release(game)
+
+    def search(self, game: Game, time_budget: Optional[float] = 0.3, max_iterations: Optional[int] = None,
+               root_moves: Optional[list] = None):
+        """
+        Search from game (re-using last turn's tree when game follows on from
+        it) and return the best direction for game.you, None if there's none.
+        Stops after time_budget seconds or max_iterations, whichever is first.
+        root_moves limits the directions we consider for our first move.
+        """
+        if time_budget is None and max_iterations is None:
+            raise Exception("MCTS.search: needs a time budget or an iteration budget")
+
+        self.you_id = game.you.id
+        self.root_moves = None
+        if root_moves is not None:
+            self.root_moves = [ Pos.all_directions.index(d) for d in root_moves ]
+
+        if self.pool is None:
+            self.reset(game)
+            reused = False
+        else:
+            reused = self.reroot(game)
+
+        if self.evaluate_batch is not None and not self.is_terminal(self.root_game):
+            _, priors = self.evaluate_batch([self.root_game], self.snake_ids)
+            if priors is not None:
+                self.pool.priors[self.root] = priors[0]
+
+        start = time.perf_counter()
+        deadline = start + time_budget if time_budget is not None else None
+        iterations = 0
+        with gc_paused() if self.pause_gc else contextlib.nullcontext():
+            while max_iterations is None or iterations < max_iterations:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                if self.evaluate_batch is not None:
+                    size = self.batch_size if max_iterations is None else min(self.batch_size, max_iterations - iterations)
+                    self.iterate_batch(size)
+                    iterations += size
+                    continue
+                self.iterate()
+                iterations += 1
+        elapsed = time.perf_counter() - start
+
+        self.stats = {
+            'iterations': iterations,
+            'elapsed': elapsed,
+            'iterations_per_second': iterations / elapsed if elapsed > 0 else 0.0,
+            'nodes': len(self.pool),
+            'reused_tree': reused,
+            'games': self.games.stats,
+        }
+        return self.best_direction(game.you.id, root_moves)
+
+    def root_move_visits(self, snake_id):
+        " {direction: visits} at the root for given snake "
+        i = self.snake_ids.index(snake_id)
+        visits = self.pool.move_visits[self.root, i]
+        return { Pos.all_directions[m]: int(visits[m]) for m in range(4) }
+
+    def root_move_values(self, snake_id):
+        " {direction: summed rewards} at the root for given snake "
+        i = self.snake_ids.index(snake_id)
+        values = self.pool.move_values[self.root, i]
+        return { Pos.all_directions[m]: float(values[m]) for m in range(4) }
+
+    def best_direction(self, snake_id, directions: Optional[list] = None):
+        " most visited move at the root for given snake (out of directions, if given) "
+        if snake_id not in self.snake_ids:
+            return None
+        visits = self.root_move_visits(snake_id)
+        best = max(directions or Pos.all_directions, key=lambda d: visits[d])
+        return best if visits[best] > 0 else None
@@ -0,0 +1,221 @@
+"""
+Policy/value network inference in plain NumPy, for use inside search.
+
+A network reads Game.to_planes() from one snake's point of view and gives
+move probabilities (in Pos.all_directions order) and a value in [0,1], the
+snake's expected reward. The trunk is 3x3 convolutions (same padding, each
+followed by ReLU), then a policy head and a value head of dense layers
+(ReLU between them). The policy head ends in 4 logits (softmax), the value
+head in 1 (sigmoid).
+
+Weights come from an .npz file, with PyTorch layouts so a trained model can
+be exported with np.savez straight from its state dict:
+
+    input_shape             (channels, height, width)
+    trunk.<i>.weight        (out, in, 3, 3)    trunk.<i>.bias      (out,)
+    policy.<i>.weight       (out, in)          policy.<i>.bias     (out,)
+    value.<i>.weight        (out, in)          value.<i>.bias      (out,)
+
+where the first dense layer of each head reads the trunk output flattened
+in (channel, y, x) order. Activations are kept channels last internally, in
+buffers allocated once for max_batch positions and reused on every call.
+"""
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .battlesnake import Game, Pos
+
+
+class Conv():
+    " a same-padded convolution followed by ReLU, as an im2col and a matrix product "
+
+    def __init__(self, weight, bias):
+        n_out, n_in, k, k2 = weight.shape
+        if k != k2 or k % 2 != 1:
+            raise Exception(f"Conv: kernel must be square and odd, not {k}x{k2}")
+        self.n_in = n_in
+        self.n_out = n_out
+        self.k = k
+        # (k, k, in) rows to match the im2col columns
+        self.weight = np.ascontiguousarray(weight.transpose(2, 3, 1, 0).reshape(k * k * n_in, n_out), dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+
+    def allocate(self, batch: int, height: int, width: int):
+        pad = self.k // 2
+        self.padded = np.zeros((batch, height + 2 * pad, width + 2 * pad, self.n_in), dtype=np.float32)
+        self.columns = np.empty((batch, height, width, self.k, self.k, self.n_in), dtype=np.float32)
+        self.out = np.empty((batch, height, width, self.n_out), dtype=np.float32)
+
+    def forward(self, x, n: int):
+        " x is (n, height, width, in), channels last; returns the first n rows of the output buffer "
+        pad = self.k // 2
+        height, width = x.shape[1:3]
+        padded = self.padded[:n]
+        padded[:, pad:pad + height, pad:pad + width] = x
+        windows = sliding_window_view(padded, (self.k, self.k), axis=(1, 2))
+        columns = self.columns[:n]
+        np.copyto(columns, windows.transpose(0, 1, 2, 4, 5, 3))
+        out = self.out[:n]
+        np.matmul(columns.reshape(-1, self.weight.shape[0]), self.weight, out=out.reshape(-1, self.n_out))
+        out += self.bias
+        np.maximum(out, 0, out=out)
+        return out
+
+
+class Dense():
+    " a dense layer, followed by ReLU unless it's the last of its head "
+
+    def __init__(self, weight, bias, relu=True):
+        self.weight = np.ascontiguousarray(np.asarray(weight, dtype=np.float32).T)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.relu = relu
+
+    def allocate(self, batch: int):
+        self.out = np.empty((batch, self.weight.shape[1]), dtype=np.float32)
+
+    def forward(self, x, n: int):
+        out = self.out[:n]
+        np.matmul(x, self.weight, out=out)
+        out += self.bias
+        if self.relu:
+            np.maximum(out, 0, out=out)
+        return out
+
+
+def numbered(weights, prefix: str):
+    " the (weight, bias) pairs prefix.0, prefix.1, ... in order "
+    layers = []
+    while f"{prefix}.{len(layers)}.weight" in weights:
+        i = len(layers)
+        layers.append((weights[f"{prefix}.{i}.weight"], weights[f"{prefix}.{i}.bias"]))
+    return layers
+
+
+class Network():
+    """
+    A policy/value network (see the module docstring) for boards of one
+    size, with buffers for up to max_batch positions per forward pass.
+
+    evaluate(game, snake_ids) is the MCTS evaluate hook, evaluate_batch()
+    its batched version (MCTS evaluate_batch), score(game, snake_id) an
+    AlphaBeta evaluation function.
+    """
+
+    def __init__(self, weights: dict, max_batch=256):
+        self.input_shape = tuple(int(i) for i in weights['input_shape'])
+        channels, self.height, self.width = self.input_shape
+        if channels != len(Game.plane_names):
+            raise Exception(f"Network: expects {channels} input planes, Game.to_planes() has {len(Game.plane_names)}")
+
+        self.trunk = [ Conv(np.asarray(w), np.asarray(b)) for w, b in numbered(weights, 'trunk') ]
+        heads = {}
+        for name in ('policy', 'value'):
+            layers = numbered(weights, name)
+            if not layers:
+                raise Exception(f"Network: no {name} head")
+            heads[name] = [ Dense(w, b, relu=i < len(layers) - 1) for i, (w, b) in enumerate(layers) ]
+        self.policy = heads['policy']
+        self.value = heads['value']
+        if self.policy[-1].weight.shape[1] != 4 or self.value[-1].weight.shape[1] != 1:
+            raise Exception("Network: the policy head must end in 4 outputs and the value head in 1")
+
+        self.max_batch = max_batch
+        self.planes = np.zeros((max_batch,) + self.input_shape, dtype=np.uint8)
+        self.inputs = np.empty((max_batch, self.height, self.width, channels), dtype=np.float32)
+        for layer in self.trunk:
+            layer.allocate(max_batch, self.height, self.width)
+        trunk_channels = self.trunk[-1].n_out if self.trunk else channels
+        self.flat = np.empty((max_batch, trunk_channels, self.height, self.width), dtype=np.float32)
+        for layer in self.policy + self.value:
+            layer.allocate(max_batch)
+
+    @classmethod
+    def load(cls, path: str, max_batch=256):
+        " a network with the weights in an .npz file "
+        with np.load(path) as weights:
+            return cls(dict(weights), max_batch)
+
+    @staticmethod
+    def random_weights(width=11, height=11, filters=(32, 32), hidden=64, seed=None):
+        " weights (as for the constructor or an .npz) for an untrained network of the given shape "
+        rnd = np.random.default_rng(seed)
+        channels = len(Game.plane_names)
+        weights = {'input_shape': np.array([channels, height, width])}
+        n_in = channels
+        for i, n_out in enumerate(filters):
+            weights[f"trunk.{i}.weight"] = rnd.normal(0, (2 / (9 * n_in)) ** 0.5, (n_out, n_in, 3, 3)).astype(np.float32)
+            weights[f"trunk.{i}.bias"] = np.zeros(n_out, dtype=np.float32)
+            n_in = n_out
+        for name, n_final in (('policy', 4), ('value', 1)):
+            sizes = [n_in * width * height, hidden, n_final]
+            for i in range(2):
+                weights[f"{name}.{i}.weight"] = rnd.normal(0, (1 / sizes[i]) ** 0.5, (sizes[i + 1], sizes[i])).astype(np.float32)
+                weights[f"{name}.{i}.bias"] = np.zeros(sizes[i + 1], dtype=np.float32)
+        return weights
+
+    def forward(self, n: int):
+        " (policy, value) for the first n positions in self.planes: (n, 4) probabilities and (n,) values "
+        np.copyto(self.inputs[:n], self.planes[:n].transpose(0, 2, 3, 1))
+        x = self.inputs[:n]
+        for layer in self.trunk:
+            x = layer.forward(x, n)
+        flat = self.flat[:n]
+        np.copyto(flat, x.transpose(0, 3, 1, 2))
+        flat = flat.reshape(n, -1)
+
+        logits = flat
+        for layer in self.policy:
+            logits = layer.forward(logits, n)
+        value = flat
+        for layer in self.value:
+            value = layer.forward(value, n)
+
+        policy = np.exp(logits - logits.max(axis=1, keepdims=True))
+        policy /= policy.sum(axis=1, keepdims=True)
+        return policy, 1 / (1 + np.exp(-value[:, 0]))
+
+    def evaluate_batch(self, games, snake_ids):
+        """
+        (values, priors) for a list of games, from the point of view of each
+        of snake_ids: values (len(games), len(snake_ids)), priors the same
+        with a last axis of 4 move probabilities. Snakes no longer in a game
+        get value 0 and uniform priors.
+        """
+        n_snakes = len(snake_ids)
+        values = np.zeros((len(games), n_snakes), dtype=np.float32)
+        priors = np.full((len(games), n_snakes, 4), 0.25, dtype=np.float32)
+
+        # every (game, snake) pair still in the game, in chunks of max_batch
+        pairs = [ (g, s) for g, game in enumerate(games) for s, snake_id in enumerate(snake_ids)
+                  if game.snake_by_id(snake_id) is not None ]
+        for start in range(0, len(pairs), self.max_batch):
+            chunk = pairs[start:start + self.max_batch]
+            for i, (g, s) in enumerate(chunk):
+                board = games[g].board
+                if (board.width, board.height) != (self.width, self.height):
+                    raise Exception(f"Network: made for {self.width}x{self.height} boards, not {board.width}x{board.height}")
+                games[g].to_planes(out=self.planes[i], snake_id=snake_ids[s])
+            policy, value = self.forward(len(chunk))
+            rows = [ g for g, s in chunk ]
+            columns = [ s for g, s in chunk ]
+            values[rows, columns] = value
+            priors[rows, columns] = policy
+        return values, priors
+
+    def evaluate(self, game: Game, snake_ids):
+        " reward in [0,1] for each snake id (the MCTS evaluate hook) "
+        values, _ = self.evaluate_batch([game], snake_ids)
+        return values[0].tolist()
+
+    def score(self, game: Game, snake_id):
+        " value of game for snake_id (an AlphaBeta evaluation function) "
+        values, _ = self.evaluate_batch([game], [snake_id])
+        return float(values[0, 0])
+
+    def policy_for(self, game: Game, snake_id: Optional[str] = None):
+        " {direction: probability} for snake_id (default ours) "
+        snake_id = game.you.id if snake_id is None else snake_id
+        _, priors = self.evaluate_batch([game], [snake_id])
+        return { direction: float(p) for direction, p in zip(Pos.all_directions, priors[0, 0]) }
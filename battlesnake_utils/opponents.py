@@ -0,0 +1,204 @@
+"""
+Opponent modelling: how the snakes we meet tend to move, kept by snake
+name (ids change from game to game, names don't) and saved between games.
+
+Each move an opponent makes is described by a few features: does it get
+closer to food, does it end up along a wall, is it straight on, does it go
+next to another snake's head (a possible head-to-head) while longer, or
+while not longer. For every opponent we keep, per feature, how often the
+move it made had it and how often a random legal move would have had it.
+Their ratio is how much more (or less) likely than chance the opponent is
+to pick a move with that feature, and move_probabilities() multiplies
+these ratios together for each legal move.
+
+Counts decay a little with every observation, so an opponent's stats are a
+handful of floats that follow recent behaviour, and the store keeps the
+max_opponents most recently seen names.
+"""
+from typing import Optional
+
+import os
+import json
+import numpy as np
+from collections import OrderedDict
+
+from .battlesnake import Game, Pos, Snake
+
+feature_names = ('food', 'wall', 'straight', 'contest_longer', 'contest_not_longer')
+n_features = len(feature_names)
+
+
+def move_features(game: Game, snake: Snake):
+    " (4, n_features) bool array: the features of moving snake in each direction (Pos.all_directions) "
+    board = game.board
+    head = snake.head
+    features = np.zeros((4, n_features), dtype=bool)
+
+    food = [ (pos.x, pos.y) for pos in board.food ]
+    def food_distance(x, y):
+        return min((abs(x - fx) + abs(y - fy) for fx, fy in food), default=0)
+    here = food_distance(head.x, head.y)
+
+    others = [ other for other in board.snakes if other is not snake ]
+    neck = snake.body[1] if len(snake.body) > 1 else head
+    facing = neck.direction_to(head)[0] if neck != head else None
+    for m, direction in enumerate(Pos.all_directions):
+        pos = board.positions.moved(head, direction)
+        features[m, 0] = bool(food) and food_distance(pos.x, pos.y) < here
+        features[m, 1] = pos.x in (0, board.width - 1) or pos.y in (0, board.height - 1)
+        features[m, 2] = direction == facing
+        for other in others:
+            if abs(other.head.x - pos.x) + abs(other.head.y - pos.y) == 1:
+                features[m, 3 if snake.length > other.length else 4] = True
+    return features
+
+
+def legal_directions(game: Game):
+    " {snake id: indices of its legal moves} "
+    masks, _ = game.board.move_masks(with_danger=False)
+    return { snake.id: [ m for m in range(4) if int(mask) & (1 << m) ] or [0, 1, 2, 3]
+             for snake, mask in zip(game.board.snakes, masks) }
+
+
+class OpponentModel():
+    """
+    Move tendencies of opponents by name (see the module docstring).
+
+    observe() a turn's change to learn from it, move_probabilities() and
+    likely_moves() to predict, prune() as an AlphaBeta reply_filter. With a
+    path, the store is read from there (if it exists) and save() writes it
+    back. Predictions only use an opponent's stats after min_observations
+    of its moves; prior is the number of moves' worth of chance behaviour
+    each feature starts from.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_opponents=1000, decay=0.995, prior=2.0,
+                 min_observations=10, threshold=0.1):
+        self.path = path
+        self.max_opponents = max_opponents
+        self.decay = decay
+        self.prior = prior
+        self.min_observations = min_observations
+        self.threshold = threshold
+        # name -> [observations, chosen counts, expected counts], least recently seen first
+        self.opponents = OrderedDict()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.opponents)
+
+    def stats(self, name: str):
+        " [observations, chosen, expected] for name, created (and made most recent) as needed "
+        entry = self.opponents.get(name)
+        if entry is None:
+            entry = [0, np.zeros(n_features), np.zeros(n_features)]
+            self.opponents[name] = entry
+            while len(self.opponents) > self.max_opponents:
+                self.opponents.popitem(last=False)
+        else:
+            self.opponents.move_to_end(name)
+        return entry
+
+    def observe(self, previous: Game, current: Game):
+        """
+        learn from the moves the opponents made from previous to current (the
+        next turn); returns the number of moves learned from
+        """
+        legal = None
+        observed = 0
+        for snake in previous.board.snakes:
+            if snake.id == previous.you.id:
+                continue
+            now = current.snake_by_id(snake.id)
+            if now is None or abs(now.head.x - snake.head.x) + abs(now.head.y - snake.head.y) != 1:
+                continue
+            if legal is None:
+                legal = legal_directions(previous)
+            chosen = Pos.all_directions.index(snake.head.direction_to(now.head)[0])
+            features = move_features(previous, snake)
+
+            entry = self.stats(snake.name)
+            entry[0] += 1
+            entry[1] *= self.decay
+            entry[2] *= self.decay
+            entry[1] += features[chosen]
+            entry[2] += features[legal[snake.id]].mean(axis=0)
+            observed += 1
+        return observed
+
+    def lifts(self, name: str):
+        " per feature, how much more likely than chance name is to pick a move with it (None if not known enough) "
+        entry = self.opponents.get(name)
+        if entry is None or entry[0] < self.min_observations:
+            return None
+        observations, chosen, expected = entry
+        return (chosen + self.prior) / (expected + self.prior)
+
+    def move_probabilities(self, game: Game, snake_id, directions=None):
+        """
+        {direction: probability} over the snake's legal moves (or directions,
+        if given), uniform if we don't know it well enough
+        """
+        snake = game.snake_by_id(snake_id)
+        if snake is None:
+            return {}
+        if directions is None:
+            moves = legal_directions(game)[snake_id]
+        else:
+            moves = [ Pos.all_directions.index(d) for d in directions ]
+        lifts = self.lifts(snake.name)
+        if lifts is None:
+            return { Pos.all_directions[m]: 1 / len(moves) for m in moves }
+
+        features = move_features(game, snake)[moves]
+        scores = np.where(features, lifts, 1.0).prod(axis=1)
+        scores /= scores.sum()
+        return { Pos.all_directions[m]: float(p) for m, p in zip(moves, scores) }
+
+    def likely_moves(self, game: Game, snake_id, threshold: Optional[float] = None, directions=None):
+        " the snake's moves (out of directions) with at least threshold probability, most likely first (never none) "
+        threshold = self.threshold if threshold is None else threshold
+        probabilities = self.move_probabilities(game, snake_id, directions)
+        ranked = sorted(probabilities, key=lambda d: -probabilities[d])
+        return [ d for d in ranked if probabilities[d] >= threshold ] or ranked[:1]
+
+    def prune(self, game: Game, snake_id, directions):
+        " directions, without the ones snake_id is unlikely to pick (an AlphaBeta reply_filter) "
+        likely = self.likely_moves(game, snake_id, directions=directions)
+        return [ d for d in directions if d in likely ] or list(directions)
+
+    def as_dict(self):
+        return {
+            'version': 1,
+            'features': list(feature_names),
+            'opponents': { name: { 'observations': int(entry[0]), 'chosen': entry[1].round(4).tolist(),
+                                   'expected': entry[2].round(4).tolist() }
+                           for name, entry in self.opponents.items() },
+        }
+
+    def load(self, path: str):
+        " replace the store with the one saved at path "
+        with open(path) as f:
+            d = json.load(f)
+        if d.get('version') != 1 or d.get('features') != list(feature_names):
+            raise Exception(f"OpponentModel: {path} isn't a version 1 opponent store")
+        self.opponents = OrderedDict(
+            (name, [entry['observations'], np.array(entry['chosen']), np.array(entry['expected'])])
+            for name, entry in d['opponents'].items())
+        while len(self.opponents) > self.max_opponents:
+            self.opponents.popitem(last=False)
+
+    def save(self, path: Optional[str] = None):
+        " write the store to path (default the one it was loaded from) "
+        path = self.path if path is None else path
+        if path is None:
+            raise Exception("OpponentModel.save: no path")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # write then rename, so a reader never sees half a file
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, 'w') as f:
+            json.dump(self.as_dict(), f)
+        os.replace(temp, path)
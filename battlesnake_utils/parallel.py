@@ -0,0 +1,327 @@
+"""
+Root parallel search: our first moves are split across a pool of worker
+processes that each search their share, and the results are merged.
+
+Workers are started once. Each turn the game is written into a shared
+memory block (SharedGame) instead of being pickled, so a task is just a
+few integers and a result a few numbers per direction.
+"""
+from typing import Optional
+
+import queue
+import multiprocessing
+import random
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+from .battlesnake import Game, Pos, copy_ruleset
+
+
+class SharedGame():
+    """
+    A game encoded as int32s in shared memory.
+
+    Layout: a header (generation, turn, width, height, number of snakes,
+    our snake's index, food count, hazard count, hazard damage, ruleset
+    name, turns between royale shrinks), then per snake its slot, length
+    and health, then all body segments, food and hazards as flat cell
+    indices (y * width + x). Snake ids aren't kept: a snake gets a slot
+    the first time it's written in a game and keeps it, even when others
+    die, and is called by its slot ('0', '1', ...) in the games read back.
+    A game is taken to be a new one when its turn doesn't go forward or
+    none of its snakes have a slot yet.
+    """
+
+    header_size = 11
+    # ruleset names as written in the header, other names are read back as 'standard'
+    ruleset_names = ('standard', 'solo', 'royale', 'squad', 'constrictor', 'wrapped')
+
+    def __init__(self, name: Optional[str] = None, max_width=25, max_height=25, max_snakes=8):
+        max_cells = max_width * max_height
+        # bodies can have stacked segments, allow for twice the board
+        self.size = self.header_size + 3 * max_snakes + 4 * max_cells
+        self.max_cells = max_cells
+        self.max_snakes = max_snakes
+        # snake id -> slot, for the game last written
+        self.slots = {}
+        self.last_turn = None
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.size * 4)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.data = np.ndarray((self.size,), dtype=np.int32, buffer=self.shm.buf)
+        if self.owner:
+            self.data[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def generation(self):
+        return int(self.data[0])
+
+    def write(self, game: Game):
+        " encode game, and bump the generation "
+        board = game.board
+        width = board.width
+        snakes = board.snakes
+        if len(snakes) > self.max_snakes or width * board.height > self.max_cells:
+            raise Exception(f"SharedGame: game doesn't fit ({len(snakes)} snakes, {width}x{board.height})")
+
+        if self.last_turn is None or game.turn <= self.last_turn or not any(snake.id in self.slots for snake in snakes):
+            self.slots = {}
+        self.last_turn = game.turn
+        for snake in snakes:
+            if snake.id not in self.slots:
+                self.slots[snake.id] = len(self.slots)
+
+        data = self.data
+        you_index = snakes.index(game.you) if game.you in snakes else -1
+        name = game.ruleset.get('name')
+        name_code = self.ruleset_names.index(name) if name in self.ruleset_names else 0
+        data[1:self.header_size] = [game.turn, width, board.height, len(snakes), you_index,
+                                    len(board.food), len(board.hazards), game.hazard_damage,
+                                    name_code, game.shrink_every]
+
+        at = self.header_size
+        for snake in snakes:
+            data[at] = self.slots[snake.id]
+            data[at + 1] = len(snake.body)
+            data[at + 2] = snake.health
+            at += 3
+        at = self.header_size + 3 * self.max_snakes
+        cells = [ pos.y * width + pos.x for snake in snakes for pos in snake.body ]
+        cells += [ pos.y * width + pos.x for pos in board.food ]
+        cells += [ pos.y * width + pos.x for pos in board.hazards ]
+        if len(cells) > self.size - at:
+            raise Exception("SharedGame: too many segments, food and hazards")
+        data[at:at + len(cells)] = cells
+        data[0] += 1
+
+    def read(self):
+        " decode the game that was last written (its board only builds a df when it's used) "
+        data = self.data.tolist()
+        generation, turn, width, height, n_snakes, you_index, n_food, n_hazards, hazard_damage, name_code, \
+            shrink_every = data[:self.header_size]
+
+        def pos(cell):
+            return { 'x': cell % width, 'y': cell // width }
+
+        at = self.header_size + 3 * self.max_snakes
+        snakes = []
+        for i in range(n_snakes):
+            slot, length, health = data[self.header_size + 3 * i:self.header_size + 3 * i + 3]
+            body = [ pos(cell) for cell in data[at:at + length] ]
+            at += length
+            snakes.append({ 'id': str(slot), 'name': str(slot), 'health': health, 'length': length,
+                            'body': body, 'head': body[0] })
+        food = [ pos(cell) for cell in data[at:at + n_food] ]
+        at += n_food
+        hazards = [ pos(cell) for cell in data[at:at + n_hazards] ]
+
+        ruleset = copy_ruleset(Game.default_ruleset)
+        ruleset['name'] = self.ruleset_names[name_code]
+        ruleset['settings']['hazardDamagePerTurn'] = hazard_damage
+        ruleset['settings']['royale']['shrinkEveryNTurns'] = shrink_every
+        you = snakes[you_index] if you_index >= 0 else { 'id': '-1', 'name': '', 'health': 0, 'length': 0,
+                                                        'body': [], 'head': None }
+        return Game({
+            'game': { 'ruleset': ruleset },
+            'turn': turn,
+            'board': { 'width': width, 'height': height, 'snakes': snakes, 'food': food, 'hazards': hazards },
+            'you': you,
+        }, lazy_df=True)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# per worker process state, set up by worker_init()
+worker = {}
+
+
+def worker_init(shm_name, max_width, max_height, max_snakes, engine, engine_options, ready):
+    " runs once in each worker: attach to the shared game and make a search engine, then say so on ready "
+    worker['shared'] = SharedGame(shm_name, max_width, max_height, max_snakes)
+    worker['engine'] = make_engine(engine, engine_options)
+    worker['game'] = None
+    worker['generation'] = -1
+    ready.put(True)
+
+
+def make_engine(engine, options):
+    if engine == 'mcts':
+        from .mcts import MCTS
+        return MCTS(**options)
+    if engine == 'alphabeta':
+        from .alphabeta import AlphaBeta
+        return AlphaBeta(**options)
+    raise Exception(f"unknown search engine: {engine}")
+
+
+def worker_search(generation, move_mask, deadline, seed):
+    """
+    search the shared game with our first move limited to the directions in
+    move_mask, until deadline (time.time()); returns (visits, scores), one
+    per direction. For mcts scores are summed rewards, for alphabeta the
+    score of the best move (None for directions that weren't searched).
+    Nothing is searched for a task picked up after its deadline, or once the
+    shared game has moved on to a later generation.
+    """
+    visits = [0] * 4
+    scores = [None] * 4
+    time_budget = deadline - time.time()
+    if time_budget <= 0:
+        return visits, scores
+    if worker['generation'] != generation:
+        shared = worker['shared']
+        if shared.generation != generation:
+            return visits, scores
+        game = shared.read()
+        if shared.generation != generation:
+            return visits, scores
+        worker['game'] = game
+        worker['generation'] = generation
+    game = worker['game']
+    engine = worker['engine']
+    root_moves = Pos.directions_in_mask(move_mask)
+
+    if hasattr(engine, 'root_move_visits'):
+        engine.random = random.Random(seed)
+        engine.search(game, time_budget=time_budget, root_moves=root_moves)
+        values = engine.root_move_values(game.you.id)
+        for direction, count in engine.root_move_visits(game.you.id).items():
+            if direction in root_moves:
+                i = Pos.all_directions.index(direction)
+                visits[i] = count
+                scores[i] = values[direction]
+    else:
+        direction = engine.search(game, time_budget=time_budget, root_moves=root_moves)
+        if direction is not None:
+            i = Pos.all_directions.index(direction)
+            visits[i] = engine.stats['nodes']
+            scores[i] = engine.stats['score']
+    return visits, scores
+
+
+class ParallelSearch():
+    """
+    Root parallel search over a pool of worker processes, started once.
+
+    Each turn our legal first moves are dealt out to the workers (with more
+    workers than moves, moves are searched by several workers with
+    different seeds), and the results merged. For 'mcts': by total visits
+    when every worker searched every move, otherwise by mean reward, as
+    visits from workers searching different moves can't be compared. For
+    'alphabeta': by best score. Use as a context manager, or close().
+
+    Tasks are sent one by one and searched until a shared deadline, overhead
+    seconds short of the time budget, to leave time to send them and merge
+    the results. A worker that picks up a second task (when another is still
+    busy) only searches what's left until the deadline, and results that
+    aren't back by the end of the budget are left out.
+    """
+
+    # seconds of the time budget kept for sending tasks, searches running over, collecting and merging results
+    overhead = 0.04
+    # seconds to wait for the workers to start
+    start_timeout = 60
+
+    def __init__(self, processes: Optional[int] = None, engine='mcts', engine_options: Optional[dict] = None,
+                 max_width=25, max_height=25, max_snakes=8):
+        self.engine = engine
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shared = SharedGame(None, max_width, max_height, max_snakes)
+        ready = multiprocessing.Queue()
+        self.pool = multiprocessing.Pool(self.processes, initializer=worker_init,
+                                         initargs=(self.shared.name, max_width, max_height, max_snakes,
+                                                   engine, engine_options or {}, ready))
+        self.stats = {}
+        # the first search has no time to spare for workers still starting
+        try:
+            for _ in range(self.processes):
+                ready.get(timeout=self.start_timeout)
+        except queue.Empty:
+            self.close()
+            raise Exception(f"ParallelSearch: workers didn't start within {self.start_timeout}s")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self.shared.close()
+
+    def split_moves(self, game: Game):
+        " a move mask per worker, dealing our legal moves out between them "
+        masks, _ = game.board.move_masks(with_danger=False)
+        mask = int(masks[game.board.snakes.index(game.you)]) if game.you in game.board.snakes else 0
+        moves = Pos.directions_in_mask(mask) or list(Pos.all_directions)
+
+        n = self.processes if self.engine == 'mcts' else min(self.processes, len(moves))
+        shares = [0] * n
+        for i in range(max(n, len(moves))):
+            shares[i % n] |= Pos.direction_bits[moves[i % len(moves)]]
+        return shares
+
+    def search(self, game: Game, time_budget=0.3):
+        " best direction for game.you "
+        start = time.time()
+        self.shared.write(game)
+        generation = self.shared.generation
+        deadline = start + max(time_budget - self.overhead, time_budget / 2)
+        tasks = [ (generation, share, deadline, generation * self.processes + i)
+                  for i, share in enumerate(self.split_moves(game)) ]
+        pending = [ self.pool.apply_async(worker_search, task) for task in tasks ]
+
+        # searches stop at deadline (give or take an iteration), most of the rest is for the results to come back
+        end = start + max(time_budget - self.overhead / 4, time_budget * 3 / 4)
+        results = []
+        late = 0
+        for result in pending:
+            try:
+                results.append(result.get(timeout=max(end - time.time(), 0)))
+            except multiprocessing.TimeoutError:
+                late += 1
+
+        visits = [0] * 4
+        scores = [None] * 4
+        for worker_visits, worker_scores in results:
+            for i in range(4):
+                visits[i] += worker_visits[i]
+                if worker_scores[i] is None:
+                    continue
+                if scores[i] is None:
+                    scores[i] = worker_scores[i]
+                elif self.engine == 'mcts':
+                    scores[i] += worker_scores[i]
+                else:
+                    scores[i] = max(scores[i], worker_scores[i])
+        if self.engine == 'mcts':
+            # summed rewards to mean rewards
+            scores = [ score / visits[i] if score is not None and visits[i] else None for i, score in enumerate(scores) ]
+
+        self.stats = { 'workers': len(tasks), 'late': late, 'visits': dict(zip(Pos.all_directions, visits)),
+                       'scores': dict(zip(Pos.all_directions, scores)) }
+
+        searched = [ i for i in range(4) if scores[i] is not None ]
+        if not searched:
+            return None
+        all_searched_everything = len(set(share for _, share, _, _ in tasks)) == 1
+        if self.engine == 'mcts' and all_searched_everything:
+            best = max(searched, key=lambda i: visits[i])
+        else:
+            best = max(searched, key=lambda i: scores[i])
+        return Pos.all_directions[best]
@@ -0,0 +1,196 @@
+"""
+Object pooling for simulations. Search and self-play copy a game for
+every node or playout and drop it right after, and all those Games,
+Boards, Snakes, positions and arrays keep the garbage collector busy,
+which shows up as pauses in our slowest moves.
+
+A GamePool keeps released games and copies the next game into one of
+them: the board's occupancy array, the snakes and their body deques, and
+the food and hazard lists and sets are refilled in place, and positions
+are the shared ones of the board's PosTable, so a copy allocates next to
+nothing.
+
+    pool = GamePool()
+    with gc_paused():
+        for ...:
+            game = pool.acquire_from(root)
+            ...
+            pool.release(game)
+
+Pooled games are like Game.copy(lazy_df=True): the df is built when it's
+read. A released game (its board and snakes too) is handed out again by
+a later acquire_from(), so nothing of it may be kept after release().
+"""
+import gc
+import contextlib
+import numpy as np
+
+from .battlesnake import Board, FrozenPos, Game, Snake, copy_ruleset
+
+
+@contextlib.contextmanager
+def gc_paused(collect=True):
+    """
+    run a block with the garbage collector off, and back on (if it was)
+    however the block ends. With collect, the garbage the block made is
+    collected right after, rather than at some later pause
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+            if collect:
+                gc.collect(0)
+
+
+def empty_game():
+    " a Game with an empty, lazy board, to be filled by GamePool "
+    board = Board.__new__(Board)
+    board.width = 0
+    board.height = 0
+    board.positions = None
+    board.snakes = []
+    board.food = []
+    board.hazards = []
+    board.crumbs = []
+    board.lazy_df = True
+    board.df_stale = True
+    board._df = None
+    board.version = 0
+    board.occupancy = np.zeros((0, 0), dtype=np.int16)
+    board.food_cells = set()
+    board.hazard_cells = set()
+    board.crumb_cells = set()
+    board._spatial = None
+
+    game = Game.__new__(Game)
+    game.board = board
+    game.ruleset = copy_ruleset(Game.default_ruleset)
+    game.timeline = None
+    game.turn = 0
+    game.you = None
+    game._analysis = None
+    # the snakes this game owns, whether or not they're still on its board
+    game._pool_snakes = []
+    game._pool_you = Snake()
+    game._pool = None
+    return game
+
+
+class GamePool():
+    """
+    Reusable games for simulation loops (see the module docstring).
+    At most max_free released games are kept for reuse. Counts hits (a
+    released game was reused), misses (a new one was made), games in use
+    and the peak of that.
+    """
+
+    def __init__(self, max_free=4096):
+        self.max_free = max_free
+        self.free = []
+        self.in_use = 0
+        self.peak = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        return { 'hits': self.hits, 'misses': self.misses, 'in_use': self.in_use, 'peak': self.peak,
+                 'free': len(self.free) }
+
+    def reserve(self, count: int):
+        " make sure count games are ready to be acquired without making new ones "
+        while len(self.free) < min(count, self.max_free):
+            self.free.append(empty_game())
+
+    def acquire_from(self, game: Game):
+        " a pooled copy of game, independent of it (like game.copy(lazy_df=True)) until release() "
+        if self.free:
+            pooled = self.free.pop()
+            self.hits += 1
+        else:
+            pooled = empty_game()
+            self.misses += 1
+        pooled._pool = self
+        self.in_use += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+        copy_into(game, pooled)
+        return pooled
+
+    def release(self, game: Game):
+        " hand game back to the pool, it mustn't be used after this "
+        if getattr(game, '_pool', None) is not self:
+            raise Exception("GamePool.release: not a game acquired from this pool (or released already)")
+        game._pool = None
+        game._analysis = None
+        game.timeline = None
+        self.in_use -= 1
+        if len(self.free) < self.max_free:
+            self.free.append(game)
+
+
+def copy_into(source: Game, game: Game):
+    " make pooled game (from empty_game()) a copy of source, reusing what it has "
+    board = source.board
+    target = game.board
+    table = board.positions
+
+    def shared(pos):
+        return pos if type(pos) is FrozenPos else table.get(pos.x, pos.y)
+
+    target.width = board.width
+    target.height = board.height
+    target.positions = table
+
+    owned = game._pool_snakes
+    while len(owned) < len(board.snakes):
+        owned.append(Snake())
+    snakes = target.snakes
+    snakes.clear()
+    you = None
+    for snake, copy in zip(board.snakes, owned):
+        copy.id = snake.id
+        copy.name = snake.name
+        copy.health = snake.health
+        body = copy.body
+        body.clear()
+        body.extend(map(shared, snake.body))
+        snakes.append(copy)
+        if snake is source.you:
+            you = copy
+    if you is None:
+        you = game._pool_you
+        you.id = source.you.id
+        you.name = source.you.name
+        you.health = source.you.health
+        you.body.clear()
+        you.body.extend(map(shared, source.you.body))
+
+    for name, cells in (('food', 'food_cells'), ('hazards', 'hazard_cells'), ('crumbs', 'crumb_cells')):
+        positions = getattr(target, name)
+        positions.clear()
+        positions.extend(map(shared, getattr(board, name)))
+        cell_set = getattr(target, cells)
+        cell_set.clear()
+        cell_set.update(positions)
+
+    if target.occupancy.shape == board.occupancy.shape:
+        np.copyto(target.occupancy, board.occupancy)
+    else:
+        target.occupancy = board.occupancy.copy()
+    target._spatial = None
+    target.lazy_df = True
+    target._df = None
+    target.df_stale = True
+    # never 0 again, so nothing derived from this board's last use looks current
+    target.version += 1
+
+    game.ruleset = copy_ruleset(source.ruleset)
+    game.timeline = source.timeline
+    game.turn = source.turn
+    game.you = you
+    game._analysis = None
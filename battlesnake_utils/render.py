@@ -0,0 +1,148 @@
+"""
+Text rendering of boards without pandas, for debugging and replays.
+
+Renderer turns Board.cell_codes() into text through a lookup table of
+glyphs, into a buffer allocated once, with an ANSI colour per snake if
+asked. Replay keeps the cell codes of every turn of a game, and moving
+from one turn to another only rewrites the cells that differ, with ANSI
+cursor moves, so long games can be scrubbed through in a terminal.
+"""
+from typing import Optional
+
+import sys
+import numpy as np
+
+from .battlesnake import Board, Game, Snake
+
+# ANSI colour per snake (cycled), and for food and hazards
+snake_colours = [32, 34, 35, 36, 33, 31, 92, 94, 95, 96]
+food_colour = 91
+hazard_colour = 90
+reset = '\x1b[0m'
+
+
+class Renderer():
+    """
+    Draws boards of one size the way Board.__str__ shows them (increasing y
+    going up, same characters), each cell three characters wide.
+    """
+
+    # characters a row starts with, for its y label
+    label_width = 3
+
+    # characters per cell
+    cell_width = 3
+
+    def __init__(self, width: int, height: int, colour=False):
+        self.width = width
+        self.height = height
+        self.colour = colour
+
+        glyphs = [' '] * 256
+        for i in range(84):
+            code = Board.body_code(i)
+            for offset, char in enumerate((str(i), Snake.head_char, Snake.tail_char)):
+                glyphs[code + offset] = self.paint(char, snake_colours[i % len(snake_colours)])
+        glyphs[Board.food_code] = self.paint('f', food_colour)
+        glyphs[Board.hazard_code] = self.paint('.', hazard_colour)
+        glyphs[Board.crumb_code] = ';'
+        self.glyphs = np.array([ glyph.rjust(self.cell_width) if len(glyph) == 1 else ' ' * (self.cell_width - 1) + glyph
+                                 for glyph in glyphs ], dtype=object)
+
+        # one row of text per board row, top row first
+        self.buffer = np.empty((height, width), dtype=object)
+        self.header = ' ' * self.label_width + ''.join(str(x).rjust(self.cell_width) for x in range(width))
+        self.labels = [ str(y).ljust(self.label_width) for y in range(height - 1, -1, -1) ]
+
+    def paint(self, char, colour):
+        if not self.colour:
+            return char
+        return f"\x1b[{colour}m{char}{reset}"
+
+    def render_codes(self, codes, overlay: Optional[dict] = None):
+        " text for a height x width array of cell codes, overlay maps (x, y) to a character to show instead "
+        np.take(self.glyphs, codes[::-1], out=self.buffer)
+        if overlay:
+            for (x, y), char in overlay.items():
+                if 0 <= x < self.width and 0 <= y < self.height:
+                    self.buffer[self.height - 1 - y, x] = char.rjust(self.cell_width)
+        rows = [ label + ''.join(row) for label, row in zip(self.labels, self.buffer.tolist()) ]
+        return self.header + '\n' + '\n'.join(rows)
+
+    def render(self, board: Board, overlay: Optional[dict] = None):
+        " text for board (see render_codes()) "
+        return self.render_codes(board.cell_codes(), overlay)
+
+    def cursor_to(self, x: int, y: int, top=1):
+        " ANSI escape moving the cursor to cell x,y of a frame drawn from line top "
+        line = top + 1 + (self.height - 1 - y)
+        column = self.label_width + self.cell_width * x + 1
+        return f"\x1b[{line};{column}H"
+
+    def diff(self, old_codes, new_codes, top=1):
+        " ANSI escapes redrawing only the cells that differ between two frames drawn from line top "
+        ys, xs = np.nonzero(old_codes != new_codes)
+        return ''.join(self.cursor_to(x, y, top) + self.glyphs[new_codes[y, x]] for y, x in zip(ys.tolist(), xs.tolist()))
+
+
+class Replay():
+    """
+    Frames of a game (Games, Boards or game state dicts, one per turn) as
+    cell codes, shown on a terminal. show() draws a whole frame, seek()
+    then redraws only what changed, scrub() steps through interactively.
+    """
+
+    def __init__(self, frames, colour=True, out=None):
+        self.codes = []
+        self.turns = []
+        for i, frame in enumerate(frames):
+            if isinstance(frame, dict):
+                frame = Game(frame, lazy_df=True)
+            if isinstance(frame, Game):
+                self.turns.append(frame.turn)
+                frame = frame.board
+            else:
+                self.turns.append(i)
+            self.codes.append(frame.cell_codes())
+        if not self.codes:
+            raise Exception("Replay: no frames")
+
+        height, width = self.codes[0].shape
+        self.renderer = Renderer(width, height, colour)
+        self.out = out if out is not None else sys.stdout
+        self.current = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def status_line(self, i: int):
+        return f"\x1b[{self.renderer.height + 3};1H\x1b[Kturn {self.turns[i]} ({i + 1}/{len(self.codes)})"
+
+    def show(self, i: int = 0):
+        " clear the screen and draw frame i "
+        self.out.write('\x1b[2J\x1b[H' + self.renderer.render_codes(self.codes[i]) + self.status_line(i))
+        self.out.flush()
+        self.current = i
+
+    def seek(self, i: int):
+        " go to frame i, redrawing only the cells that differ from the frame shown "
+        i = max(0, min(i, len(self.codes) - 1))
+        if self.current is None:
+            return self.show(i)
+        self.out.write(self.renderer.diff(self.codes[self.current], self.codes[i]) + self.status_line(i))
+        self.out.flush()
+        self.current = i
+
+    def scrub(self):
+        " step through the frames: enter for the next, 'p' for the previous, a number to jump there, 'q' to stop "
+        self.show(0)
+        while True:
+            command = input().strip()
+            if command == 'q':
+                break
+            if command == 'p':
+                self.seek(self.current - 1)
+            elif command.isdigit():
+                self.seek(int(command))
+            else:
+                self.seek(self.current + 1)
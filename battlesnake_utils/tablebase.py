@@ -0,0 +1,289 @@
+"""
+Endgame tablebase: exact results for two short snakes on a small board.
+
+Positions are two snakes of fixed lengths (us first) with no food on the
+board, health is taken to be enough. Moves are simultaneous, so a position
+is a win (in d moves) when we have a move that wins whatever the opponent
+does, a loss when the opponent can beat each of our moves, and a draw
+otherwise (including games where neither side can force anything).
+
+generate() works out every position's successors with the rules of
+Game.advance (in parallel, see transitions()), solves them backwards from
+the finished games, one distance at a time, and writes one byte per
+position to a file, indexed by a perfect index of the two bodies: the head
+cell, then the direction from each segment to the next, 2 bits each.
+Tablebase memory maps that file, so probing a position is an index
+computation and a byte read.
+"""
+from typing import Optional
+
+import os
+import struct
+import multiprocessing
+import numpy as np
+
+from .battlesnake import Game, Pos
+
+magic = b'BSTB'
+header_format = '<4sHHHHH2x'
+header_size = struct.calcsize(header_format)
+version = 1
+
+# byte values: 0 draw, 1..127 win in that many moves, 128..254 loss in (value - 127) moves
+draw = 0
+max_distance = 127
+invalid = 255
+
+# successor codes for finished games
+we_win = -1
+we_lose = -2
+both_lose = -3
+no_position = -4
+
+# direction offsets in Pos.all_directions order
+offsets = [(-1, 0), (0, 1), (1, 0), (0, -1)]
+
+
+def body_count(width: int, height: int, length: int):
+    " number of body indices for a snake of given length "
+    return width * height * 4 ** (length - 1)
+
+
+def decode_body(index: int, width: int, height: int, length: int):
+    " the cells (x, y) of body index, head first, None if it leaves the board or crosses itself "
+    head, directions = divmod(index, 4 ** (length - 1))
+    x, y = head % width, head // width
+    body = [(x, y)]
+    for i in range(length - 2, -1, -1):
+        dx, dy = offsets[(directions >> (2 * i)) & 3]
+        x += dx
+        y += dy
+        if not (0 <= x < width and 0 <= y < height) or (x, y) in body:
+            return None
+        body.append((x, y))
+    return tuple(body)
+
+
+def encode_body(body, width: int):
+    " body index of a body given as cells (x, y) (or Pos), head first, None if segments aren't adjacent "
+    cells = [ (pos.x, pos.y) if isinstance(pos, Pos) else pos for pos in body ]
+    index = cells[0][1] * width + cells[0][0]
+    for (x, y), (next_x, next_y) in zip(cells, cells[1:]):
+        try:
+            direction = offsets.index((next_x - x, next_y - y))
+        except ValueError:
+            return None
+        index = index * 4 + direction
+    return index
+
+
+class Rules():
+    " the bodies of one board and pair of lengths, and the moves between them "
+
+    def __init__(self, width: int, height: int, lengths):
+        self.width = width
+        self.height = height
+        self.lengths = tuple(lengths)
+        self.bodies = [ [ decode_body(i, width, height, length) for i in range(body_count(width, height, length)) ]
+                        for length in self.lengths ]
+        self.indices = [ { body: i for i, body in enumerate(bodies) if body is not None } for bodies in self.bodies ]
+        self.n_second = len(self.bodies[1])
+
+    def step(self, ours, theirs, our_move: int, their_move: int):
+        """
+        successor code of bodies ours and theirs after a joint move: the
+        position index, or we_win, we_lose or both_lose
+        """
+        width = self.width
+        height = self.height
+        heads = []
+        for body, move in ((ours, our_move), (theirs, their_move)):
+            dx, dy = offsets[move]
+            heads.append((body[0][0] + dx, body[0][1] + dy))
+        new_ours = (heads[0],) + ours[:-1]
+        new_theirs = (heads[1],) + theirs[:-1]
+
+        dead = []
+        for head, body, other in ((heads[0], new_ours, new_theirs), (heads[1], new_theirs, new_ours)):
+            x, y = head
+            dead.append(not (0 <= x < width and 0 <= y < height) or head in body[1:] or head in other[1:])
+        if heads[0] == heads[1]:
+            dead[0] = dead[0] or len(ours) <= len(theirs)
+            dead[1] = dead[1] or len(theirs) <= len(ours)
+
+        if dead[0] and dead[1]:
+            return both_lose
+        if dead[0]:
+            return we_lose
+        if dead[1]:
+            return we_win
+        return self.indices[0][new_ours] * self.n_second + self.indices[1][new_theirs]
+
+    def successors(self, position: int):
+        " the 16 successor codes of position (our move * 4 + their move), None if it's not a position "
+        ours = self.bodies[0][position // self.n_second]
+        theirs = self.bodies[1][position % self.n_second]
+        if ours is None or theirs is None or set(ours) & set(theirs):
+            return None
+        return [ self.step(ours, theirs, m, r) for m in range(4) for r in range(4) ]
+
+
+# per worker process rules, set up by worker_init()
+worker = {}
+
+
+def worker_init(width, height, lengths):
+    worker['rules'] = Rules(width, height, lengths)
+
+
+def transitions(start: int, stop: int):
+    " successor codes for positions start..stop-1, an int32 array (stop - start, 16) "
+    rules = worker['rules']
+    table = np.full((stop - start, 16), no_position, dtype=np.int32)
+    for position in range(start, stop):
+        codes = rules.successors(position)
+        if codes is not None:
+            table[position - start] = codes
+    return table
+
+
+def solve(table):
+    """
+    byte per position (see draw, max_distance, invalid) from a successor
+    table: finished games first, then positions decided in 1, 2, ... moves
+    """
+    n = len(table)
+    # finished games are extra entries at the end: win, loss, draw, in 0 moves
+    status = np.zeros(n + 3, dtype=np.int8)   # 1 win, 2 loss
+    status[n] = 1
+    status[n + 1] = 2
+    distance = np.zeros(n + 3, dtype=np.int16)
+    codes = table.copy()
+    codes[table == we_win] = n
+    codes[table == we_lose] = n + 1
+    codes[table == both_lose] = n + 2
+    valid = table[:, 0] != no_position
+    codes[~valid] = n + 2
+    codes = codes.reshape(n, 4, 4)
+
+    open_positions = np.flatnonzero(valid)
+    for d in range(1, max_distance + 1):
+        after = status[codes[open_positions]]
+        wins = (after == 1).all(axis=2).any(axis=1)
+        losses = (after == 2).any(axis=2).all(axis=1)
+        if not wins.any() and not losses.any():
+            break
+        status[open_positions[wins]] = 1
+        status[open_positions[losses]] = 2
+        distance[open_positions[wins | losses]] = d
+        open_positions = open_positions[~(wins | losses)]
+
+    result = np.full(n, invalid, dtype=np.uint8)
+    result[valid] = draw
+    won = status[:n] == 1
+    lost = status[:n] == 2
+    result[won] = distance[:n][won]
+    result[lost] = distance[:n][lost] + max_distance
+    return result
+
+
+def generate(path: str, width: int, height: int, lengths=(3, 3), processes: Optional[int] = None, chunk=4096):
+    """
+    solve all positions for a width x height board and snakes of given
+    lengths (ours first) and write them to path; returns the result bytes
+    """
+    if width * height > 49:
+        raise Exception(f"tablebase: {width}x{height} is too big, 7x7 at most")
+    n = body_count(width, height, lengths[0]) * body_count(width, height, lengths[1])
+    ranges = [ (start, min(start + chunk, n)) for start in range(0, n, chunk) ]
+
+    with multiprocessing.Pool(processes, initializer=worker_init, initargs=(width, height, lengths)) as pool:
+        table = np.concatenate(pool.starmap(transitions, ranges))
+    result = solve(table)
+
+    # write then rename, so a reader never sees half a file
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(struct.pack(header_format, magic, version, width, height, lengths[0], lengths[1]))
+        f.write(result.tobytes())
+    os.replace(temp, path)
+    return result
+
+
+class Tablebase():
+    """
+    A generated tablebase, memory mapped. probe() a game for our result,
+    best_move() for the move that gets it.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            fields = struct.unpack(header_format, f.read(header_size))
+        if fields[0] != magic or fields[1] != version:
+            raise Exception(f"tablebase: {path} isn't a version {version} tablebase")
+        _, _, self.width, self.height, first, second = fields
+        self.lengths = (first, second)
+        self.n_second = body_count(self.width, self.height, second)
+        self.results = np.memmap(path, dtype=np.uint8, mode='r', offset=header_size,
+                                 shape=(body_count(self.width, self.height, first) * self.n_second,))
+        self.rules = None
+
+    @staticmethod
+    def describe(value: int):
+        " (result, distance) for a byte value: 'win', 'loss' or 'draw' and the number of moves "
+        if value == invalid:
+            return None
+        if value == draw:
+            return ('draw', None)
+        if value <= max_distance:
+            return ('win', int(value))
+        return ('loss', int(value) - max_distance)
+
+    def position(self, game: Game):
+        " the position index of game, None if the tablebase doesn't cover it "
+        board = game.board
+        if (board.width, board.height) != (self.width, self.height) or len(board.snakes) != 2:
+            return None
+        if board.food or board.hazards or game.you not in board.snakes:
+            return None
+        other = board.snakes[1] if board.snakes[0] is game.you else board.snakes[0]
+        if (game.you.length, other.length) != self.lengths:
+            return None
+        ours = encode_body(game.you.body, self.width)
+        theirs = encode_body(other.body, self.width)
+        if ours is None or theirs is None:
+            return None
+        return ours * self.n_second + theirs
+
+    def probe(self, game: Game):
+        " (result, distance) for us in game (see describe()), None if the tablebase doesn't cover it "
+        position = self.position(game)
+        if position is None:
+            return None
+        return self.describe(int(self.results[position]))
+
+    def best_move(self, game: Game):
+        " the direction that does best against every reply, None if the tablebase doesn't cover game "
+        position = self.position(game)
+        if position is None or self.results[position] == invalid:
+            return None
+        if self.rules is None:
+            self.rules = Rules(self.width, self.height, self.lengths)
+
+        def rank(code):
+            if code == we_win:
+                return (2, 0)
+            if code == we_lose:
+                return (0, 0)
+            if code == both_lose:
+                return (1, 0)
+            result, distance = self.describe(int(self.results[code]))
+            if result == 'win':
+                return (2, -distance)
+            if result == 'loss':
+                return (0, distance)
+            return (1, 0)
+
+        codes = self.rules.successors(position)
+        worst = [ min(rank(code) for code in codes[m * 4:m * 4 + 4]) for m in range(4) ]
+        return Pos.all_directions[max(range(4), key=lambda m: worst[m])]
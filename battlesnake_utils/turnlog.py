@@ -0,0 +1,420 @@
+"""
+Compact game recording: a turn log keeps a full game state every K turns
+and only what changed in between, and can be read back at any turn by
+starting from the keyframe before it.
+
+A turn log is a text file of JSON lines (gzipped if the name ends in .gz,
+which makes seeking slower). A keyframe is a whole game state, as sent to
+a snake each turn (or Game.as_dict()):
+
+    {"key":[game id,turn,game number],"state":{...}}
+
+and the turns after it are deltas on the turn before:
+
+    {"turn":12,"snakes":{id:[health,new heads,kept,stacked,changed]},"dead":[ids],
+     "food":{"+":[[x,y]],"-":[[x,y]]},"hazards":{...},"you":{...}}
+
+A snake's new body is its new heads, then the first kept segments of its
+old body, then its last segment stacked (after eating) stacked more times.
+changed holds its other fields that changed (latency, shout), and is left
+out when there are none, as are snakes that didn't change at all. Food and
+hazards list what was removed and what was added to the end, or the whole
+new list when that wouldn't give the same order. "you" is only there when
+we're no longer on the board. head and length are always those of the body.
+
+The game number counts the games a writer has recorded, a new one starting
+when the game id changes or the turn doesn't go forward. Game.as_dict()
+always gives the same game id, so games recorded as Games are told apart
+by their number: the reader calls the first game with an id by that id
+and later ones id#2, id#3, ...
+
+A new game, a turn that doesn't follow the one before, a new snake or any
+other change a delta can't express starts a keyframe early. Every record
+is written as one line and flushed, so a log can be read while a game is
+still being recorded (a half written last line is ignored, and refresh()
+picks up what's been added since).
+"""
+from typing import Optional, Union
+
+import os
+import gzip
+import json
+from collections import Counter
+
+from .battlesnake import Game
+
+# snake fields that are kept as health and body (head and length follow from the body)
+snake_body_fields = ('health', 'body', 'head', 'length')
+
+
+def snake_entry(snake: dict):
+    " [other fields, health, body as (x, y) tuples] of a snake dict "
+    fields = { key: value for key, value in snake.items() if key not in snake_body_fields }
+    return [fields, snake['health'], [ (pos['x'], pos['y']) for pos in snake['body'] ]]
+
+
+def snake_dict(entry):
+    " the snake dict of a snake_entry() "
+    fields, health, body = entry
+    snake = dict(fields)
+    snake['health'] = health
+    snake['body'] = [ {'x': x, 'y': y} for x, y in body ]
+    if body:
+        snake['head'] = {'x': body[0][0], 'y': body[0][1]}
+    snake['length'] = len(body)
+    return snake
+
+
+def to_frame(state: dict):
+    " a game state dict as a frame: what's compared and replayed between turns "
+    board = state['board']
+    snakes = { snake['id']: snake_entry(snake) for snake in board['snakes'] }
+    you = state['you']
+    return {
+        'game': state.get('game'),
+        'turn': state['turn'],
+        'board': { key: value for key, value in board.items() if key not in ('snakes', 'food', 'hazards') },
+        'snakes': snakes,
+        'food': [ (pos['x'], pos['y']) for pos in board['food'] ],
+        'hazards': [ (pos['x'], pos['y']) for pos in board['hazards'] ],
+        'you_id': you['id'],
+        # only kept when we're not on the board
+        'you': None if you['id'] in snakes else snake_entry(you),
+    }
+
+
+def to_state(frame: dict):
+    " the game state dict of a frame "
+    board = dict(frame['board'])
+    board['food'] = [ {'x': x, 'y': y} for x, y in frame['food'] ]
+    board['hazards'] = [ {'x': x, 'y': y} for x, y in frame['hazards'] ]
+    board['snakes'] = [ snake_dict(entry) for entry in frame['snakes'].values() ]
+    you = frame['you'] if frame['you'] is not None else frame['snakes'][frame['you_id']]
+    state = {'turn': frame['turn'], 'board': board, 'you': snake_dict(you)}
+    if frame['game'] is not None:
+        state['game'] = frame['game']
+    return state
+
+
+def body_delta(old: list, new: list):
+    " (new heads, kept, stacked) with new == heads + old[:kept] + [last segment] * stacked "
+    for n_heads in (1, 0, 2):
+        if n_heads > len(new):
+            continue
+        rest = new[n_heads:]
+        kept = 0
+        while kept < len(rest) and kept < len(old) and rest[kept] == old[kept]:
+            kept += 1
+        body = new[:n_heads] + old[:kept]
+        if body and all(pos == body[-1] for pos in rest[kept:]):
+            return new[:n_heads], kept, len(rest) - kept
+    # no luck: the whole body as new heads
+    return new, 0, 0
+
+
+def apply_list_delta(old: list, delta):
+    " old, with delta (from list_delta()) applied "
+    if isinstance(delta, list):
+        return [ tuple(pos) for pos in delta ]
+    removed = Counter(tuple(pos) for pos in delta.get('-', []))
+    result = []
+    for pos in old:
+        if removed[pos] > 0:
+            removed[pos] -= 1
+        else:
+            result.append(pos)
+    result.extend(tuple(pos) for pos in delta.get('+', []))
+    return result
+
+
+def list_delta(old: list, new: list):
+    " what turns old into new: positions removed and added, or all of new if that's not enough (None if equal) "
+    if old == new:
+        return None
+    new_counts = Counter(new)
+    old_counts = Counter(old)
+    removed = list((old_counts - new_counts).elements())
+    added = new_counts - old_counts
+    appended = []
+    for pos in new:
+        if added[pos] > 0:
+            added[pos] -= 1
+            appended.append(pos)
+    delta = {}
+    if removed:
+        delta['-'] = removed
+    if appended:
+        delta['+'] = appended
+    if apply_list_delta(old, delta) != new:
+        return list(new)
+    return delta
+
+
+def frame_delta(old: dict, new: dict):
+    " the delta record from frame old to frame new (the next turn), None if it takes a keyframe "
+    if new['turn'] != old['turn'] + 1 or new['game'] != old['game'] or new['board'] != old['board'] or \
+       new['you_id'] != old['you_id']:
+        return None
+    if [ snake_id for snake_id in old['snakes'] if snake_id in new['snakes'] ] != list(new['snakes']):
+        # a new snake, or the order changed
+        return None
+
+    delta = {'turn': new['turn']}
+    snakes = {}
+    for snake_id, (fields, health, body) in new['snakes'].items():
+        old_fields, old_health, old_body = old['snakes'][snake_id]
+        if health == old_health and body == old_body and fields == old_fields:
+            continue
+        if any(key not in fields for key in old_fields):
+            return None
+        heads, kept, stacked = body_delta(old_body, body)
+        change = [health, heads, kept, stacked]
+        changed = { key: value for key, value in fields.items() if old_fields.get(key) != value or key not in old_fields }
+        if changed:
+            change.append(changed)
+        snakes[snake_id] = change
+    if snakes:
+        delta['snakes'] = snakes
+
+    dead = [ snake_id for snake_id in old['snakes'] if snake_id not in new['snakes'] ]
+    if dead:
+        delta['dead'] = dead
+    for name in ('food', 'hazards'):
+        change = list_delta(old[name], new[name])
+        if change is not None:
+            delta[name] = change
+    if new['you'] is not None:
+        delta['you'] = snake_dict(new['you'])
+    return delta
+
+
+def apply_delta(frame: dict, delta: dict):
+    " the frame of the turn after frame, from its delta (frame isn't changed) "
+    changes = delta.get('snakes', {})
+    dead = set(delta.get('dead', ()))
+    snakes = {}
+    for snake_id, entry in frame['snakes'].items():
+        if snake_id in dead:
+            continue
+        change = changes.get(snake_id)
+        if change is None:
+            snakes[snake_id] = entry
+            continue
+        fields, _, body = entry
+        health, heads, kept, stacked = change[:4]
+        body = [ tuple(pos) for pos in heads ] + body[:kept]
+        body.extend([body[-1]] * stacked)
+        if len(change) > 4:
+            fields = {**fields, **change[4]}
+        snakes[snake_id] = [fields, health, body]
+
+    result = dict(frame)
+    result['turn'] = delta['turn']
+    result['snakes'] = snakes
+    for name in ('food', 'hazards'):
+        if name in delta:
+            result[name] = apply_list_delta(frame[name], delta[name])
+    you = delta.get('you')
+    result['you'] = snake_entry(you) if you is not None else None
+    return result
+
+
+def game_id(state: dict):
+    return (state.get('game') or {}).get('id')
+
+
+def dumps(record: dict):
+    return json.dumps(record, separators=(',', ':'))
+
+
+class TurnLogWriter():
+    """
+    Appends game states to a turn log at path (see the module docstring),
+    a keyframe every keyframe_every turns and deltas in between. Counts the
+    records, keyframes and bytes written.
+    """
+
+    def __init__(self, path: str, keyframe_every=25):
+        if keyframe_every < 1:
+            raise Exception(f"TurnLogWriter: keyframe_every must be at least 1, not {keyframe_every}")
+        self.path = path
+        self.keyframe_every = keyframe_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        opener = gzip.open if path.endswith('.gz') else open
+        self.file = opener(path, 'at')
+        self.previous = None
+        self.previous_id = None
+        self.since_keyframe = 0
+        self.game_number = 0
+        self.records = 0
+        self.keyframes = 0
+        self.bytes = 0
+
+    @property
+    def stats(self):
+        return { 'records': self.records, 'keyframes': self.keyframes, 'bytes': self.bytes }
+
+    def record(self, state: Union[dict, Game]):
+        " add a turn: a game state dict, or a Game "
+        if isinstance(state, Game):
+            state = state.as_dict()
+        frame = to_frame(state)
+        if self.previous is None or game_id(state) != self.previous_id or state['turn'] <= self.previous['turn']:
+            self.game_number += 1
+            self.previous = None
+        self.previous_id = game_id(state)
+
+        delta = None
+        if self.previous is not None and self.since_keyframe < self.keyframe_every:
+            delta = frame_delta(self.previous, frame)
+        if delta is None:
+            line = dumps({'key': [game_id(state), state['turn'], self.game_number], 'state': state})
+            self.keyframes += 1
+            self.since_keyframe = 1
+        else:
+            line = dumps(delta)
+            self.since_keyframe += 1
+
+        self.file.write(line + '\n')
+        self.file.flush()
+        self.previous = frame
+        self.records += 1
+        self.bytes += len(line) + 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TurnLogReader():
+    """
+    Reads a turn log (see the module docstring): state() and game() of any
+    turn, by replaying the deltas from the keyframe before it, or states()
+    to go through it all. Opening the log indexes where each turn's
+    keyframe is; refresh() indexes what's been written since.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        opener = gzip.open if path.endswith('.gz') else open
+        self.file = opener(path, 'rb')
+        # game name -> {turn: offset of its keyframe}, games in the order they start
+        self.index = {}
+        # (game id, game number) of the last game indexed, and how many games had each id
+        self.last_game = None
+        self.id_counts = Counter()
+        self.scanned = 0
+        self.refresh()
+
+    def refresh(self):
+        " index the records written since the log was last read "
+        self.file.seek(self.scanned)
+        offset = self.scanned
+        turns = None
+        keyframe = None
+        if self.index:
+            turns = self.index[next(reversed(self.index))]
+            keyframe = turns[max(turns)] if turns else None
+        decoder = json.JSONDecoder()
+        try:
+            for line in self.file:
+                if not line.endswith(b'\n'):
+                    # still being written
+                    break
+                if line.startswith(b'{"key":'):
+                    key, _ = decoder.raw_decode(line.decode(), len('{"key":'))
+                    game, turn = key[:2]
+                    number = key[2] if len(key) > 2 else None
+                    if turns is None or (game, number) != self.last_game:
+                        self.last_game = (game, number)
+                        self.id_counts[game] += 1
+                        name = game if self.id_counts[game] == 1 else f"{game}#{self.id_counts[game]}"
+                        turns = self.index.setdefault(name, {})
+                    keyframe = offset
+                    turns[turn] = keyframe
+                elif line.startswith(b'{"turn":') and turns is not None:
+                    turn, _ = decoder.raw_decode(line.decode(), len('{"turn":'))
+                    turns[turn] = keyframe
+                elif line.strip():
+                    raise Exception(f"TurnLogReader: {self.path} isn't a turn log (at byte {offset})")
+                offset += len(line)
+        except EOFError:
+            # a gzipped log still being written
+            pass
+        self.scanned = offset
+
+    def games(self):
+        " the games in the log, in order: their ids, id#2, id#3, ... for later games with the same id "
+        return list(self.index)
+
+    def turns(self, game: Optional[str] = None):
+        " the turns recorded for game (default the last one in the log) "
+        return sorted(self.game_turns(game))
+
+    def game_turns(self, game):
+        if not self.index:
+            raise Exception(f"TurnLogReader: {self.path} has no turns")
+        if game is None:
+            game = next(reversed(self.index))
+        if game not in self.index:
+            raise Exception(f"TurnLogReader: no game {game} in {self.path}")
+        return self.index[game]
+
+    def frames(self, offset: int):
+        " the frames from the keyframe at offset on, until the next keyframe "
+        self.file.seek(offset)
+        frame = None
+        for line in self.file:
+            if not line.endswith(b'\n'):
+                break
+            record = json.loads(line)
+            if 'key' in record:
+                if frame is not None:
+                    return
+                frame = to_frame(record['state'])
+            else:
+                frame = apply_delta(frame, record)
+            yield frame
+
+    def state(self, turn: int, game: Optional[str] = None):
+        " the game state dict of turn in game (default the last game in the log) "
+        keyframe = self.game_turns(game).get(turn)
+        if keyframe is None:
+            raise Exception(f"TurnLogReader: turn {turn} isn't in {self.path}")
+        for frame in self.frames(keyframe):
+            if frame['turn'] == turn:
+                return to_state(frame)
+        raise Exception(f"TurnLogReader: turn {turn} isn't in {self.path}")
+
+    def game(self, turn: int, game: Optional[str] = None, lazy_df=True):
+        " the Game of turn in game (see state()) "
+        return Game(self.state(turn, game), lazy_df)
+
+    def states(self):
+        " all the game state dicts in the log, in order "
+        self.file.seek(0)
+        frame = None
+        for line in self.file:
+            if not line.endswith(b'\n'):
+                break
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            frame = to_frame(record['state']) if 'key' in record else apply_delta(frame, record)
+            yield to_state(frame)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
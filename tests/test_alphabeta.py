@@ -0,0 +1,50 @@
+import pytest
+
+import game_state_deadend2 as gs2
+import game_state_deadend3 as gs3
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils.alphabeta import AlphaBeta
+from battlesnake_utils import evaluation
+
+def test_alphabeta_paranoid():
+    g = bs.Game(gs3.game_state())
+    ab = AlphaBeta()
+    assert ab.search(g, time_budget=None, max_depth=3) == 'down'
+    assert ab.stats['depth'] == 3
+    assert ab.stats['nodes'] > 0
+    assert len(ab.history) > 0
+
+    # searching doesn't change the game
+    assert g.turn == 104 and len(g.board.snakes) == 2
+
+def test_alphabeta_maxn():
+    g = bs.Game(gs3.game_state())
+    ab = AlphaBeta(mode='maxn')
+    assert ab.search(g, time_budget=None, max_depth=2) == 'down'
+    # no cutoffs in max^n, so nothing is recorded as one
+    assert ab.history == {} and not ab.killers
+
+    with pytest.raises(Exception):
+        AlphaBeta(mode='minimax')
+
+def test_alphabeta_time_budget():
+    g = bs.Game(gs2.game_state())
+    ab = AlphaBeta(evaluate=evaluation.weighted(territory_weight=0))
+    direction = ab.search(g, time_budget=0.05, max_depth=50)
+    assert direction in bs.Pos.all_directions
+    assert 1 <= ab.stats['depth'] < 50
+    assert ab.stats['elapsed'] < 0.5
+
+def test_evaluation():
+    g = bs.Game(gs2.game_state())
+    me, other = g.you.id, [ s.id for s in g.board.snakes if s.id != g.you.id ][0]
+
+    assert evaluation.health(g, me) == g.you.health / 100
+    assert evaluation.length(g, me) == -5
+    assert evaluation.length(g, other) == 5
+    assert 0 < evaluation.area(g, me) <= 1
+    assert 0 < evaluation.territory(g, me) < 1
+    assert evaluation.territory(g, me) + evaluation.territory(g, other) <= 1
+
+    evaluate = evaluation.weighted()
+    assert evaluate(g, 'nobody') == evaluation.lost_score
@@ -1,4 +1,7 @@
+import copy
+import pickle
 import pytest
+import numpy as np
 import pandas as pd
 
 import arcade_board
@@ -92,6 +95,80 @@ def test_board_methods():
     assert b.is_free({'x': 2, 'y': 2})
     assert not b.is_free({'x': 1, 'y': 1})
 
+def test_are_free():
+    b = bs.Board(arcade_board.board_data())
+    xs = [ x for x in range(-1, b.width + 1) for y in range(-1, b.height + 1) ]
+    ys = [ y for x in range(-1, b.width + 1) for y in range(-1, b.height + 1) ]
+    def expected(x, y, tails):
+        " the rule written out: off the board isn't free, food is, tails are unless they obstruct "
+        if not (0 <= x < b.width and 0 <= y < b.height):
+            return False
+        cell = b.df.at[y, x]
+        return cell in (' ', 'f') or (not tails and cell == bs.Snake.tail_char)
+    for tails in (False, True):
+        free = b.are_free(xs, ys, tails_are_obstructions=tails)
+        assert list(free) == [ expected(x, y, tails) for x, y in zip(xs, ys) ]
+    # the board has the cells that make a difference
+    cells = set(b.df.to_numpy().ravel())
+    assert {'f', bs.Snake.tail_char, '.'} <= cells
+    assert (b.are_free(xs, ys) != b.are_free(xs, ys, tails_are_obstructions=True)).any()
+
+    # flat indices, off the board at both ends
+    indices = np.arange(-2, b.width * b.height + 2)
+    free = b.are_free(indices)
+    assert not free[:2].any() and not free[-2:].any()
+    assert (free[2:-2] == b.are_free(xs, ys).reshape(b.width + 2, b.height + 2)[1:-1, 1:-1].T.ravel()).all()
+
+    cells = b.cells_at(indices)
+    assert cells[0] is None and list(cells[2:-2]) == list(b.df.to_numpy().ravel())
+    assert (b.cells_at(indices, codes=True)[2:-2] == b.cell_codes().ravel()).all()
+
+    # direct df edits are seen
+    b.df.at[1, 1] = 'x'
+    assert not b.are_free([1], [1])[0] and b.cells_at([b.width + 1])[0] == 'x'
+
+    assert len(bs.Board().are_free([0, 1])) == 2 and not bs.Board().are_free([0, 1]).any()
+
+def test_spatial_index():
+    rnd = np.random.default_rng(3)
+    b = bs.EmptyBoard(19, 21)
+    for x, y in rnd.integers(0, 19, size=(60, 2)):
+        b.food.append(bs.Pos(int(x), int(y)))
+    b.changed()
+
+    def brute(x, y):
+        return sorted((abs(pos.x - x) + abs(pos.y - y), pos.y, pos.x) for pos in b.food)
+
+    for x, y in [(0, 0), (9, 10), (18, 20), (-2, 5), (25, 30)]:
+        for k in (1, 3, 7):
+            assert [ (d, pos.y, pos.x) for d, pos in b.nearest_food(bs.Pos(x, y), k) ] == brute(x, y)[:k]
+        assert [ (d, pos.y, pos.x) for d, pos in b.food_within(bs.Pos(x, y), 4) ] == \
+            [ entry for entry in brute(x, y) if entry[0] <= 4 ]
+
+    # kept up to date
+    b.remove_food(b.food[0])
+    b.add_food(bs.Pos(9, 10))
+    assert b.nearest_food(bs.Pos(9, 10))[0] == (0, bs.Pos(9, 10))
+    assert [ (d, pos.y, pos.x) for d, pos in b.nearest_food(bs.Pos(3, 3), 5) ] == brute(3, 3)[:5]
+    assert str(b) == str(bs.Board(b.as_dict()))
+
+    g = bs.Game(gs2.game_state())
+    me, enemy = g.you, [ snake for snake in g.board.snakes if snake is not g.you ][0]
+    assert g.board.nearest_heads(me.head, exclude=me) == [(abs(me.head.x - enemy.head.x) + abs(me.head.y - enemy.head.y), enemy)]
+    g.advance({})
+    assert g.board.nearest_heads(enemy.head, 2)[0] == (0, enemy)
+    assert [ snake for _, snake in g.board.heads_within(me.head, 30) ] == \
+        sorted(g.board.snakes, key=lambda snake: (abs(snake.head.x - me.head.x) + abs(snake.head.y - me.head.y),
+                                                  snake.head.y, snake.head.x))
+
+    # closest food in a straight line, with lots of food, is what looking at all of it gives
+    g = bs.Game()
+    g.board = b
+    g.you = bs.Snake({'id': 'a', 'name': 'a', 'health': 100, 'body': [{'x': 6, 'y': 13}] * 3})
+    distances = [ g.you.head.distance_to(pos) for pos in b.food ]
+    assert len(b.food) > bs.Game.food_scan_limit
+    assert g.closest_food_in_line() == (b.food[distances.index(min(distances))], min(distances))
+
 def test_turns():
     assert bs.Pos.turn_direction_left('up')  == 'left'
     assert bs.Pos.turn_direction_left('left')  == 'down'
@@ -157,6 +234,40 @@ def test_pos():
     p1 = bs.Pos(0,0)
     p2 = bs.Pos(0,0)
     assert p1 == p2
+    assert hash(p1) == hash(p2)
+    assert hash(bs.Pos(1,0)) != hash(bs.Pos(0,1))
+    assert len({bs.Pos(0,0), bs.Pos(0,0), bs.Pos(-1,0)}) == 2
+
+def test_pos_table():
+    t = bs.PosTable.for_geometry(5, 4)
+    assert t is bs.PosTable.for_geometry(5, 4)
+
+    # only the most recently used geometries are kept
+    for size in range(100, 100 + 2 * bs.PosTable.max_tables):
+        bs.PosTable.for_geometry(size, 1)
+    assert len(bs.PosTable._tables) == bs.PosTable.max_tables
+    assert bs.PosTable.for_geometry(5, 4) is not t
+    t = bs.PosTable.for_geometry(5, 4)
+
+    # interned positions are shared and equal to regular ones
+    p = t.get(2, 3)
+    assert p is t.get(2, 3)
+    assert p == bs.Pos(2, 3) and hash(p) == hash(bs.Pos(2, 3))
+    assert t.moved(p, 'up') is t.get(2, 4)
+    assert t.moved(t.get(0, 0), 'left') == bs.Pos(-1, 0)
+    assert t.get(100, 100) == bs.Pos(100, 100)
+
+    # shared positions can't be modified
+    with pytest.raises(Exception):
+        p.x = 0
+
+    b = bs.EmptyBoard(5, 4)
+    assert b.positions is t
+
+    # boards (and their shared positions) survive pickling
+    b2 = pickle.loads(pickle.dumps(b))
+    assert b2.positions is t
+    assert pickle.loads(pickle.dumps(p)) == p
 
 def test_snake():
     s = bs.Snake()
@@ -197,6 +308,126 @@ def test_snake():
     assert s.pos_ahead_to_right() == bs.Pos(15, 18)
     assert s.pos_ahead_to_left() == bs.Pos(13, 18)
 
+def test_snake_move():
+    g = bs.Game()
+    b = g.board
+    s = g.you
+
+    # starting stacked on one cell
+    assert b.occupancy[10,10] == 3
+    assert b.df.at[10,10] == 'T'
+
+    b.move_snake(s, 'up')
+    assert s.head == bs.Pos(10,11) and s.tail == bs.Pos(10,10)
+    assert s.length == 3
+    assert b.occupancy[10,10] == 2 and b.occupancy[11,10] == 1
+    assert b.df.at[11,10] == 'H'
+
+    b.move_snake(s, 'up')
+    b.move_snake(s, 'right')
+    assert s.tail == bs.Pos(10,11)
+    assert b.occupancy[10,10] == 0
+    assert b.is_free(bs.Pos(10,10))
+
+    # eating stacks the tail
+    b.move_snake(s, 'right', grow=True)
+    assert s.length == 4
+    assert s.body[-1] == s.body[-2]
+    assert b.occupancy[s.tail.y, s.tail.x] == 2
+
+    # incremental updates agree with a full rebuild
+    df = b.df.copy()
+    occupancy = b.occupancy.copy()
+    b.update_df()
+    assert df.equals(b.df)
+    assert (occupancy == b.occupancy).all()
+
+def test_move_masks():
+    b = bs.EmptyBoard(5)
+    s1 = bs.Snake({'id': 'a', 'name': 'a', 'health': 100, 'length': 3,
+                   'body': [{'x': 1, 'y': 1}, {'x': 1, 'y': 0}, {'x': 0, 'y': 0}], 'head': {'x': 1, 'y': 1}})
+    s2 = bs.Snake({'id': 'b', 'name': 'b', 'health': 100, 'length': 4,
+                   'body': [{'x': 3, 'y': 1}, {'x': 3, 'y': 0}, {'x': 4, 'y': 0}, {'x': 4, 'y': 1}], 'head': {'x': 3, 'y': 1}})
+    b.snakes = [s1, s2]
+    b.update_df()
+
+    masks, danger = b.move_masks()
+    assert bs.Pos.directions_in_mask(masks[0]) == ['left', 'up', 'right']
+    # the tail of the longer snake moves out of its way
+    assert bs.Pos.directions_in_mask(masks[1]) == ['left', 'up', 'right']
+
+    # only the shorter snake is in danger, on the cells next to the longer head
+    assert danger.shape == (2, 5, 5)
+    assert not danger[1].any()
+    assert danger[0].sum() == 3
+    assert danger[0][1,2] and danger[0][2,3] and danger[0][1,4]
+
+    # with food next to its head, the tail may stay put
+    b.food.append(bs.Pos(3,2))
+    b.update_df()
+    masks, danger = b.move_masks()
+    assert bs.Pos.directions_in_mask(masks[1]) == ['left', 'up']
+    assert not danger[0][1,4]
+
+def two_snake_game():
+    " small game with two snakes facing each other "
+    g = bs.Game()
+    g.board = bs.EmptyBoard(7)
+    g.board.snakes = [
+        bs.Snake({'id': 'a', 'name': 'a', 'health': 50, 'length': 3,
+                  'body': [{'x': 1, 'y': 3}, {'x': 0, 'y': 3}, {'x': 0, 'y': 2}], 'head': {'x': 1, 'y': 3}}),
+        bs.Snake({'id': 'b', 'name': 'b', 'health': 50, 'length': 4,
+                  'body': [{'x': 5, 'y': 3}, {'x': 6, 'y': 3}, {'x': 6, 'y': 2}, {'x': 6, 'y': 1}], 'head': {'x': 5, 'y': 3}}),
+    ]
+    g.you = g.board.snakes[0]
+    g.board.update_df()
+    return g
+
+def test_game_advance():
+    g = two_snake_game()
+    g.board.food.append(bs.Pos(2,3))
+    g.board.update_df()
+
+    # a eats, b keeps going the way it faces
+    assert g.advance({'a': 'right'}) == []
+    assert g.turn == 1
+    a, b = g.board.snakes
+    assert a.head == bs.Pos(2,3) and a.length == 4 and a.health == 100
+    assert b.head == bs.Pos(4,3) and b.length == 4 and b.health == 49
+    assert len(g.board.food) == 0
+
+    # the incremental board agrees with a full rebuild
+    df = g.board.df.copy()
+    g.board.update_df()
+    assert df.equals(g.board.df)
+
+    # copies are independent
+    c = g.copy()
+    assert c.you.id == 'a' and c.you is c.board.snakes[0]
+    c.advance({'a': 'up', 'b': 'up'})
+    assert g.turn == 1 and a.head == bs.Pos(2,3)
+
+    # simulation copies only redraw their df when it's read
+    c = g.copy(lazy_df=True)
+    c.advance({'a': 'up', 'b': 'up'})
+    assert c.board.df_stale
+    assert c.board.df.at[4,2] == 'H'
+    assert not c.board.df_stale
+
+    # equal length head-to-head: both go
+    assert sorted(g.advance({'a': 'right', 'b': 'left'})) == ['a', 'b']
+    assert len(g.board.snakes) == 0
+
+    # longer snake wins a head-to-head
+    g = two_snake_game()
+    g.advance({'a': 'right', 'b': 'left'})
+    assert g.advance({'a': 'right', 'b': 'left'}) == ['a']
+    assert [ snake.id for snake in g.board.snakes ] == ['b']
+
+    # into a wall, into a body
+    g = two_snake_game()
+    assert g.advance({'a': 'left', 'b': 'right'}) == ['a', 'b']
+
 def test_game():
     g = bs.Game();
     assert isinstance(g, bs.Game)
@@ -278,6 +509,33 @@ def test_game_clone():
     assert isinstance(clone_g, bs.Game)
     assert clone_g.you.id == new_snake_id
 
+    # copies don't share the ruleset
+    copy_g = g.copy()
+    copy_g.ruleset['settings']['royale']['shrinkEveryNTurns'] = 5
+    copy_g.ruleset['name'] = 'royale'
+    assert g.ruleset == game_state['game']['ruleset']
+
+def test_game_snapshot():
+    g = bs.Game(gs2.game_state())
+    snapshot = g.snapshot()
+    assert hash(snapshot) == hash(g.copy().snapshot()) and snapshot == g.copy().snapshot()
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
+    assert copy.deepcopy(snapshot) is snapshot
+    with pytest.raises(Exception):
+        snapshot.turn = 3
+    assert snapshot.you == snapshot.snake(g.you.id)
+
+    # back to an independent game, that changes without changing the snapshot
+    back = snapshot.to_game()
+    assert back.as_dict() == g.as_dict()
+    assert str(back.board) == str(g.board)
+    assert back.you is back.snake_by_id(g.you.id)
+    back.advance({})
+    back.ruleset['name'] = 'royale'
+    assert back.snapshot() != snapshot
+    assert snapshot.to_game().as_dict() == g.as_dict()
+    assert len({ snapshot, back.snapshot(), g.snapshot() }) == 2
+
 
 #    print("=========")
 #    print(g)
@@ -297,6 +555,226 @@ def test_deadend_situation3():
     print(g)
     assert g.towards_dead_end('down') == False
 
+def test_deadend_stacked_tail():
+    " towards_dead_end() goes by Board.is_free(): a stacked tail counts as free, as it always has "
+    def body(cells):
+        return [ {'x': x, 'y': y} for x, y in cells ]
+    g = bs.Game()
+    g.board = bs.EmptyBoard(7)
+    g.board.snakes.append(bs.Snake({'id': 'a', 'name': 'a', 'health': 90, 'body': body([(3, 3), (2, 3), (2, 4), (1, 4)])}))
+    g.board.snakes.append(bs.Snake({'id': 'b', 'name': 'b', 'health': 90,
+                                    'body': body([(2, 5), (3, 5), (4, 5), (4, 4), (4, 4)])}))
+    g.you = g.board.snakes[0]
+    g.board.update_df()
+    assert g.board.is_free(bs.Pos(4, 4)) and not g.analysis.free[4, 4]
+    assert g.towards_dead_end('up') == False
+    assert g.towards_dead_end('right') == False
+
+
+def test_pocket_sizes():
+    g = bs.Game(gs2.game_state())
+    pockets = g.pocket_sizes()
+    assert pockets['up'] == {'region': pockets['up']['region'], 'size': 1, 'tail': False, 'food': False, 'trapped': True}
+    assert pockets['right']['size'] == 0 and pockets['right']['region'] == -1 and pockets['right']['trapped']
+    # left and down go into the same big region, with our tail and the food
+    assert pockets['left'] == pockets['down']
+    assert pockets['left']['size'] == 89 and pockets['left']['tail'] and pockets['left']['food']
+    assert not pockets['left']['trapped']
+
+    # the tail right below our head isn't a dead end
+    g = bs.Game(gs3.game_state())
+    pockets = g.pocket_sizes()
+    assert pockets['down']['tail'] and not pockets['down']['trapped']
+    assert pockets['up']['size'] == 2 and pockets['up']['trapped']
+    assert pockets['left']['size'] == 0 and pockets['right']['size'] == 0
+
+    # stacked tails don't move next turn: at the start of a game, and after eating
+    g = bs.Game()
+    g.board = bs.EmptyBoard(5)
+    g.board.snakes.append(bs.Snake({'id': 'a', 'name': 'a', 'health': 100, 'body': [{'x': 2, 'y': 2}] * 3}))
+    g.board.snakes.append(bs.Snake({'id': 'b', 'name': 'b', 'health': 100,
+                                    'body': [{'x': 0, 'y': 0}, {'x': 0, 'y': 1}, {'x': 0, 'y': 1}]}))
+    g.you = g.board.snakes[0]
+    g.board.update_df()
+    assert not g.analysis.free[2, 2] and not g.analysis.free[1, 0]
+    pockets = g.pocket_sizes()
+    assert all(pocket['size'] == 22 and pocket['tail'] for pocket in pockets.values())
+
+
+def test_timed_reachability():
+    g = bs.Game(gs3.game_state())
+
+    # our tail is right below our head, and moves away in time
+    vacate = g.board.vacate_turns()
+    assert vacate[7,10] == 1
+    assert vacate[8,10] == g.you.length
+    assert vacate[0,0] == 0
+
+    assert g.reachable_area('down') == 121
+    assert g.reachable_area('up') == 2
+    assert g.reachable_area('right') == 0
+    assert g.reachable_area('left') == 0
+
+    arrival = g.board.timed_reachability(g.you.head)
+    assert arrival[8,10] == 0
+    assert arrival[7,10] == 1
+    assert arrival[0,0] > 0
+
+    # a wall of body splitting the board, that opens up later than we first get next to it
+    b = bs.EmptyBoard(5)
+    cells = [(2,0), (2,1), (2,2), (2,3), (2,4), (3,4), (4,4), (4,3), (3,3), (3,2), (4,2), (4,1)]
+    b.snakes.append(bs.Snake({'id': 'b', 'name': 'b', 'health': 90, 'body': [ {'x': x, 'y': y} for x, y in cells ]}))
+    b.update_df()
+    arrival = b.timed_reachability(bs.Pos(0, 2))
+    assert arrival[4,1] == 3 and b.vacate_turns()[4,2] == 8
+    # going round the left side until (2,4) is vacated, then on into the right side
+    assert arrival[4,2] == 8 and arrival[4,3] == 9 and arrival[0,4] > 9
+    assert b.reachable_area(bs.Pos(0, 2)) == 24
+
+    # no going round in a corridor: only what's there when we first get to it
+    b.hazards.extend([ bs.Pos(0, y) for y in range(5) ])
+    b.update_df()
+    arrival = b.timed_reachability(bs.Pos(1, 2))
+    assert (arrival[:, 2:] < 0).all() and (arrival[:, 1] >= 0).all()
+
+def test_find_path():
+    b = bs.EmptyBoard(5)
+    assert len(b.find_path(bs.Pos(0,0), bs.Pos(4,4))) == 8
+    assert b.find_path(bs.Pos(0,0), bs.Pos(0,0)) == []
+    assert b.find_path(bs.Pos(0,0), bs.Pos(5,5)) is None
+
+    # hazard wall with a gap at the top: go around it unless hazards are cheap
+    for y in range(4):
+        b.hazards.append(bs.Pos(2,y))
+    b.update_df()
+    path = b.find_path(bs.Pos(0,0), bs.Pos(4,0))
+    assert len(path) == 12
+    assert bs.Pos(2,4) in path
+    assert b.path_cost(path) == 12
+    path = b.find_path(bs.Pos(0,0), bs.Pos(4,0), avoid_hazards=False)
+    assert len(path) == 4
+    path = b.find_path(bs.Pos(0,0), bs.Pos(4,0), hazard_cost=2)
+    assert len(path) == 4 and b.path_cost(path, hazard_cost=2) == 6
+
+def test_path_to_food():
+    g = bs.Game()
+    assert g.hazard_damage == 14
+    assert g.direction_and_path_to_closest_food() == (None, None)
+
+    # a hazard wall between us and the food
+    g.board.food.append(bs.Pos(10,14))
+    for x in range(8, 13):
+        g.board.hazards.append(bs.Pos(x,12))
+    g.board.update_df()
+
+    cache = bs.PathCache()
+    direction, path = g.direction_and_path_to_closest_food(cache)
+    assert path[-1] == bs.Pos(10,14)
+    assert len(path) == 10
+    assert g.you.head.moved_to(direction) == path[0]
+    assert not any(pos in g.board.hazards for pos in path)
+    assert cache.misses == 1
+
+    # follow the path: the next turn reuses it
+    g.board.move_snake(g.you, direction)
+    direction2, path2 = g.direction_and_path_to_closest_food(cache)
+    assert path2 == path[1:]
+    assert cache.hits == 1
+
+    # checking it only looks at the path's cells, a lazy board doesn't build its df
+    lazy_cache = bs.PathCache()
+    lazy_cache.remember(g.board, path2[-1], path2)
+    lazy = g.copy(lazy_df=True)
+    lazy.board.move_snake(lazy.you, g.you.head.direction_to(path2[0])[0])
+    assert lazy.board.df_stale
+    assert lazy_cache.reuse(lazy.board, path2[0]) == path2[1:] and lazy.board.df_stale
+
+    # something gets in the way: search again
+    g.board.hazards.append(path2[1])
+    g.board.update_df()
+    direction3, path3 = g.direction_and_path_to_closest_food(cache)
+    assert path2[1] not in path3
+    assert cache.misses == 2
+
+    # food turns up right next to us: it's cheaper than the rest of the path
+    hits = cache.hits
+    g.board.move_snake(g.you, direction3)
+    near = [ g.you.head.moved_to(d) for d in bs.Pos.all_directions
+             if g.board.is_free(g.you.head.moved_to(d)) and g.you.head.moved_to(d) != path3[1] ][0]
+    g.board.add_food(near)
+    direction4, path4 = g.direction_and_path_to_closest_food(cache)
+    assert path4 == [near] and cache.hits == hits and cache.misses == 3
+
+def test_analysis():
+    g = two_snake_game()
+    g.board.food = [bs.Pos(3, 3)]
+    g.board.update_df()
+    a = g.analysis
+    assert g.analysis is a
+
+    # computed once, then kept
+    assert a.free[3, 3] and not a.free[3, 1] and a.free[2, 0]
+    assert a.free is a.free
+    labels, sizes = a.regions
+    assert sizes == [49 - 7 + 2]
+    assert a.distances[3, 1] == 0 and a.distances[3, 3] == 2
+    assert a.food_steps == [2] and a.food_distances == [2.0]
+    assert a.safe_directions == ['up', 'right', 'down']
+    assert a.danger[3, 4] and not a.danger[3, 2]
+
+    # a move makes a new one
+    g.advance({'a': 'right', 'b': 'up'})
+    assert g.analysis is not a
+    assert g.analysis.distances[3, 2] == 0
+    g.board.hazards.append(bs.Pos(0, 0))
+    g.board.update_df()
+    assert not g.analysis.free[0, 0]
+
+def test_hazard_timeline():
+    g = two_snake_game()
+    g.ruleset['name'] = 'royale'
+    g.ruleset['settings']['royale']['shrinkEveryNTurns'] = 25
+    g.turn = 30
+    # one shrink from the left so far
+    g.board.hazards = [ bs.Pos(0, y) for y in range(7) ]
+    g.board.update_df()
+
+    t = g.hazards_ahead()
+    assert g.shrink_every == 25 and t.damage == 14
+    assert t.onset[3, 0] == 30
+    assert t.onset[3, 1] == 50 and t.onset[0, 3] == 50 and t.onset[3, 6] == 50
+    assert t.onset[3, 3] == 100
+    assert t.hazards_at(50).sum() == 3 * 7 + 2 * 4
+    assert t.damage_at(bs.Pos(1, 3), 49) == 0 and t.damage_at(bs.Pos(1, 3), 50) == 14
+    assert t.damage_at(bs.Pos(-1, 3), 50) == 0
+    damage = t.cumulative_damage(25)
+    assert damage[3, 0] == 25 * 14 and damage[3, 1] == 5 * 14 and damage[3, 3] == 0
+    assert g.analysis.hazard_timeline.onset[3, 1] == 50
+
+    # no shrinking outside royale
+    g.ruleset['name'] = 'standard'
+    t2 = g.hazards_ahead()
+    assert t2.onset[3, 1] == bs.Board.never and t2.onset[3, 0] == 30
+    g.ruleset['name'] = 'royale'
+
+    # advance prices hazards from the timeline
+    g.timeline = t
+    g.turn = 50
+    health = g.you.health
+    g.advance({'a': 'down', 'b': 'up'})
+    assert g.you.head == bs.Pos(1, 2) and g.you.health == health - 15
+
+    # paths are priced by when we'd get there
+    g.turn = 40
+    t = g.hazards_ahead()
+    path = g.board.find_path(bs.Pos(2, 2), bs.Pos(1, 5), timeline=t)
+    assert g.board.path_cost(path, timeline=t) == len(path) == 4
+    g.turn = 49
+    t = g.hazards_ahead()
+    path = g.board.find_path(bs.Pos(2, 2), bs.Pos(1, 5), timeline=t)
+    # the goal is a hazard by then (x=1 from turn 50), but only the last step needs to be
+    assert sum(1 for pos in path if pos.x == 1) == 1
+    assert g.board.path_cost(path, timeline=t) == 4 + 14
 
 def test_walk():
     game_state = gs3.game_state()
@@ -0,0 +1,51 @@
+import os
+import io
+
+import pytest
+
+from battlesnake_utils import benchmark
+
+def result(relative, spread):
+    return { 'median_us': relative * 10, 'relative': relative, 'relative_ci': [relative - spread, relative + spread] }
+
+def test_compare():
+    baseline = { 'benchmarks': { 'a': result(1.0, 0.05), 'b': result(1.0, 0.05), 'c': result(1.0, 0.5),
+                                 'd': result(1.0, 0.05) } }
+    current = { 'benchmarks': { 'a': result(1.5, 0.05), 'b': result(1.1, 0.02), 'c': result(1.5, 0.5),
+                                'd': result(0.5, 0.05), 'new': result(1.0, 0.1) } }
+    comparison = { row['name']: row for row in benchmark.compare(baseline, current, threshold=0.25) }
+    assert set(comparison) == {'a', 'b', 'c', 'd'}
+    assert comparison['a']['change'] == pytest.approx(0.5)
+    # slower, under the threshold, too noisy to tell, faster
+    assert [ comparison[name]['regressed'] for name in 'abcd' ] == [True, False, False, False]
+
+    out = io.StringIO()
+    benchmark.report(list(comparison.values()), out)
+    assert 'REGRESSED' in out.getvalue().splitlines()[1]
+
+    # the interval of a median isn't thrown by an outlier
+    median, low, high = benchmark.median_interval(list(range(1, 20)) + [1000])
+    assert median == 10.5 and low <= median <= high < 20
+
+def test_run(tmp_path):
+    results = benchmark.run(['is_free', 'closest_food'], repeats=3, min_time=0.001)
+    assert list(results['benchmarks']) == ['is_free', 'closest_food']
+    for timing in results['benchmarks'].values():
+        assert len(timing['runs_us']) == 3 and timing['ops_per_sec'] > 0
+        assert timing['ci_us'][0] <= timing['median_us'] <= timing['ci_us'][1]
+
+    path = str(tmp_path / 'baseline.json')
+    benchmark.save(results, path)
+    assert not any(row['regressed'] for row in benchmark.compare(benchmark.load(path), results))
+    with pytest.raises(Exception):
+        benchmark.run(['nothing'])
+
+@pytest.mark.skipif(not os.environ.get(benchmark.baseline_variable),
+                    reason=f"no benchmark baseline, set {benchmark.baseline_variable}")
+def test_no_regressions():
+    baseline = benchmark.load(os.environ[benchmark.baseline_variable])
+    threshold = float(os.environ.get(benchmark.threshold_variable, benchmark.default_threshold))
+    comparison = benchmark.compare(baseline, benchmark.run(list(baseline['benchmarks'])), threshold)
+    out = io.StringIO()
+    benchmark.report(comparison, out)
+    assert not any(row['regressed'] for row in comparison), out.getvalue()
@@ -0,0 +1,120 @@
+import pytest
+
+import game_state_deadend2 as gs2
+import game_state_deadend5 as gs5
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils.cache import EvalCache, cached, cache_helpers, uncache_helpers
+
+def test_cache_key():
+    cache = EvalCache(health_bucket=10)
+    g = bs.Game(gs2.game_state())
+
+    # same contents, however they were made
+    key = cache.key(g.board)
+    assert len(key) == 16
+    assert cache.key(g.copy(lazy_df=True).board) == key
+    assert cache.key(bs.Game(g.as_dict()).board) == key
+
+    # health within the same bucket hashes the same, other buckets don't
+    other = g.copy()
+    other.you.health = g.you.health // 10 * 10
+    assert cache.key(other.board) == key
+    other.you.health = g.you.health // 10 * 10 - 1
+    assert cache.key(other.board) != key
+
+    # moves change the board, arguments and positions count too
+    moved = g.copy()
+    moved.advance({})
+    assert cache.key(moved.board) != key
+    assert cache.key(g, 'up') != cache.key(g, 'down')
+    assert cache.key(g.board, bs.Pos(1, 2)) == cache.key(g.board, {'x': 1, 'y': 2})
+    assert cache.key(g.board, bs.Pos(1, 2)) != cache.key(g.board, bs.Pos(2, 1))
+
+    with pytest.raises(Exception):
+        cache.key("not a game")
+
+def test_cache_eviction():
+    cache = EvalCache(max_entries=3)
+    for i in range(5):
+        cache.put(bytes([i]), i)
+    assert len(cache) == 3 and cache.evictions == 2
+    assert bytes([0]) not in cache
+
+    # a get makes an entry the most recently used
+    assert cache.get(bytes([2])) == 2
+    cache.put(bytes([5]), 5)
+    assert bytes([2]) in cache and bytes([3]) not in cache
+    assert cache.get(bytes([3]), 'none') == 'none'
+    assert cache.hits == 1 and cache.misses == 1
+
+    # byte budget
+    cache = EvalCache(max_bytes=1000)
+    for i in range(10):
+        cache.put(bytes([i]), list(range(20)))
+    assert cache.bytes <= 1000
+    assert 0 < len(cache) < 10 and cache.evictions == 10 - len(cache)
+    cache.clear()
+    assert len(cache) == 0 and cache.bytes == 0
+
+def test_cached_decorator():
+    cache = EvalCache()
+    calls = []
+
+    @cached(cache=cache)
+    def evaluate(game, snake_id):
+        calls.append(snake_id)
+        return game.snake_by_id(snake_id).length
+
+    g = bs.Game(gs2.game_state())
+    assert evaluate(g, g.you.id) == g.you.length
+    assert evaluate(g.copy(), g.you.id) == g.you.length
+    assert len(calls) == 1
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+def test_cache_helpers():
+    g = bs.Game(gs5.game_state())
+    expected = bs.Walk(g.board, bs.Pos(7,8), "up").walk_perimeter()
+    between = g.board.unobstructed_between(bs.Pos(0,0), bs.Pos(3,3))
+
+    cache = cache_helpers(EvalCache())
+    try:
+        assert bs.Walk(g.board, bs.Pos(7,8), "up").walk_perimeter() == expected
+        assert bs.Walk(g.board, bs.Pos(7,8), "up").walk_perimeter() == expected
+        assert g.board.unobstructed_between(bs.Pos(0,0), bs.Pos(3,3)) == between
+        assert cache.hits == 1 and cache.misses == 2
+    finally:
+        uncache_helpers()
+    assert not hasattr(bs.Walk.walk_perimeter, 'uncached')
+
+def test_cache_key_body_order():
+    " same cells, head and tail, but the middle of the body in another order "
+    def board(body):
+        b = bs.EmptyBoard(5)
+        b.snakes.append(bs.Snake({'id': 'a', 'name': 'a', 'health': 90,
+                                  'body': [ {'x': x, 'y': y} for x, y in body ]}))
+        b.update_df()
+        return b
+
+    one = board([(0,0),(1,0),(2,0),(2,1),(1,1),(0,1),(0,2),(1,2),(2,2)])
+    other = board([(0,0),(0,1),(0,2),(1,2),(1,1),(1,0),(2,0),(2,1),(2,2)])
+    assert (one.cell_codes() == other.cell_codes()).all()
+    assert one.vacate_turns()[1,0] != other.vacate_turns()[1,0]
+
+    cache = EvalCache()
+    assert cache.key(one) != cache.key(other)
+
+    # a game's ruleset counts too, its turn only when hazards to come depend on it
+    g = bs.Game(gs2.game_state())
+    later = g.copy()
+    later.turn += 1
+    assert cache.key(later) == cache.key(g)
+    later.turn = g.turn
+    later.ruleset = dict(g.ruleset, name='royale', settings={'royale': {'shrinkEveryNTurns': 25}})
+    assert cache.key(later) != cache.key(g)
+    royale = later.copy()
+    royale.turn += 1
+    assert cache.key(royale) != cache.key(later)
+    later = g.copy()
+    later.timeline = later.hazards_ahead()
+    later.turn += 1
+    assert cache.key(later) != cache.key(g)
@@ -0,0 +1,82 @@
+import json
+import random
+
+import numpy as np
+
+import game_state_deadend3 as gs3
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils import dataset
+
+def transformed(pos, k, size):
+    " where pos goes under symmetry k of a size x size board "
+    x, y = pos.x, pos.y
+    if k >= 4:
+        x = size - 1 - x
+    for i in range(k % 4):
+        x, y = y, size - 1 - x
+    return bs.Pos(x, y)
+
+def test_to_planes():
+    g = bs.Game(gs3.game_state())
+    planes = g.to_planes()
+    assert planes.shape == (len(bs.Game.plane_names), g.board.height, g.board.width) and planes.dtype == np.uint8
+
+    df = g.board.df.to_numpy()
+    assert ((planes[0] == 1) | (planes[1] == 1) == np.isin(df, ['0', '1', 'H', 'T'])).all()
+    assert planes[2].sum() == len(g.board.snakes) and planes[4].sum() == len(g.board.food)
+    assert planes[6][g.you.head.y, g.you.head.x] == g.you.length
+    assert planes[6][g.you.tail.y, g.you.tail.x] == 1
+    assert planes[7][g.you.head.y, g.you.head.x] == g.you.health
+
+    out = np.full_like(planes, 7)
+    assert g.to_planes(out) is out and (out == planes).all()
+
+def test_dihedral():
+    g = bs.Game(gs3.game_state())
+    size = g.board.width
+    planes = g.to_planes()
+    head = g.you.head
+    for k in range(dataset.n_symmetries):
+        view = dataset.dihedral(planes, k)
+        assert np.shares_memory(view, planes)
+
+        # the same as the planes of the transformed board
+        h = g.copy()
+        for snake in h.board.snakes:
+            snake.body = type(snake.body)(transformed(pos, k, size) for pos in snake.body)
+        h.board.food = [ transformed(pos, k, size) for pos in h.board.food ]
+        h.board.changed()
+        assert (h.to_planes() == view).all()
+
+        # and moves go where the head goes
+        for m, direction in enumerate(bs.Pos.all_directions):
+            moved = transformed(head.moved_to(direction), k, size)
+            assert transformed(head, k, size).moved_to(bs.Pos.all_directions[dataset.dihedral_moves(m, k)]) == moved
+
+def test_export(tmp_path):
+    rnd = random.Random(0)
+    paths = []
+    played = []
+    for i in range(3):
+        g = bs.Game(gs3.game_state())
+        path = tmp_path / f"game{i}.jsonl"
+        with open(path, 'w') as f:
+            for turn in range(8):
+                f.write(json.dumps(g.as_dict()) + '\n')
+                moves = { snake.id: rnd.choice(g.analysis.safe_directions or bs.Pos.all_directions) if snake is g.you
+                          else bs.Pos.all_directions[0] for snake in g.board.snakes }
+                g.advance(moves)
+                if g.you not in g.board.snakes:
+                    break
+                played.append(bs.Pos.all_directions.index(moves[g.you.id]))
+            else:
+                f.write(json.dumps(g.as_dict()) + '\n')
+        paths.append(str(path))
+
+    written = dataset.export(paths, str(tmp_path / 'out'), shard_size=5, processes=2)
+    planes = np.concatenate([ np.load(p) for p in sorted(written) if 'planes-' in p ])
+    moves = np.concatenate([ np.load(p) for p in sorted(written) if 'moves-' in p ])
+    assert planes.shape[1:] == (len(bs.Game.plane_names), 11, 11)
+    assert len(planes) == len(moves) == len(played)
+    assert all(len(np.load(p)) <= 5 for p in written)
+    assert sorted(moves) == sorted(played)
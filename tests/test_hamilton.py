@@ -0,0 +1,80 @@
+import random
+
+import arcade_board
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils import hamilton
+from battlesnake_utils.hamilton import HamiltonianPlanner, build_cycle
+
+def check_cycle(cycle, width, blocked=()):
+    " every cell once, each one next to the one after it, none blocked "
+    assert len(set(cycle)) == len(cycle)
+    for i in range(len(cycle)):
+        a, b = cycle[i], cycle[(i + 1) % len(cycle)]
+        assert abs(a % width - b % width) + abs(a // width - b // width) == 1
+        assert a not in blocked
+    return len(cycle)
+
+def test_build_cycle():
+    assert check_cycle(build_cycle(10, 10), 10) == 100
+    assert check_cycle(build_cycle(11, 10), 11) == 110
+    assert check_cycle(build_cycle(10, 11), 10) == 110
+    # no Hamiltonian cycle with both sides odd, one cell is left out
+    assert check_cycle(build_cycle(11, 11), 11) == 120
+    assert build_cycle(1, 5) == []
+
+    b = bs.Board(arcade_board.board_data())
+    hazards = { pos.y * b.width + pos.x for pos in b.hazards }
+    assert check_cycle(build_cycle(b.width, b.height, hazards), b.width, hazards) > 100
+
+def test_cycle_cache(tmp_path, monkeypatch):
+    b = bs.Board(arcade_board.board_data())
+    HamiltonianPlanner.memory.clear()
+    planner = HamiltonianPlanner(cache_dir=str(tmp_path))
+    cycle, index = planner.cycle(b)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert all(index[cell] == i for i, cell in enumerate(cycle))
+    assert index[b.hazards[0].y * b.width + b.hazards[0].x] == -1
+
+    # from memory, then from disk: not built again
+    def no_build(*args):
+        raise Exception("cycle built again")
+    monkeypatch.setattr(hamilton, 'build_cycle', no_build)
+    assert planner.cycle(b)[0] is cycle
+    HamiltonianPlanner.memory.clear()
+    assert (planner.cycle(b)[0] == cycle).all()
+
+    # another hazard layout is another cycle
+    b.hazards = b.hazards[1:]
+    assert planner.cycle_key(b) != planner.cycle_key(bs.Board(arcade_board.board_data()))
+
+def test_cycle_memory_bounded(monkeypatch):
+    " only the most recently used layouts stay in memory "
+    monkeypatch.setattr(HamiltonianPlanner, 'max_memory', 2)
+    HamiltonianPlanner.memory.clear()
+    planner = HamiltonianPlanner(cache_dir=False)
+    boards = [ bs.EmptyBoard(size) for size in (4, 6, 8) ]
+    first = planner.cycle(boards[0])[0]
+    planner.cycle(boards[1])
+    assert planner.cycle(boards[0])[0] is first
+    planner.cycle(boards[2])
+    assert list(HamiltonianPlanner.memory) == [ planner.cycle_key(boards[i]) for i in (0, 2) ]
+    HamiltonianPlanner.memory.clear()
+
+def test_planner_fills_board():
+    rnd = random.Random(0)
+    g = bs.Game()
+    g.board = bs.EmptyBoard(8)
+    g.board.snakes = [bs.Snake({'id': '0', 'name': 'me', 'health': 100, 'body': [{'x': 1, 'y': 1}] * 3})]
+    g.you = g.board.snakes[0]
+    g.board.update_df()
+    planner = HamiltonianPlanner(cache_dir=False)
+
+    for turn in range(2000):
+        if not g.board.food:
+            free = [ (x, y) for x in range(8) for y in range(8) if g.board.occupancy[y, x] == 0 ]
+            if not free:
+                break
+            g.board.food = [bs.Pos(*rnd.choice(free))]
+            g.board.update_df()
+        assert g.advance({'0': planner.move(g)}) == []
+    assert g.you.length >= 64
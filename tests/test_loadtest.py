@@ -0,0 +1,77 @@
+import io
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils import loadtest
+
+class Snake(BaseHTTPRequestHandler):
+    " a snake server that moves safely, and takes too long on every 8th move request "
+    moves = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        answer = {}
+        if self.path == '/move':
+            game = bs.Game(body, lazy_df=True)
+            Snake.moves += 1
+            if Snake.moves % 8 == 0:
+                time.sleep(body['game']['timeout'] / 1000 * 2)
+            answer = {'move': (game.analysis.safe_directions or ['up'])[0]}
+        data = json.dumps(answer).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Snake)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_new_game():
+    g = loadtest.new_game(11, 11, 4, seed=1)
+    assert len(g.board.snakes) == 4 and len(g.board.food) == 5
+    d = json.loads(loadtest.payload(g, g.board.snakes[2], 'x', 150))
+    assert d['you']['id'] == 'snake-2' and d['game']['timeout'] == 150 and d['game']['id'] == 'x'
+
+    g.board.food = []
+    loadtest.spawn_food(g, random.Random(0))
+    assert len(g.board.food) >= 1
+
+def test_load_test(server):
+    test = loadtest.LoadTest(server, n_snakes=2, timeout=100, seed=1)
+    levels = test.run(concurrency_levels=(1, 2), turns=24)
+    assert [ level['concurrency'] for level in levels ] == [1, 2]
+    for level in levels:
+        assert level['requests'] == 24 * level['concurrency']
+        assert level['errors'] == 0
+        # the slow moves
+        assert level['timeouts'] >= 2
+        # timeouts count in the latencies, at least as long as the timeout
+        assert level['responses'] == level['requests']
+        assert level['max'] >= 100
+        assert sum(level['histogram'].values()) == level['responses']
+        assert level['p50'] <= level['p99'] <= level['max']
+        assert level['throughput'] > 0
+
+    out = io.StringIO()
+    loadtest.report(levels, out)
+    assert len(out.getvalue().splitlines()) == 3
+
+    # nothing listening
+    levels = loadtest.LoadTest('http://127.0.0.1:9', n_snakes=1, timeout=50).run((1,), turns=3)
+    assert levels[0]['errors'] >= 3 and levels[0]['p99'] is None
@@ -0,0 +1,106 @@
+import pytest
+
+import game_state_deadend2 as gs2
+import game_state_deadend3 as gs3
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils.mcts import MCTS, NodePool
+
+def test_node_pool():
+    pool = NodePool(10, 2)
+    root = pool.allocate()
+    a = pool.allocate(root, 1)
+    b = pool.allocate(root, 2)
+    c = pool.allocate(a, 3)
+    assert len(pool) == 4
+    assert pool.child(root, 1) == a and pool.child(root, 2) == b
+    assert pool.child(root, 3) == -1
+
+    # re-rooting on a keeps a's subtree only
+    pool.keep_only(a)
+    assert len(pool) == 2
+    assert pool.child(a, 3) == c
+    assert pool.parent[a] == -1
+
+    # full pool
+    while pool.allocate(c, 0) >= 0:
+        pass
+    assert len(pool) == 10
+    pool.clear()
+    assert len(pool) == 0
+
+def test_mcts_search():
+    g = bs.Game(gs3.game_state())
+    mcts = MCTS(seed=1)
+    direction = mcts.search(g, time_budget=None, max_iterations=100)
+
+    # only moving down (onto our tail) isn't a dead end
+    assert direction == 'down'
+    assert mcts.stats['iterations'] == 100
+    assert mcts.stats['iterations_per_second'] > 0
+    assert not mcts.stats['reused_tree']
+
+    # the original game isn't touched
+    assert g.turn == 104 and len(g.board.snakes) == 2
+
+    with pytest.raises(Exception):
+        mcts.search(g, time_budget=None, max_iterations=None)
+
+def test_mcts_reroot():
+    g = bs.Game(gs2.game_state())
+    mcts = MCTS(max_nodes=500, seed=2)
+    direction = mcts.search(g, time_budget=None, max_iterations=200)
+    masks, _ = g.board.move_masks()
+    assert direction in bs.Pos.directions_in_mask(masks[g.board.snakes.index(g.you)])
+
+    moves = { snake.id: mcts.best_direction(snake.id) for snake in g.board.snakes }
+    g.advance(moves)
+    mcts.search(g, time_budget=None, max_iterations=50)
+    assert mcts.stats['reused_tree']
+    assert mcts.stats['nodes'] <= 500
+
+    # a game that doesn't follow on starts a new tree
+    mcts.search(bs.Game(gs3.game_state()), time_budget=None, max_iterations=10)
+    assert not mcts.stats['reused_tree']
+
+def test_mcts_full_pool():
+    " with the pool full, iterations still count one visit per node they pass "
+    g = bs.Game(gs2.game_state())
+    mcts = MCTS(max_nodes=20, seed=3)
+    mcts.search(g, time_budget=None, max_iterations=300)
+    pool = mcts.pool
+    assert not pool.free
+    root_moves = pool.move_visits[mcts.root, mcts.snake_ids.index(g.you.id)].sum()
+    assert pool.visits[mcts.root] == root_moves
+    assert pool.visits[mcts.root] == 300
+
+def test_mcts_reroot_opponent_died():
+    " an opponent that died on the move played: its move is told from what happened to the others "
+    def body(cells):
+        return [ {'x': x, 'y': y} for x, y in cells ]
+    g = bs.Game()
+    g.board = bs.EmptyBoard(7)
+    g.board.snakes.append(bs.Snake({'id': 'a', 'name': 'a', 'health': 90,
+                                    'body': body([(3, 3), (2, 3), (1, 3), (1, 2), (1, 1)])}))
+    g.board.snakes.append(bs.Snake({'id': 'b', 'name': 'b', 'health': 90, 'body': body([(3, 5), (4, 5), (5, 5)])}))
+    g.you = g.board.snakes[0]
+    g.board.update_df()
+
+    mcts = MCTS(seed=4)
+    mcts.search(g, time_budget=None, max_iterations=300)
+    root = mcts.root
+    pool = mcts.pool
+    # b dies going down (head to head with a), its other legal moves don't kill it
+    code = mcts.joint_code({'a': 'up', 'b': 'down'})
+    child = pool.child(root, code)
+    assert child >= 0
+
+    g.advance({'a': 'up', 'b': 'down'})
+    assert [ snake.id for snake in g.board.snakes ] == ['a']
+    assert mcts.observed_joint_move(g) == code
+
+    # no moves of b's give what's on the board: can't be told
+    odd = g.copy()
+    odd.you.health -= 10
+    assert mcts.observed_joint_move(odd) is None
+
+    assert mcts.reroot(g) and mcts.root == child
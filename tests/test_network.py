@@ -0,0 +1,69 @@
+import numpy as np
+
+import game_state_deadend2 as gs2
+import game_state_deadend3 as gs3
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils.mcts import MCTS
+from battlesnake_utils.network import Network
+
+def reference(weights, planes):
+    " the network computed the slow and obvious way, for one position "
+    x = planes.astype(np.float64)
+    i = 0
+    while f"trunk.{i}.weight" in weights:
+        w, b = weights[f"trunk.{i}.weight"], weights[f"trunk.{i}.bias"]
+        padded = np.pad(x, ((0, 0), (1, 1), (1, 1)))
+        out = np.zeros((w.shape[0],) + x.shape[1:])
+        for y in range(x.shape[1]):
+            for col in range(x.shape[2]):
+                out[:, y, col] = (w * padded[None, :, y:y + 3, col:col + 3]).sum(axis=(1, 2, 3)) + b
+        x = np.maximum(out, 0)
+        i += 1
+    results = []
+    for name in ('policy', 'value'):
+        h = x.ravel()
+        i = 0
+        while f"{name}.{i}.weight" in weights:
+            h = weights[f"{name}.{i}.weight"] @ h + weights[f"{name}.{i}.bias"]
+            if f"{name}.{i + 1}.weight" in weights:
+                h = np.maximum(h, 0)
+            i += 1
+        results.append(h)
+    logits, value = results
+    policy = np.exp(logits - logits.max())
+    return policy / policy.sum(), 1 / (1 + np.exp(-value[0]))
+
+def test_network(tmp_path):
+    weights = Network.random_weights(filters=(8, 4), hidden=16, seed=3)
+    path = str(tmp_path / 'net.npz')
+    np.savez(path, **weights)
+    net = Network.load(path, max_batch=3)
+
+    games = [ bs.Game(gs2.game_state()), bs.Game(gs3.game_state()) ]
+    snake_ids = [ snake.id for snake in games[0].board.snakes ] + ['gone']
+    values, priors = net.evaluate_batch(games, snake_ids)
+    assert values.shape == (2, len(snake_ids)) and priors.shape == (2, len(snake_ids), 4)
+
+    for g, game in enumerate(games):
+        for s, snake_id in enumerate(snake_ids):
+            if game.snake_by_id(snake_id) is None:
+                assert values[g, s] == 0 and (priors[g, s] == 0.25).all()
+                continue
+            policy, value = reference(weights, game.to_planes(snake_id=snake_id))
+            assert np.allclose(priors[g, s], policy, atol=1e-4)
+            assert abs(values[g, s] - value) < 1e-4
+
+    # one at a time gives the same
+    assert np.allclose(net.evaluate(games[1], snake_ids), values[1], atol=1e-6)
+    assert abs(net.score(games[1], snake_ids[0]) - values[1, 0]) < 1e-6
+    assert abs(sum(net.policy_for(games[1]).values()) - 1) < 1e-5
+
+def test_mcts_batched():
+    net = Network(Network.random_weights(seed=0), max_batch=64)
+    g = bs.Game(gs3.game_state())
+    mcts = MCTS(seed=1, evaluate_batch=net.evaluate_batch, batch_size=32)
+    # only moving down (onto our tail) isn't a dead end
+    assert mcts.search(g, time_budget=None, max_iterations=200) == 'down'
+    assert mcts.stats['iterations'] == 200
+    assert mcts.pool.visits[mcts.root] == 200
+    assert np.allclose(mcts.pool.priors[mcts.root].sum(axis=1), 1)
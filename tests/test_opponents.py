@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+import game_state_deadend2 as gs2
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils.alphabeta import AlphaBeta
+from battlesnake_utils.opponents import OpponentModel, feature_names, legal_directions, move_features
+
+def duel():
+    g = bs.Game()
+    g.board = bs.EmptyBoard(11)
+    g.board.snakes = [
+        bs.Snake({'id': 'a', 'name': 'us', 'health': 100, 'body': [{'x': 1, 'y': 1}] * 3}),
+        bs.Snake({'id': 'b', 'name': 'greedy', 'health': 100, 'body': [{'x': 9, 'y': 9}] * 3}),
+    ]
+    g.you = g.board.snakes[0]
+    g.board.food = [bs.Pos(5, 5)]
+    g.board.update_df()
+    return g
+
+def greedy_move(g, snake):
+    " a legal move that gets closest to the food "
+    moves = legal_directions(g)[snake.id]
+    food = g.board.food[0]
+    def distance(m):
+        pos = snake.head.moved_to(bs.Pos.all_directions[m])
+        return abs(pos.x - food.x) + abs(pos.y - food.y)
+    return bs.Pos.all_directions[min(moves, key=distance)]
+
+def play(model, turns, seed=0):
+    rnd = random.Random(seed)
+    g = duel()
+    for turn in range(turns):
+        if len(g.board.snakes) < 2:
+            g = duel()
+        greedy = g.snake_by_id('b')
+        moves = {'a': rnd.choice(g.analysis.safe_directions or bs.Pos.all_directions), 'b': greedy_move(g, greedy)}
+        previous = g.copy()
+        g.advance(moves)
+        if not g.board.food:
+            free = [ (x, y) for x in range(11) for y in range(11) if g.board.occupancy[y, x] == 0 ]
+            g.board.food = [bs.Pos(*rnd.choice(free))]
+            g.board.update_df()
+        model.observe(previous, g)
+    return g
+
+def test_learns_food_seeking(tmp_path):
+    model = OpponentModel(min_observations=10, threshold=0.2)
+    g = play(model, 60)
+    assert list(model.opponents) == ['greedy']
+    lifts = model.lifts('greedy')
+    assert lifts[feature_names.index('food')] > 1.5
+
+    g = duel()
+    probabilities = model.move_probabilities(g, 'b')
+    assert abs(sum(probabilities.values()) - 1) < 1e-9
+    assert max(probabilities, key=probabilities.get) == greedy_move(g, g.snake_by_id('b'))
+    # we're not modelled, so all our moves are as likely
+    assert len(set(model.move_probabilities(g, 'a').values())) == 1
+    # moving away from the food is unlikely, and pruned unless nothing else is left
+    assert model.prune(g, 'b', ['left', 'up', 'right', 'down']) == ['left', 'down']
+    assert model.prune(g, 'b', ['up', 'right']) == ['up', 'right']
+
+    # saved and read back
+    path = str(tmp_path / 'opponents' / 'store.json')
+    model.save(path)
+    again = OpponentModel(path)
+    assert (again.lifts('greedy') == pytest.approx(lifts, rel=1e-3))
+    with open(path, 'w') as f:
+        f.write('{"version": 0}')
+    with pytest.raises(Exception):
+        OpponentModel(path)
+
+def test_bounded_store():
+    model = OpponentModel(max_opponents=3)
+    for name in 'abcd':
+        model.stats(name)
+    model.stats('b')
+    model.stats('e')
+    assert list(model.opponents) == ['d', 'b', 'e']
+
+    g = duel()
+    features = move_features(g, g.snake_by_id('b'))
+    assert features.shape == (4, len(feature_names))
+
+def test_pruned_search():
+    g = bs.Game(gs2.game_state())
+    model = OpponentModel(min_observations=1)
+    for snake in g.board.snakes:
+        if snake is not g.you:
+            entry = model.stats(snake.name)
+            entry[0] = 100
+            # an opponent that always goes straight on
+            entry[1][feature_names.index('straight')] = 100
+            entry[2][feature_names.index('straight')] = 5
+
+    full = AlphaBeta()
+    pruned = AlphaBeta(reply_filter=model.prune)
+    assert full.search(g, time_budget=None, max_depth=3) in bs.Pos.all_directions
+    assert pruned.search(g, time_budget=None, max_depth=3) in bs.Pos.all_directions
+    assert pruned.stats['nodes'] < full.stats['nodes']
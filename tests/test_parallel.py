@@ -0,0 +1,69 @@
+import time
+
+import game_state_deadend2 as gs2
+import game_state_deadend3 as gs3
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils.parallel import ParallelSearch, SharedGame, worker_search
+
+def test_shared_game():
+    g = bs.Game(gs2.game_state())
+    shared = SharedGame()
+    try:
+        shared.write(g)
+        assert shared.generation == 1
+
+        # a second view on the same memory, like a worker has
+        other = SharedGame(shared.name)
+        g2 = other.read()
+        other.close()
+        assert g2.turn == g.turn
+        assert g2.you.id == str(g.board.snakes.index(g.you))
+        assert g2.hazard_damage == g.hazard_damage
+        assert [ len(s.body) for s in g2.board.snakes ] == [ len(s.body) for s in g.board.snakes ]
+        assert list(g2.you.body) == list(g.you.body)
+        assert g2.board.food == g.board.food
+        assert g2.board.df.equals(g.board.df)
+
+        # royale shrinking comes through, so workers see the same hazards ahead
+        g.ruleset['name'] = 'royale'
+        g.ruleset['settings']['royale']['shrinkEveryNTurns'] = 20
+        g.ruleset['settings']['hazardDamagePerTurn'] = 14
+        g.board.hazards = [ bs.Pos(0, y) for y in range(g.board.height) ]
+        g.board.changed()
+        g.turn += 1
+        shared.write(g)
+        g2 = shared.read()
+        assert g2.shrink_every == 20 and g2.hazard_damage == 14
+        assert (g2.hazards_ahead().onset == g.hazards_ahead().onset).all()
+
+        # snakes keep their slot when one before them is gone
+        you_slot = g2.you.id
+        other = [ snake for snake in g.board.snakes if snake is not g.you ][0]
+        g.board.snakes.remove(other)
+        g.board.changed()
+        g.turn += 1
+        shared.write(g)
+        assert shared.read().you.id == you_slot
+        assert [ snake.id for snake in shared.read().board.snakes ] == [you_slot]
+    finally:
+        shared.close()
+
+def test_parallel_search():
+    g = bs.Game(gs3.game_state())
+    with ParallelSearch(processes=2, engine='mcts', engine_options={'seed': 1}) as search:
+        assert search.search(g, time_budget=0.2) == 'down'
+        assert search.stats['workers'] == 2
+        assert search.stats['visits']['down'] > 0
+        # dispatch and merging fit in the budget
+        start = time.time()
+        search.search(g, time_budget=0.2)
+        assert time.time() - start < 0.2 + 0.05
+        assert search.stats['late'] == 0
+
+    with ParallelSearch(processes=2, engine='alphabeta') as search:
+        assert search.search(g, time_budget=0.2) == 'down'
+        assert search.stats['scores']['down'] is not None
+
+def test_worker_search_after_deadline():
+    " a task picked up too late searches nothing "
+    assert worker_search(1, 0b1111, time.time() - 0.01, 0) == ([0] * 4, [None] * 4)
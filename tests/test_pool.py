@@ -0,0 +1,75 @@
+import gc
+
+import pytest
+
+import arcade_board
+import game_state_deadend2 as gs2
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils.alphabeta import AlphaBeta
+from battlesnake_utils.mcts import MCTS
+from battlesnake_utils.pool import GamePool, empty_game, gc_paused
+
+def test_game_pool():
+    pool = GamePool()
+    g = bs.Game(gs2.game_state())
+    copy = pool.acquire_from(g)
+    assert copy.as_dict() == g.as_dict() and str(copy.board) == str(g.board)
+    assert copy.you is copy.snake_by_id(g.you.id)
+    assert (copy.board.occupancy == g.board.occupancy).all()
+
+    # independent of the original, both ways
+    moves = { snake.id: copy.analysis.safe_directions[0] if snake is copy.you else None for snake in copy.board.snakes }
+    before = g.as_dict()
+    expected = g.copy()
+    expected.advance(moves)
+    copy.advance(moves)
+    assert g.as_dict() == before
+    assert copy.as_dict() == expected.as_dict() and str(copy.board) == str(expected.board)
+
+    # nor do they share a ruleset, or the default one
+    copy.ruleset['name'] = 'royale'
+    assert g.ruleset['name'] == 'standard'
+    blank = GamePool().acquire_from(bs.Game())
+    blank.ruleset['settings']['hazardDamagePerTurn'] = 99
+    empty_game().ruleset['name'] = 'royale'
+    assert bs.Game.default_ruleset['name'] == 'solo' and bs.Game.default_ruleset['settings']['hazardDamagePerTurn'] == 14
+
+    second = pool.acquire_from(copy)
+    assert pool.stats == {'hits': 0, 'misses': 2, 'in_use': 2, 'peak': 2, 'free': 0}
+    pool.release(copy)
+    pool.release(second)
+    with pytest.raises(Exception):
+        pool.release(second)
+    with pytest.raises(Exception):
+        pool.release(g)
+
+    # reused for another board size, with us no longer on the board
+    arcade = bs.Game()
+    arcade.board = bs.Board(arcade_board.board_data())
+    again = pool.acquire_from(arcade)
+    assert again is second and again.board.occupancy.shape == (21, 19)
+    assert again.as_dict() == arcade.as_dict() and str(again.board) == str(arcade.board)
+    assert again.you.id == arcade.you.id and again.you not in again.board.snakes
+    assert pool.stats['hits'] == 1 and pool.stats['peak'] == 2
+
+def test_gc_paused():
+    assert gc.isenabled()
+    with pytest.raises(ValueError):
+        with gc_paused():
+            with gc_paused():
+                assert not gc.isenabled()
+            assert not gc.isenabled()
+            raise ValueError()
+    assert gc.isenabled()
+
+def test_searches_release_their_games():
+    g = bs.Game(gs2.game_state())
+    mcts = MCTS(seed=1, pause_gc=True)
+    mcts.search(g, time_budget=None, max_iterations=200)
+    stats = mcts.stats['games']
+    assert stats['in_use'] == 0 and stats['hits'] >= 199 and stats['peak'] == 1
+
+    search = AlphaBeta()
+    # stopped by its time budget, in the middle of the tree
+    search.search(g, time_budget=0.05, max_depth=20)
+    assert search.games.in_use == 0 and search.games.peak <= 20
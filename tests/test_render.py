@@ -0,0 +1,49 @@
+import io
+import random
+
+import game_state_deadend3
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils.render import Renderer, Replay
+
+def test_render_matches_df():
+    g = bs.Game(game_state_deadend3.game_state())
+    b = g.board
+    r = Renderer(b.width, b.height)
+    rows = r.render(b).split('\n')
+    assert len(rows) == b.height + 1
+    for y in range(b.height):
+        row = rows[b.height - y]
+        assert row.startswith(str(y))
+        for x in range(b.width):
+            assert row[r.label_width + r.cell_width * x + 2] == b.df.at[y, x]
+
+    # overlay, and colour only adds escapes
+    assert 'X' in r.render(b, overlay={(3, 3): 'X'})
+    coloured = Renderer(b.width, b.height, colour=True).render(b)
+    assert '\x1b[' in coloured and '\x1b[' not in r.render(b)
+
+def test_diff_and_replay():
+    rnd = random.Random(0)
+    g = bs.Game(game_state_deadend3.game_state())
+    frames = [g.copy()]
+    while g.board.snakes and len(frames) < 20:
+        g.advance({ snake.id: rnd.choice(g.analysis.safe_directions or bs.Pos.all_directions)
+                    if snake is g.you else rnd.choice(bs.Pos.all_directions) for snake in g.board.snakes })
+        frames.append(g.copy())
+
+    r = Renderer(g.board.width, g.board.height)
+    old, new = frames[0].board.cell_codes(), frames[1].board.cell_codes()
+    assert r.diff(old, old) == ''
+    assert r.diff(old, new).count('\x1b[') == (old != new).sum()
+
+    out = io.StringIO()
+    replay = Replay(frames, colour=False, out=out)
+    assert len(replay) == len(frames)
+    replay.seek(1)
+    assert '\x1b[2J' in out.getvalue()
+    out.truncate(0)
+    out.seek(0)
+    replay.seek(0)
+    assert '\x1b[2J' not in out.getvalue() and replay.current == 0
+    replay.seek(1000)
+    assert replay.current == len(frames) - 1
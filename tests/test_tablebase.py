@@ -0,0 +1,90 @@
+import random
+
+import pytest
+import numpy as np
+
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils import tablebase as tb
+
+def two_snakes(width, ours, theirs):
+    g = bs.Game()
+    g.board = bs.EmptyBoard(width)
+    g.board.snakes = [
+        bs.Snake({'id': 'a', 'name': 'a', 'health': 90, 'body': [ {'x': x, 'y': y} for x, y in ours ]}),
+        bs.Snake({'id': 'b', 'name': 'b', 'health': 90, 'body': [ {'x': x, 'y': y} for x, y in theirs ]}),
+    ]
+    g.you = g.board.snakes[0]
+    g.board.update_df()
+    return g
+
+def test_body_index():
+    body = ((1, 1), (1, 2), (2, 2))
+    index = tb.encode_body(body, 4)
+    assert tb.decode_body(index, 4, 4, 3) == body
+    assert tb.encode_body([bs.Pos(1, 1), bs.Pos(1, 2), bs.Pos(2, 2)], 4) == index
+    assert tb.encode_body([(1, 1), (2, 2)], 4) is None
+    # off the board, or crossing itself
+    assert tb.decode_body(tb.encode_body(((0, 0), (1, 0)), 4) - 2, 4, 4, 2) is None
+    assert tb.decode_body(tb.encode_body(((1, 1), (1, 2), (2, 2)), 4) + 1, 4, 4, 3) is None
+
+def test_rules_match_advance():
+    rnd = random.Random(1)
+    rules = tb.Rules(5, 5, (3, 2))
+    checked = 0
+    while checked < 200:
+        position = rnd.randrange(len(rules.bodies[0]) * rules.n_second)
+        codes = rules.successors(position)
+        if codes is None:
+            continue
+        ours = rules.bodies[0][position // rules.n_second]
+        theirs = rules.bodies[1][position % rules.n_second]
+        m, r = rnd.randrange(4), rnd.randrange(4)
+        g = two_snakes(5, ours, theirs)
+        eliminated = g.advance({'a': bs.Pos.all_directions[m], 'b': bs.Pos.all_directions[r]})
+        code = codes[m * 4 + r]
+        if code == tb.both_lose:
+            assert sorted(eliminated) == ['a', 'b']
+        elif code == tb.we_lose:
+            assert eliminated == ['a']
+        elif code == tb.we_win:
+            assert eliminated == ['b']
+        else:
+            assert eliminated == []
+            assert tb.encode_body(g.you.body, 5) * rules.n_second + tb.encode_body(g.board.snakes[1].body, 5) == code
+        checked += 1
+
+def test_tablebase(tmp_path):
+    path = str(tmp_path / 'tb.bin')
+    results = tb.generate(path, 4, 4, lengths=(3, 2), processes=2)
+    t = tb.Tablebase(path)
+    assert t.lengths == (3, 2) and len(t.results) == len(results)
+    assert (np.asarray(t.results) == results).all()
+
+    assert tb.Tablebase.describe(3) == ('win', 3)
+    assert tb.Tablebase.describe(tb.max_distance + 3) == ('loss', 3)
+    assert tb.Tablebase.describe(tb.draw) == ('draw', None)
+
+    # every win can be played out against any reply
+    rules = tb.Rules(4, 4, (3, 2))
+    for position in np.flatnonzero((results > 0) & (results <= tb.max_distance))[:50]:
+        ours = rules.bodies[0][position // rules.n_second]
+        theirs = rules.bodies[1][position % rules.n_second]
+        g = two_snakes(4, ours, theirs)
+        distance = t.probe(g)[1]
+        for turn in range(distance):
+            move = t.best_move(g)
+            g.advance({'a': move, 'b': random.choice(bs.Pos.all_directions)})
+            if len(g.board.snakes) < 2:
+                break
+        assert [ snake.id for snake in g.board.snakes ] == ['a']
+
+    # not covered
+    g.board.food.append(bs.Pos(0, 3))
+    assert t.probe(g) is None and t.best_move(g) is None
+
+    with pytest.raises(Exception):
+        tb.generate(path, 8, 8)
+    with open(path, 'wb') as f:
+        f.write(b'not a tablebase at all')
+    with pytest.raises(Exception):
+        tb.Tablebase(path)
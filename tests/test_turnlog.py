@@ -0,0 +1,100 @@
+import json
+import random
+
+import pytest
+
+import battlesnake_utils.battlesnake as bs
+from battlesnake_utils import loadtest
+from battlesnake_utils.turnlog import TurnLogReader, TurnLogWriter
+
+def play(turns, seed=0, game_id='game-1'):
+    " the states of a game of 4 snakes with safe random moves, hazards spreading every 5 turns "
+    rnd = random.Random(seed)
+    g = loadtest.new_game(11, 11, 4, seed=seed)
+    states = []
+    for turn in range(turns):
+        state = g.as_dict()
+        state['game']['id'] = game_id
+        # our latency changes every turn
+        state['board']['snakes'][0]['latency'] = state['you']['latency'] = str(rnd.randrange(50))
+        states.append(state)
+        if len(g.board.snakes) < 2:
+            break
+        moves = {}
+        for snake in g.board.snakes:
+            g.you = snake
+            moves[snake.id] = rnd.choice(g.analysis.safe_directions or bs.Pos.all_directions)
+        g.you = g.board.snakes[0]
+        g.advance(moves)
+        loadtest.spawn_food(g, rnd)
+        if g.turn % 5 == 0:
+            g.board.hazards.append(bs.Pos(g.turn // 5 % 11, 0))
+            g.board.changed()
+    return states
+
+def test_turn_log(tmp_path):
+    path = str(tmp_path / 'logs' / 'game.log')
+    states = play(60)
+    with TurnLogWriter(path, keyframe_every=10) as writer:
+        for state in states:
+            writer.record(state)
+        # a second game starts with a keyframe
+        second = play(12, seed=1, game_id='game-2')
+        for state in second:
+            writer.record(state)
+    assert writer.keyframes >= (len(states) + 9) // 10 + 2
+    full = sum(len(json.dumps(state, separators=(',', ':'))) + 1 for state in states + second)
+    assert writer.bytes < full / 3
+
+    with TurnLogReader(path) as reader:
+        assert reader.games() == ['game-1', 'game-2']
+        assert reader.turns('game-1') == [ state['turn'] for state in states ]
+        for state in reversed(states):
+            assert reader.state(state['turn'], 'game-1') == state
+        assert reader.state(3) == second[3]
+        assert list(reader.states()) == states + second
+        g = reader.game(7, 'game-1')
+        assert g.you.id == states[7]['you']['id'] and g.turn == 7
+        with pytest.raises(Exception):
+            reader.state(500)
+
+def test_game_in_progress(tmp_path):
+    path = str(tmp_path / 'game.log')
+    states = play(20, seed=2)
+    writer = TurnLogWriter(path, keyframe_every=4)
+    for state in states[:10]:
+        writer.record(bs.Game(state))
+    with open(path, 'a') as f:
+        # half a line, as if a record were being written
+        f.write('{"turn":10,"sna')
+
+    reader = TurnLogReader(path)
+    assert reader.turns() == list(range(10))
+    assert reader.state(9) == bs.Game(states[9]).as_dict()
+
+    with open(path, 'r+') as f:
+        f.truncate(writer.bytes)
+    for state in states[10:]:
+        writer.record(bs.Game(state))
+    writer.close()
+    reader.refresh()
+    assert reader.turns() == list(range(20))
+    assert reader.state(19) == bs.Game(states[19]).as_dict()
+    reader.close()
+
+def test_games_with_the_same_id(tmp_path):
+    " Games all have the same id in as_dict(), they're told apart by the writer's game number "
+    path = str(tmp_path / 'games.log')
+    first = [ bs.Game(state) for state in play(8, seed=3) ]
+    second = [ bs.Game(state) for state in play(6, seed=4) ]
+    with TurnLogWriter(path, keyframe_every=4) as writer:
+        for g in first + second:
+            writer.record(g)
+
+    with TurnLogReader(path) as reader:
+        game = first[0].as_dict()['game']['id']
+        assert reader.games() == [game, f"{game}#2"]
+        assert reader.turns(game) == list(range(8))
+        assert reader.turns() == list(range(6))
+        assert reader.state(2, game) == first[2].as_dict()
+        assert reader.state(2) == second[2].as_dict()